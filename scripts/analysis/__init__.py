@@ -2,47 +2,417 @@
 Common utilities for CA Delivery Vans Analytics - Phase 3
 """
 
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
 import os
-import pandas as pd
-import numpy as np
-from typing import List, Dict, Any
+import sys
+from contextlib import closing
+from types import ModuleType
+from typing import List, Dict, Any, Callable, Iterator, Optional, Sequence, Tuple, Union
 from datetime import datetime
 
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a module on first attribute access instead of now.
+
+    The module is registered in sys.modules. Analysis modules must get it
+    through lazy_import too: a plain `import pandas` statement inspects the
+    module and so loads it. Already-imported modules are returned as is.
+
+    Args:
+        name: Top-level module name
+
+    Returns:
+        ModuleType: The module, loaded when first used
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# pandas / numpy are most of a CLI's startup time: defer them so argument
+# errors and paths that never touch a frame skip them. Modules in this
+# package use `from __future__ import annotations` so type hints alone do
+# not load them.
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+sqlite3 = lazy_import('sqlite3')
+
 # Get the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Output formats for list-heavy report payloads: 'rows' is an array of
+# objects (default), 'columnar' is a struct of arrays
+OUTPUT_FORMATS = ('rows', 'columnar')
+
+# Accepted Nash export extensions (compressed files are decompressed as a
+# stream by pandas, inferred from the extension)
+NASH_FILE_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.zip')
+
+# Registry / rate card arguments with these extensions are read from the
+# SQLite data store shared with the Node server (src/utils/data-store.ts)
+STORE_DB_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# SQLite limits bound parameters per statement; look up ids in chunks
+_SQL_CHUNK_SIZE = 500
+
+# State selectors: analyses default to CA; 'ALL' selects every state in
+# the store -> state index (States/walmart_stores_all.csv)
+DEFAULT_STATES = ('CA',)
+ALL_STATES = 'ALL'
+
+# A state code, comma-separated codes, a list of codes, 'ALL', or None (CA)
+StateSelector = Union[str, Sequence[str], None]
+
+# Store -> state index, built on first use (see load_store_states)
+_STORE_STATES: Optional[Dict[str, str]] = None
+
+# Top-level fields of a CLI request envelope (everything else is a param)
+_REQUEST_FIELDS = ('dataset', 'cache_key', 'registry', 'registry_path', 'rate_cards', 'rate_cards_path')
+
+
+def parse_cli_options(argv: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Split CLI arguments into positional arguments and --key=value options.
+
+    Lets the analysis CLIs take optional flags without disturbing their
+    positional argument counts.
+
+    Args:
+        argv: Arguments after the program name (sys.argv[1:])
+
+    Returns:
+        tuple: (positional arguments, options dict)
+    """
+    positional = []
+    options = {}
+    for arg in argv:
+        if arg.startswith('--'):
+            key, _, value = arg[2:].partition('=')
+            options[key] = value
+        else:
+            positional.append(arg)
+    return positional, options
+
+
+def parse_cli_request(argv: List[str], positional_names: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """
+    Build an analysis CLI request from stdin JSON or from arguments.
+
+    With --stdin the request is one JSON envelope read from standard input:
+
+        {"dataset": <nash path> | "cache_key": <cached frame key>,
+         "registry": {...} | "registry_path": <json or .db path>,
+         "rate_cards": {...} | "rate_cards_path": <json or .db path>,
+         "params": {...}}
+
+    Otherwise positional arguments are mapped onto positional_names and
+    --key=value options become params.
+
+    Args:
+        argv: Arguments after the program name (sys.argv[1:])
+        positional_names: Request field for each positional argument;
+            names other than the envelope fields go into params
+
+    Returns:
+        dict or None: The request, or None when positional arguments are
+            missing (development mode)
+    """
+    args, options = parse_cli_options(argv)
+
+    if 'stdin' in options:
+        request = json.load(sys.stdin)
+        request.setdefault('params', {})
+        return request
+
+    if len(args) < len(positional_names):
+        return None
+
+    request = {'params': dict(options)}
+    for name, value in zip(positional_names, args):
+        if name in _REQUEST_FIELDS:
+            request[name] = value
+        else:
+            request['params'][name] = value
+    return request
+
+
+def load_request_dataset(request: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Load the Nash data named by a CLI request.
+
+    With a 'start' and/or 'end' param (YYYY-MM-DD, inclusive) only the
+    trips in that date range are returned, sliced from the date-sorted
+    dataset (see slice_dates). Either way trips come back in upload order
+    (see restore_upload_order).
+
+    Args:
+        request: Request with a dataset path or a cache_key (the file name
+            of a cleaned frame in the cache directory, without .pkl)
+
+    Returns:
+        pd.DataFrame: Cleaned Nash data
+    """
+    if request.get('cache_key'):
+        key = os.path.basename(request['cache_key'])
+        nash_df = pd.read_pickle(os.path.join(get_cache_dir(), f"{key}.pkl"))
+    else:
+        nash_df = _read_nash_data(request['dataset'])
+
+    start, end = get_request_date_range(request)
+    return restore_upload_order(slice_dates(nash_df, start, end))
+
+
+def get_request_date_range(request: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get the date range params of a CLI request.
+
+    Args:
+        request: CLI request
+
+    Returns:
+        tuple: (start, end), None for an open bound
+    """
+    params = request.get('params') or {}
+    return params.get('start') or None, params.get('end') or None
+
+
+def load_request_registry(request: Dict[str, Any], store_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Get the store registry of a CLI request, inline or from registry_path.
+
+    Args:
+        request: CLI request
+        store_ids: Stores to read from a SQLite data store
+
+    Returns:
+        dict: Store registry
+    """
+    if 'registry' in request:
+        return request['registry']
+    return load_store_registry(request['registry_path'], store_ids)
+
+
+def load_request_rate_cards(request: Dict[str, Any], vendors: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Get the rate cards of a CLI request, inline or from rate_cards_path.
+
+    Args:
+        request: CLI request
+        vendors: Vendors to read from a SQLite data store
+
+    Returns:
+        dict: Rate cards
+    """
+    if 'rate_cards' in request:
+        return request['rate_cards']
+    return load_rate_cards(request['rate_cards_path'], vendors)
+
+
+def load_store_states() -> Dict[str, str]:
+    """
+    Load the store -> state index from the all-stores CSV.
+
+    Built once per process and shared by every state filter.
+
+    Returns:
+        Dict[str, str]: State code per store ID (as string)
+    """
+    global _STORE_STATES
+    if _STORE_STATES is None:
+        stores_path = os.path.join(PROJECT_ROOT, 'States', 'walmart_stores_all.csv')
+        df = pd.read_csv(stores_path, usecols=['Store ID', 'State'], dtype=str)
+        _STORE_STATES = dict(zip(df['Store ID'].str.strip(), df['State'].str.strip().str.upper()))
+    return _STORE_STATES
+
+
+def resolve_states(states: StateSelector = None) -> Optional[Tuple[str, ...]]:
+    """
+    Normalize a state selector.
+
+    Args:
+        states: State code, comma-separated codes, list of codes, 'ALL',
+            or None for the default (CA)
+
+    Returns:
+        tuple or None: Upper-case state codes, or None for every state
+    """
+    if states is None:
+        return DEFAULT_STATES
+    if isinstance(states, str):
+        states = states.split(',')
+
+    codes = tuple(dict.fromkeys(s.strip().upper() for s in states if s.strip()))
+    if not codes:
+        raise ValueError("No state selected")
+    if ALL_STATES in codes:
+        return None
+    return codes
+
+
+def map_store_states(store_ids: pd.Series) -> pd.Series:
+    """
+    Look up the state of each store ID.
+
+    Args:
+        store_ids: Series of store IDs
+
+    Returns:
+        pd.Series: State code per row (NaN for stores not in the index)
+    """
+    return store_ids.astype(str).map(load_store_states())
+
 
 def load_ca_stores() -> List[str]:
     """
-    Load list of CA store IDs from the CA stores CSV file.
+    Load list of CA store IDs from the store -> state index.
 
     Returns:
         List[str]: List of CA store IDs as strings
     """
-    ca_stores_path = os.path.join(PROJECT_ROOT, 'States', 'walmart_stores_ca_only.csv')
-    df = pd.read_csv(ca_stores_path)
-    # Convert to string and handle any data type issues
-    return df['Store ID'].astype(str).tolist()
+    return [store_id for store_id, state in load_store_states().items() if state == 'CA']
 
 
-def filter_ca_stores(nash_df: pd.DataFrame) -> pd.DataFrame:
+def filter_states(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None
+) -> pd.DataFrame:
     """
-    Filter Nash data to CA stores only.
+    Filter Nash data to stores in the given states.
 
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
-        pd.DataFrame: Filtered dataframe containing only CA stores
+        pd.DataFrame: Filtered dataframe containing only those states' stores
     """
+    codes = resolve_states(states)
+
     # Handle empty dataframe
     if nash_df.empty or 'Store Id' not in nash_df.columns:
         return nash_df
 
-    ca_stores = load_ca_stores()
     # Convert Store Id column to string for comparison
     nash_df['Store Id'] = nash_df['Store Id'].astype(str)
-    return nash_df[nash_df['Store Id'].isin(ca_stores)]
+    store_states = map_store_states(nash_df['Store Id'])
+    if codes is None:
+        return nash_df[store_states.notna()]
+    return nash_df[store_states.isin(codes)]
+
+
+def filter_ca_stores(nash_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filter Nash data to CA stores only.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+
+    Returns:
+        pd.DataFrame: Filtered dataframe containing only CA stores
+    """
+    return filter_states(nash_df, DEFAULT_STATES)
+
+
+def analyze_by_state(
+    analysis: Callable[..., Any],
+    nash_df: pd.DataFrame,
+    *args: Any,
+    states: StateSelector = ALL_STATES,
+    workers: int = 1,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Run an analysis once per state, keyed by state.
+
+    The frame is partitioned in one groupby on each row's state instead of
+    filtered once per state. Each partition runs the analysis with
+    states=(state,), in a process pool when workers > 1.
+
+    Args:
+        analysis: Module-level analysis function taking (nash_df, *args,
+            states=..., **kwargs)
+        nash_df: DataFrame with Nash trip data
+        *args: Positional arguments after nash_df (registry, rate cards, ...)
+        states: State selector (see resolve_states); 'ALL' runs every state
+            present in the data, an explicit list runs each listed state
+        workers: Worker processes (1 runs the partitions in this process)
+        **kwargs: Keyword arguments for the analysis
+
+    Returns:
+        dict: { states: { state: analysis result } }, states sorted
+    """
+    codes = resolve_states(states)
+    partitions = {}
+    if not nash_df.empty and 'Store Id' in nash_df.columns:
+        store_states = map_store_states(nash_df['Store Id'])
+        partitions = {state: part for state, part in nash_df.groupby(store_states, sort=True)}
+
+    if codes is not None:
+        # Listed states with no trips still get a (empty) result
+        empty = nash_df.iloc[0:0]
+        partitions = {state: partitions.get(state, empty) for state in sorted(codes)}
+
+    if workers > 1 and len(partitions) > 1:
+        # Imported here: multiprocessing is a noticeable share of CLI startup
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as pool:
+            futures = {
+                state: pool.submit(analysis, part, *args, states=(state,), **kwargs)
+                for state, part in partitions.items()
+            }
+            results = {state: future.result() for state, future in futures.items()}
+    else:
+        results = {
+            state: analysis(part, *args, states=(state,), **kwargs)
+            for state, part in partitions.items()
+        }
+
+    return {"states": results}
+
+
+def run_state_request(
+    analysis: Callable[..., Any],
+    nash_df: pd.DataFrame,
+    params: Dict[str, Any],
+    *args: Any,
+    **kwargs: Any
+) -> Any:
+    """
+    Run an analysis for a CLI request's state selection.
+
+    Without a 'state' param the analysis runs on CA as before; with one
+    (a code, comma-separated codes, a list or 'ALL') the result is keyed
+    by state via analyze_by_state, using params['workers'] processes.
+
+    Args:
+        analysis: Analysis function (see analyze_by_state)
+        nash_df: DataFrame with Nash trip data
+        params: Request params
+        *args: Positional arguments after nash_df
+        **kwargs: Keyword arguments for the analysis
+
+    Returns:
+        The analysis result, or { states: { state: result } }
+    """
+    if 'state' not in params:
+        return analysis(nash_df, *args, **kwargs)
+    return analyze_by_state(
+        analysis, nash_df, *args,
+        states=params['state'], workers=int(params.get('workers', 1)), **kwargs
+    )
 
 
 def parse_date(date_str: str) -> datetime:
@@ -142,6 +512,65 @@ def normalize_carrier_name(carrier: str) -> str:
     return carrier  # Return original if no match
 
 
+def normalize_carriers(carriers: pd.Series) -> pd.Series:
+    """
+    Normalize a whole carrier column.
+
+    Applies normalize_carrier_name once per distinct value and maps the
+    result back, instead of once per row.
+
+    Args:
+        carriers: Series of raw carrier names
+
+    Returns:
+        pd.Series: Normalized carrier names, same index
+    """
+    mapping = {carrier: normalize_carrier_name(carrier) for carrier in carriers.unique()}
+    return carriers.map(mapping)
+
+
+def encode_categorical(values: Any) -> Tuple[List[int], List[Any]]:
+    """
+    Dictionary-encode a column for columnar JSON output.
+
+    Args:
+        values: Array-like of repeated values (e.g. carrier names)
+
+    Returns:
+        tuple: (integer codes per value, list of distinct values)
+    """
+    codes, uniques = pd.factorize(pd.Series(values))
+    return codes.tolist(), list(uniques)
+
+
+def rows_to_columnar(
+    rows: List[Dict[str, Any]],
+    categorical: Tuple[str, ...] = (),
+    columns: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """
+    Transpose a list of row dicts into a struct of arrays.
+
+    Keys listed in categorical are dictionary-encoded: the column holds
+    integer codes and '<key>_dict' holds the distinct values.
+
+    Args:
+        rows: Row objects sharing the same keys
+        categorical: Keys to dictionary-encode
+        columns: Expected keys, in order; given, an empty rows list still
+            yields every key (with empty lists), so the schema is stable
+
+    Returns:
+        dict: One list per key (empty dict for no rows and no columns)
+    """
+    keys = list(columns) if columns is not None else list(rows[0]) if rows else []
+    result = {key: [row[key] for row in rows] for key in keys}
+    for key in categorical:
+        if key in result:
+            result[key], result[f"{key}_dict"] = encode_categorical(result[key])
+    return result
+
+
 def get_date_range(df: pd.DataFrame) -> Dict[str, str]:
     """
     Get the date range from Nash data.
@@ -167,25 +596,135 @@ def get_date_range(df: pd.DataFrame) -> Dict[str, str]:
     }
 
 
-def load_nash_data(file_path: str) -> pd.DataFrame:
+def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Load Nash CSV data with comprehensive data cleaning and type conversion.
+    Order Nash data by Date so date ranges are contiguous (see slice_dates).
 
-    Handles:
-    - String field whitespace trimming
-    - Numeric field type conversion with error handling
-    - Mixed date format parsing
-    - Boolean field conversion
-    - Missing value handling
+    The sort is stable, so trips of one day keep their upload order, and
+    undated trips go last. Rows keep their index labels, so
+    restore_upload_order can undo the sort. A frame already in order is
+    returned as is after one pass over its dates. Either way the result is
+    flagged in attrs['sorted_by_date'], which persists with a cached frame.
 
     Args:
-        file_path: Path to Nash CSV file
+        df: DataFrame with Nash trip data
 
     Returns:
-        pd.DataFrame: Loaded and cleaned Nash data
+        pd.DataFrame: The frame in Date order
     """
-    df = pd.read_csv(file_path)
+    if 'Date' not in df.columns:
+        return df
+
+    dates = _date_values(df)
+    dated = ~np.isnat(dates)
+    count = int(dated.sum())
+    in_order = bool(dated[:count].all()) and not (dates[1:count] < dates[:max(count - 1, 0)]).any()
+
+    if not in_order:
+        df = df.iloc[np.argsort(dates, kind='stable')]
+    df.attrs['sorted_by_date'] = True
+    return df
+
+
+def restore_upload_order(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Undo sort_by_date, putting trips back in upload order.
+
+    Reports list stores, carriers and batches in first-appearance order,
+    so a frame served from the date-sorted cache must come back in the
+    order a fresh parse of the file gives, or output would depend on
+    whether the file was ingested. Frames already in upload order are
+    returned as is.
+
+    Args:
+        df: DataFrame from sort_by_date (or a slice of one)
+
+    Returns:
+        pd.DataFrame: The trips in upload order, with a fresh index
+    """
+    if df.index.is_monotonic_increasing:
+        return df
+
+    restored = df.sort_index(kind='stable').reset_index(drop=True)
+    restored.attrs.pop('sorted_by_date', None)
+    return restored
+
+
+def slice_dates(
+    df: pd.DataFrame,
+    start: Optional[Any] = None,
+    end: Optional[Any] = None
+) -> pd.DataFrame:
+    """
+    Select the trips between two dates by binary search on sorted dates.
+
+    On a frame flagged by sort_by_date (as loaded datasets are) this costs
+    two searchsorted lookups and returns a contiguous slice that shares
+    the frame's data instead of masking and copying every row. Other
+    frames are sorted first.
+
+    Args:
+        df: DataFrame with Nash trip data
+        start: First day included (YYYY-MM-DD or date-like); None for open
+        end: Last day included (YYYY-MM-DD or date-like); None for open
+
+    Returns:
+        pd.DataFrame: Trips dated start..end (undated trips are dropped
+            once either bound is given)
+
+    Raises:
+        ValueError: If a bound is not a date
+    """
+    if start is None and end is None:
+        return df
+    if 'Date' not in df.columns:
+        return df.iloc[0:0]
+
+    if not df.attrs.get('sorted_by_date'):
+        df = sort_by_date(df)
+
+    # NaT sorts (and searches) after every date
+    dates = _date_values(df)
+    lo = 0
+    hi = int(np.searchsorted(dates, np.datetime64('NaT'), side='left'))
+    if start is not None:
+        lo = int(np.searchsorted(dates, _parse_bound(start).to_datetime64(), side='left'))
+    if end is not None:
+        next_day = _parse_bound(end) + pd.Timedelta(days=1)
+        hi = min(hi, int(np.searchsorted(dates, next_day.to_datetime64(), side='left')))
+    return df.iloc[lo:max(lo, hi)]
+
+
+def _date_values(df: pd.DataFrame) -> np.ndarray:
+    """Date column as datetime64 values (parsed when not cleaned yet)."""
+    if pd.api.types.is_datetime64_any_dtype(df['Date']):
+        return df['Date'].to_numpy()
+    return pd.to_datetime(df['Date'], format='mixed', errors='coerce').to_numpy()
+
 
+def _parse_bound(value: Any) -> pd.Timestamp:
+    """Parse a date range bound to midnight of its day."""
+    bound = pd.Timestamp(value)
+    if pd.isna(bound):
+        raise ValueError(f"Invalid date: {value!r}")
+    return bound.normalize()
+
+
+# Text clean_nash_data leaves where a value was missing (astype(str) turns
+# NaN into 'nan' and None into 'None')
+MISSING_TEXT_VALUES = ('', 'nan', 'None')
+
+
+def clean_nash_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply Nash data cleaning and type conversion to a raw frame (in place).
+
+    Args:
+        df: Raw DataFrame as read from a Nash CSV
+
+    Returns:
+        pd.DataFrame: The same frame, cleaned and typed
+    """
     # 1. TRIM WHITESPACE from all string columns
     string_columns = df.select_dtypes(include=['object']).columns
     for col in string_columns:
@@ -219,15 +758,355 @@ def load_nash_data(file_path: str) -> pd.DataFrame:
     return df
 
 
+def is_nash_file(file_path: str) -> bool:
+    """
+    Check whether a path has an accepted Nash export extension.
+
+    Args:
+        file_path: File path or name
+
+    Returns:
+        bool: True for .csv, .csv.gz, .csv.zst and .zip files
+    """
+    return file_path.lower().endswith(NASH_FILE_EXTENSIONS)
+
+
+def iter_nash_data(file_path: str, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """
+    Stream a Nash CSV (plain or compressed) as cleaned chunks.
+
+    Compressed input is decompressed on the fly; no uncompressed copy is
+    written to disk and only one chunk is held in memory at a time.
+
+    Args:
+        file_path: Path to Nash CSV file (.csv, .csv.gz, .csv.zst or .zip)
+        chunksize: Rows per chunk
+
+    Yields:
+        pd.DataFrame: Cleaned chunk of Nash data
+    """
+    with pd.read_csv(file_path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield clean_nash_data(chunk)
+
+
+def get_cache_dir() -> str:
+    """
+    Get the directory holding cleaned Nash frames.
+
+    Defaults to <project>/cache, overridable with NASH_CACHE_DIR.
+
+    Returns:
+        str: Cache directory path
+    """
+    return os.environ.get('NASH_CACHE_DIR', os.path.join(PROJECT_ROOT, 'cache'))
+
+
+def get_cache_path(file_path: str) -> str:
+    """
+    Get the cache path for the cleaned frame of a Nash CSV.
+
+    The name is <stem>-<path digest>-<version digest>: the version digest
+    covers the file's size and mtime, so a replaced upload never serves a
+    stale frame, and the shared prefix finds the versions it replaced.
+
+    Args:
+        file_path: Path to Nash CSV file
+
+    Returns:
+        str: Path of the cached frame (may not exist yet)
+    """
+    abs_path = os.path.abspath(file_path)
+    stat = os.stat(abs_path)
+    signature = f"{abs_path}|{stat.st_size}|{stat.st_mtime_ns}"
+    path_digest = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:8]
+    digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    return os.path.join(get_cache_dir(), f"{stem}-{path_digest}-{digest}.pkl")
+
+
+def prune_cache_files(prefix: str, keep_path: str, keep: int = 1) -> List[str]:
+    """
+    Delete cache files superseded by a newly written one.
+
+    Among the cache files whose name starts with prefix, keep_path and the
+    keep - 1 most recently used others stay; the rest are removed.
+
+    Args:
+        prefix: File name prefix of the entries competing for space
+        keep_path: The entry just written (never removed)
+        keep: Entries left in place, keep_path included
+
+    Returns:
+        list: Paths removed
+    """
+    cache_dir = get_cache_dir()
+    try:
+        names = [name for name in os.listdir(cache_dir) if name.startswith(prefix) and name.endswith('.pkl')]
+    except OSError:
+        return []
+
+    others = [os.path.join(cache_dir, name) for name in names if name != os.path.basename(keep_path)]
+    mtimes = {}
+    for path in others:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            pass
+    stale = sorted(mtimes, key=mtimes.get, reverse=True)[max(keep - 1, 0):]
+
+    removed = []
+    for path in stale:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError:
+            # Removed concurrently or read-only: nothing more to do
+            pass
+    return removed
+
+
+def save_cached_frame(df: pd.DataFrame, file_path: str) -> str:
+    """
+    Persist a cleaned Nash frame for later analyses.
+
+    Written to a temp file and renamed so readers never see a partial frame.
+    Frames of earlier versions of the same upload and the upload's rollups
+    are removed (see prune_cache_files); rollups are rebuilt on demand.
+
+    Args:
+        df: Cleaned DataFrame (output of clean_nash_data)
+        file_path: Path of the Nash CSV the frame was parsed from
+
+    Returns:
+        str: Path of the cached frame
+    """
+    cache_path = get_cache_path(file_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    # Rollups are named after their frame (see cube.get_rollup_path), so the
+    # upload's prefix (<stem>-<path digest>-) covers both
+    upload_prefix = os.path.basename(cache_path).rsplit('-', 1)[0] + '-'
+    prune_cache_files(upload_prefix, cache_path)
+    return cache_path
+
+
+def load_cached_frame(file_path: str) -> Optional[pd.DataFrame]:
+    """
+    Load the cached cleaned frame for a Nash CSV, if one exists.
+
+    Args:
+        file_path: Path to Nash CSV file
+
+    Returns:
+        pd.DataFrame or None: Cached frame, or None on a cache miss
+    """
+    try:
+        cache_path = get_cache_path(file_path)
+    except OSError:
+        return None
+
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        return pd.read_pickle(cache_path)
+    except Exception:
+        # Corrupt or incompatible cache entry - fall back to parsing the CSV
+        return None
+
+
+def load_nash_data(file_path: str) -> pd.DataFrame:
+    """
+    Load Nash CSV data with comprehensive data cleaning and type conversion.
+
+    Serves the cleaned frame persisted at ingest time when available, so
+    the raw CSV is only parsed once. A .pkl path is read as an already
+    cleaned dataset (e.g. the merged output of bulk ingest).
+
+    Handles:
+    - String field whitespace trimming
+    - Numeric field type conversion with error handling
+    - Mixed date format parsing
+    - Boolean field conversion
+    - Missing value handling
+
+    Args:
+        file_path: Path to Nash CSV file (.csv, .csv.gz, .csv.zst, .zip) or
+            cleaned .pkl dataset
+
+    Returns:
+        pd.DataFrame: Loaded and cleaned Nash data, in upload order
+    """
+    return restore_upload_order(_read_nash_data(file_path))
+
+
+def _read_nash_data(file_path: str) -> pd.DataFrame:
+    """load_nash_data, leaving cached frames in their stored date order."""
+    # Merged datasets written by bulk ingest are already cleaned
+    if file_path.endswith('.pkl'):
+        return pd.read_pickle(file_path)
+
+    cached = load_cached_frame(file_path)
+    if cached is not None:
+        return cached
+
+    df = pd.read_csv(file_path)
+    return clean_nash_data(df)
+
+
+def is_store_db(path: str) -> bool:
+    """
+    Check whether a registry / rate card path is the SQLite data store.
+
+    Args:
+        path: Path passed for the store registry or rate cards
+
+    Returns:
+        bool: True for a SQLite database file
+    """
+    return path.lower().endswith(STORE_DB_EXTENSIONS)
+
+
+def _open_store_db(path: str) -> sqlite3.Connection:
+    """Open the SQLite data store read-only (the Node server owns writes)."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _query_by_keys(
+    conn: sqlite3.Connection,
+    sql: str,
+    key_column: str,
+    keys: Optional[List[str]]
+) -> List[sqlite3.Row]:
+    """Run a SELECT for all rows, or only rows whose key is in keys."""
+    if keys is None:
+        return conn.execute(sql).fetchall()
+
+    rows = []
+    keys = list(dict.fromkeys(str(k) for k in keys))
+    for start in range(0, len(keys), _SQL_CHUNK_SIZE):
+        chunk = keys[start:start + _SQL_CHUNK_SIZE]
+        placeholders = ', '.join('?' for _ in chunk)
+        rows.extend(conn.execute(f"{sql} WHERE {key_column} IN ({placeholders})", chunk).fetchall())
+    return rows
+
+
+def _read_metadata(conn: sqlite3.Connection, name: str) -> Dict[str, str]:
+    """Read the last_updated / version stamp of a data store section."""
+    row = conn.execute(
+        "SELECT last_updated, version FROM metadata WHERE name = ?", (name,)
+    ).fetchone()
+    return {"last_updated": row["last_updated"], "version": row["version"]} if row else {}
+
+
+def load_store_registry(path: str, store_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Load the store registry from a JSON file or the SQLite data store.
+
+    From SQLite only the requested stores are read (indexed by store_id).
+
+    Args:
+        path: Registry JSON or SQLite data store path
+        store_ids: Stores to load (SQLite only; None loads every store)
+
+    Returns:
+        dict: { stores: { store_id: { spark_cpd, target_batch_size, ... } } }
+    """
+    if not is_store_db(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    with closing(_open_store_db(path)) as conn:
+        rows = _query_by_keys(
+            conn,
+            "SELECT store_id, spark_cpd, target_batch_size, last_seen_in_upload, status FROM stores",
+            'store_id', store_ids
+        )
+        metadata = _read_metadata(conn, 'registry')
+
+    stores = {
+        row['store_id']: {k: row[k] for k in row.keys() if k != 'store_id' and row[k] is not None}
+        for row in rows
+    }
+    return {"stores": stores, **metadata}
+
+
+def load_rate_cards(path: str, vendors: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Load vendor rate cards from a JSON file or the SQLite data store.
+
+    From SQLite only the requested vendors are read (indexed by vendor).
+
+    Args:
+        path: Rate cards JSON or SQLite data store path
+        vendors: Normalized vendor names to load (SQLite only; None loads all)
+
+    Returns:
+        dict: { vendors: { vendor: rate card } }
+    """
+    if not is_store_db(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    with closing(_open_store_db(path)) as conn:
+        rows = _query_by_keys(conn, "SELECT vendor, card FROM rate_cards", 'vendor', vendors)
+        metadata = _read_metadata(conn, 'rate_cards')
+
+    return {"vendors": {row['vendor']: json.loads(row['card']) for row in rows}, **metadata}
+
+
 __all__ = [
+    'lazy_import',
+    'parse_cli_options',
+    'parse_cli_request',
+    'load_request_dataset',
+    'get_request_date_range',
+    'load_request_registry',
+    'load_request_rate_cards',
+    'load_store_states',
+    'resolve_states',
+    'map_store_states',
     'load_ca_stores',
+    'filter_states',
     'filter_ca_stores',
+    'analyze_by_state',
+    'run_state_request',
     'parse_date',
     'calculate_otd_percentage',
     'safe_mean',
     'safe_sum',
     'normalize_carrier_name',
+    'normalize_carriers',
+    'encode_categorical',
+    'rows_to_columnar',
     'get_date_range',
+    'sort_by_date',
+    'restore_upload_order',
+    'slice_dates',
+    'clean_nash_data',
+    'is_nash_file',
+    'iter_nash_data',
+    'get_cache_dir',
+    'get_cache_path',
+    'save_cached_frame',
+    'load_cached_frame',
+    'MISSING_TEXT_VALUES',
+    'prune_cache_files',
     'load_nash_data',
+    'is_store_db',
+    'load_store_registry',
+    'load_rate_cards',
+    'NASH_FILE_EXTENSIONS',
+    'STORE_DB_EXTENSIONS',
+    'OUTPUT_FORMATS',
+    'DEFAULT_STATES',
+    'ALL_STATES',
+    'StateSelector',
     'PROJECT_ROOT'
 ]
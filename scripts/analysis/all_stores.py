@@ -1,41 +1,56 @@
 #!/usr/bin/env python3
 """
 All Stores Analysis Module
-Analyze all stores found in Nash CSV data (CA stores only).
+Analyze all stores found in Nash CSV data (CA stores by default).
 """
 
-import pandas as pd
-import json
-import sys
-from typing import Dict, Any, List
-from . import load_nash_data, filter_ca_stores
-from .store_analysis import analyze_store
+from __future__ import annotations
+
+from typing import Dict, Any
+from . import (
+    lazy_import,
+    load_request_dataset,
+    load_request_registry,
+    load_request_rate_cards,
+    filter_states,
+    StateSelector,
+    normalize_carriers,
+    parse_cli_request,
+    rows_to_columnar,
+    run_state_request
+)
+from .store_analysis import analyze_store, STORE_METRIC_COLUMNS
+
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
 
 
 def analyze_all_stores(
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
-    rate_cards: Dict[str, Any]
-) -> Dict[str, List[Dict[str, Any]]]:
+    rate_cards: Dict[str, Any],
+    output_format: str = 'rows',
+    states: StateSelector = None
+) -> Dict[str, Any]:
     """
-    Analyze all CA stores found in Nash data.
+    Analyze all stores of the selected states (CA by default) in Nash data.
 
     Args:
         nash_df: DataFrame with Nash trip data
         store_registry: Store registry with Spark CPD data
         rate_cards: Rate cards for vendors
+        output_format: 'rows' (default) or 'columnar'
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
-        dict: { stores: [array of store metrics] }
+        dict: { stores: [array of store metrics] } for 'rows', or
+              { stores: {metric: [value per store], ...} } for 'columnar'
     """
-    # Filter to CA stores only
-    ca_df = filter_ca_stores(nash_df.copy())
-
-    if ca_df.empty:
-        return {"stores": []}
+    # Filter to the selected states (CA by default)
+    ca_df = filter_states(nash_df.copy(), states)
 
     # Get unique CA store IDs
-    unique_stores = ca_df['Store Id'].unique()
+    unique_stores = ca_df['Store Id'].unique() if not ca_df.empty else []
 
     # Analyze each store
     stores_data = []
@@ -44,33 +59,43 @@ def analyze_all_stores(
             str(store_id),
             nash_df,  # Pass full dataframe
             store_registry,
-            rate_cards
+            rate_cards,
+            states=states
         )
         stores_data.append(store_metrics)
 
+    if output_format == 'columnar':
+        return {"stores": rows_to_columnar(stores_data, columns=STORE_METRIC_COLUMNS)}
+
     return {"stores": stores_data}
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 4:
+    import json
+    import sys
+
+    # CLI mode: python all_stores.py <nash_csv> <registry_json> <rate_cards_json> [--format=columnar]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python all_stores.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'registry_path', 'rate_cards_path'))
+
+    if request is None:
         print(json.dumps({"error": "Missing arguments"}))
         sys.exit(1)
 
-    nash_path = sys.argv[1]
-    registry_path = sys.argv[2]
-    rates_path = sys.argv[3]
-
     # Load data
-    nash_df = load_nash_data(nash_path)
-
-    with open(registry_path, 'r') as f:
-        store_registry = json.load(f)
-
-    with open(rates_path, 'r') as f:
-        rate_cards = json.load(f)
-
-    # Calculate metrics
-    result = analyze_all_stores(nash_df, store_registry, rate_cards)
+    nash_df = load_request_dataset(request)
+
+    # Registry / rate cards: inline, JSON files or the SQLite data store
+    # (only the stores and vendors present in this dataset are read)
+    store_registry = load_request_registry(request, nash_df['Store Id'].astype(str).unique())
+    rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+    # Calculate metrics (keyed by state when a state is requested)
+    result = run_state_request(
+        analyze_all_stores, nash_df, request['params'], store_registry, rate_cards,
+        output_format=request['params'].get('format', 'rows')
+    )
 
     # Print JSON output
     print(json.dumps(result))
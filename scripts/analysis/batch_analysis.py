@@ -4,18 +4,29 @@ Batch Density Analysis Module
 Analyze batch sizes and efficiency.
 """
 
-import pandas as pd
-from typing import Dict, Any
+from __future__ import annotations
+
+from typing import Dict, Any, List, Tuple
 from . import (
-    filter_ca_stores,
+    lazy_import,
+    filter_states,
+    StateSelector,
     safe_mean,
-    safe_sum
+    safe_sum,
+    normalize_carriers,
+    encode_categorical
 )
+from .cpd_analysis import calculate_trip_costs_as_of
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 
 def analyze_batch_density(
     nash_df: pd.DataFrame,
-    store_registry: Dict[str, Any]
+    store_registry: Dict[str, Any],
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Analyze batch sizes vs targets.
@@ -23,12 +34,13 @@ def analyze_batch_density(
     Args:
         nash_df: DataFrame with Nash trip data
         store_registry: Store registry with target batch sizes
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Batch analysis with store-level and overall metrics
     """
-    # Filter to CA stores
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Filter to the selected states (CA by default)
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
         return {
@@ -87,7 +99,8 @@ def analyze_batch_density(
 def identify_underperforming_stores(
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
-    threshold: float = 90.0
+    threshold: float = 90.0,
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Identify stores with batch achievement below threshold.
@@ -96,11 +109,12 @@ def identify_underperforming_stores(
         nash_df: DataFrame with Nash trip data
         store_registry: Store registry with target batch sizes
         threshold: Achievement percentage threshold (default 90%)
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: List of underperforming stores with details
     """
-    batch_analysis = analyze_batch_density(nash_df, store_registry)
+    batch_analysis = analyze_batch_density(nash_df, store_registry, states)
     stores_data = batch_analysis.get('stores', {})
 
     underperforming = {}
@@ -123,7 +137,9 @@ def identify_underperforming_stores(
 
 def get_trip_level_batch_data(
     nash_df: pd.DataFrame,
-    rate_cards: Dict[str, Any]
+    rate_cards: Dict[str, Any],
+    output_format: str = 'rows',
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Get trip-level batch data for scatter plot visualization.
@@ -132,61 +148,278 @@ def get_trip_level_batch_data(
     Args:
         nash_df: DataFrame with Nash trip data
         rate_cards: Rate cards for CPD calculation
+        output_format: 'rows' (default) or 'columnar'. Columnar CPDs are
+            rounded with NumPy, which can differ from the row output by
+            0.01 on exact binary ties.
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
-        dict: { batches: [{carrier, batch_size, cpd}, ...] }
+        dict: { batches: [{carrier, batch_size, cpd}, ...] } for 'rows', or
+              { batches: {carrier: [codes], carrier_dict: [...],
+                          batch_size: [...], cpd: [...]} } for 'columnar'
     """
-    from .cpd_analysis import calculate_van_cpd
-    from . import normalize_carrier_name
+    ca_df = filter_states(nash_df.copy(), states)
 
-    ca_df = filter_ca_stores(nash_df.copy())
+    if ca_df.empty or 'Total Orders' not in ca_df.columns:
+        carriers = np.array([], dtype=object)
+        batch_sizes = np.array([], dtype=np.int64)
+        cpd = np.array([], dtype=float)
+    else:
+        carriers, batch_sizes, cpd = _trip_level_arrays(ca_df, rate_cards)
 
-    if ca_df.empty:
-        return {"batches": []}
+    if output_format == 'columnar':
+        carrier_codes, carrier_dict = encode_categorical(carriers)
+        return {
+            "batches": {
+                "carrier": carrier_codes,
+                "carrier_dict": carrier_dict,
+                "batch_size": batch_sizes.tolist(),
+                "cpd": np.round(cpd, 2).tolist()
+            }
+        }
 
-    # Normalize carrier names
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
+    batches = [
+        {"carrier": carrier, "batch_size": batch_size, "cpd": round(trip_cpd, 2)}
+        for carrier, batch_size, trip_cpd in zip(carriers.tolist(), batch_sizes.tolist(), cpd.tolist())
+    ]
 
-    batches = []
+    return {"batches": batches}
 
-    for _, row in ca_df.iterrows():
-        carrier = row['Carrier_Normalized']
-        batch_size = row.get('Total Orders', 0)
 
-        if pd.isna(batch_size) or batch_size == 0:
-            continue
+def _trip_level_arrays(
+    ca_df: pd.DataFrame,
+    rate_cards: Dict[str, Any]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute carrier, batch size and CPD per costed trip as arrays.
 
-        # Calculate CPD for this trip
-        vendor_rates = rate_cards.get('vendors', {}).get(carrier)
-        if not vendor_rates:
-            continue
+    Trips without orders or without a rate card for their carrier are
+    dropped, matching the per-trip rules of calculate_van_cpd.
+
+    Args:
+        ca_df: CA-filtered DataFrame with Nash trip data
+        rate_cards: Rate cards for CPD calculation
+
+    Returns:
+        tuple: (carriers, batch sizes as int64, CPD per trip)
+    """
+    carriers = normalize_carriers(ca_df['Carrier'])
+    batch = pd.to_numeric(ca_df['Total Orders'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    # Batch sizes are whole orders (int() in the per-trip path)
+    batch = np.trunc(batch)
 
-        trip_cpd = calculate_van_cpd(
-            trip_data=row.to_dict(),
-            rate_card=vendor_rates,
-            batch_size=int(batch_size)
+    dates = ca_df['Date'] if 'Date' in ca_df.columns else None
+    trip_costs = calculate_trip_costs_as_of(carriers, batch, dates, rate_cards)
+    keep = ~np.isnan(batch) & (batch != 0) & ~np.isnan(trip_costs)
+
+    return (
+        carriers.to_numpy()[keep],
+        batch[keep].astype(np.int64),
+        trip_costs[keep] / batch[keep]
+    )
+
+
+def summarize_trip_batches(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    mode: str = 'aggregate',
+    bin_width: int = 5,
+    cpd_bin_width: float = 0.25,
+    max_points: int = 5000,
+    seed: int = 0,
+    output_format: str = 'rows',
+    states: StateSelector = None
+) -> Dict[str, Any]:
+    """
+    Bounded-size alternatives to trip-level scatter data.
+
+    CPD is determined by carrier, batch size and the rate card version in
+    force on the trip date, so the full point cloud collapses onto a small
+    number of distinct cells.
+
+    Modes:
+    - 'aggregate': one cell per (carrier, batch_size) with trip count and
+      mean CPD (trips of one cell priced under different rate card
+      versions differ)
+    - 'binned': 2D bins of batch_size (bin_width) x CPD (cpd_bin_width) per
+      carrier, with trip count and mean batch size / CPD
+    - 'sample': at most max_points trips, stratified by carrier so each
+      carrier keeps its share (and at least one point)
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        rate_cards: Rate cards for CPD calculation
+        mode: 'aggregate', 'binned' or 'sample'
+        bin_width: Batch size bin width for 'binned'
+        cpd_bin_width: CPD bin width for 'binned'
+        max_points: Point cap for 'sample'
+        seed: Random seed for 'sample' (fixed for repeatable charts)
+        output_format: 'rows' (default) or 'columnar'
+        states: State selector (see resolve_states); defaults to CA
+
+    Returns:
+        dict: { mode, total_trips, cells | bins | batches, ... }
+    """
+    if mode not in ('aggregate', 'binned', 'sample'):
+        raise ValueError(f"Unknown scatter mode: {mode}")
+
+    ca_df = filter_states(nash_df.copy(), states)
+
+    if ca_df.empty or 'Total Orders' not in ca_df.columns:
+        carriers = np.array([], dtype=object)
+        batch_sizes = np.array([], dtype=np.int64)
+        cpd = np.array([], dtype=float)
+    else:
+        carriers, batch_sizes, cpd = _trip_level_arrays(ca_df, rate_cards)
+
+    carrier_codes, carrier_dict = pd.factorize(pd.Series(carriers, dtype=object))
+    carrier_dict = list(carrier_dict)
+    result = {"mode": mode, "total_trips": int(len(cpd))}
+
+    if mode == 'aggregate':
+        # Cell key = (carrier, batch size); trips of a cell can span rate
+        # card versions, so the cell reports their mean CPD
+        (cell_carrier, cell_batch), _, inverse, counts = _unique_cells(carrier_codes, batch_sizes)
+        columns = {
+            "carrier": cell_carrier,
+            "batch_size": cell_batch,
+            "count": counts,
+            "cpd": np.round(np.bincount(inverse, weights=cpd, minlength=len(counts)) / counts, 2)
+        }
+        result["cells"] = _format_cells(columns, carrier_dict, output_format)
+
+    elif mode == 'binned':
+        batch_bins = np.floor_divide(batch_sizes, bin_width)
+        cpd_bins = np.floor(cpd / cpd_bin_width).astype(np.int64)
+        (cell_carrier, cell_batch, cell_cpd), _, inverse, counts = _unique_cells(
+            carrier_codes, batch_bins, cpd_bins
         )
+        columns = {
+            "carrier": cell_carrier,
+            "batch_size_start": cell_batch * bin_width,
+            "cpd_start": np.round(cell_cpd * cpd_bin_width, 2),
+            "count": counts,
+            "avg_batch_size": np.round(np.bincount(inverse, weights=batch_sizes, minlength=len(counts)) / counts, 1),
+            "avg_cpd": np.round(np.bincount(inverse, weights=cpd, minlength=len(counts)) / counts, 2)
+        }
+        result["bin_width"] = bin_width
+        result["cpd_bin_width"] = cpd_bin_width
+        result["bins"] = _format_cells(columns, carrier_dict, output_format)
 
-        batches.append({
-            "carrier": carrier,
-            "batch_size": int(batch_size),
-            "cpd": round(trip_cpd, 2)
-        })
+    else:
+        index = _stratified_sample(carrier_codes, max_points, seed)
+        columns = {
+            "carrier": carrier_codes[index],
+            "batch_size": batch_sizes[index],
+            "cpd": np.round(cpd[index], 2)
+        }
+        result["max_points"] = max_points
+        result["batches"] = _format_cells(columns, carrier_dict, output_format)
 
-    return {"batches": batches}
+    return result
+
+
+def _unique_cells(*keys: np.ndarray) -> Tuple[Tuple[np.ndarray, ...], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group rows by several integer key columns.
+
+    The keys are packed into one int64 per row so a single 1D unique
+    replaces a multi-column sort.
+
+    Returns:
+        tuple: (per-key cell values, first row of each cell,
+                cell index per row, row count per cell)
+    """
+    if len(keys[0]) == 0:
+        empty = np.array([], dtype=np.int64)
+        return tuple(empty for _ in keys), empty, empty, empty
+
+    offsets = [key.min() for key in keys]
+    shifted = [key - offset for key, offset in zip(keys, offsets)]
+    dims = tuple(int(key.max()) + 1 for key in shifted)
+    packed = np.ravel_multi_index(shifted, dims)
+
+    cell_keys, first_index, inverse, counts = np.unique(
+        packed, return_index=True, return_inverse=True, return_counts=True
+    )
+    cells = tuple(
+        values + offset
+        for values, offset in zip(np.unravel_index(cell_keys, dims), offsets)
+    )
+    return cells, first_index, inverse.ravel(), counts
+
+
+def _stratified_sample(strata: np.ndarray, max_points: int, seed: int) -> np.ndarray:
+    """
+    Pick at most max_points positions, proportionally per stratum.
+
+    Every non-empty stratum keeps at least one point (while max_points
+    allows; otherwise the largest strata win). Positions are returned in
+    their original order.
+    """
+    n = len(strata)
+    if n <= max_points:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    stratum_ids, counts = np.unique(strata, return_counts=True)
+    k = len(stratum_ids)
+
+    if k >= max_points:
+        quotas = np.zeros(k, dtype=np.int64)
+        quotas[np.argsort(-counts, kind='stable')[:max_points]] = 1
+    else:
+        # One reserved point per stratum, the rest split proportionally
+        quotas = 1 + np.floor((counts - 1) * (max_points - k) / (n - k)).astype(np.int64)
+
+    picks = []
+    for stratum, quota in zip(stratum_ids, quotas):
+        if quota == 0:
+            continue
+        members = np.flatnonzero(strata == stratum)
+        picks.append(rng.choice(members, size=min(quota, len(members)), replace=False))
+    return np.sort(np.concatenate(picks))
 
 
-def batch_size_distribution(nash_df: pd.DataFrame) -> Dict[str, Any]:
+def _format_cells(
+    columns: Dict[str, np.ndarray],
+    carrier_dict: List[Any],
+    output_format: str
+) -> Any:
+    """
+    Emit coded cell arrays as rows or as columnar arrays.
+
+    Args:
+        columns: Arrays keyed by output field; 'carrier' holds codes
+        carrier_dict: Carrier name per code
+        output_format: 'rows' or 'columnar'
+
+    Returns:
+        list or dict: Row objects, or columns plus carrier_dict
+    """
+    lists = {key: np.asarray(values).tolist() for key, values in columns.items()}
+
+    if output_format == 'columnar':
+        lists["carrier_dict"] = carrier_dict
+        return lists
+
+    lists["carrier"] = [carrier_dict[code] for code in lists["carrier"]]
+    keys = list(lists)
+    return [dict(zip(keys, values)) for values in zip(*lists.values())]
+
+
+def batch_size_distribution(nash_df: pd.DataFrame, states: StateSelector = None) -> Dict[str, Any]:
     """
     Analyze distribution of batch sizes.
 
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Batch size distribution statistics
     """
-    ca_df = filter_ca_stores(nash_df.copy())
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty or 'Total Orders' not in ca_df.columns:
         return {
@@ -236,25 +469,45 @@ if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import (
+        load_nash_data, load_request_dataset, load_request_registry,
+        load_request_rate_cards, parse_cli_request, run_state_request, PROJECT_ROOT
+    )
+
+    # CLI mode: python batch_analysis.py <nash_csv> <registry_json> <rate_cards_json>
+    #   [--format=columnar] [--mode=points|aggregate|binned|sample]
+    #   [--bin-width=5] [--cpd-bin-width=0.25] [--max-points=5000]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python batch_analysis.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'registry_path', 'rate_cards_path'))
 
     # Check for CLI arguments
-    if len(sys.argv) >= 4:
-        # CLI mode: python batch_analysis.py <nash_csv> <registry_json> <rate_cards_json>
-        nash_path = sys.argv[1]
-        registry_path = sys.argv[2]
-        rates_path = sys.argv[3]
-
-        nash_df = load_nash_data(nash_path)
-
-        with open(registry_path, 'r') as f:
-            store_registry = json.load(f)
-
-        with open(rates_path, 'r') as f:
-            rate_cards = json.load(f)
-
-        # Return trip-level data for scatter plot
-        trip_data = get_trip_level_batch_data(nash_df, rate_cards)
+    if request is not None:
+        params = request['params']
+        nash_df = load_request_dataset(request)
+
+        # Rate cards: inline, JSON file or the SQLite data store (only the
+        # vendors present in this dataset are read)
+        rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+        output_format = params.get('format', 'rows')
+        mode = params.get('mode', 'points')
+
+        if mode == 'points':
+            # Return trip-level data for scatter plot
+            trip_data = run_state_request(
+                get_trip_level_batch_data, nash_df, params, rate_cards, output_format=output_format
+            )
+        else:
+            # Bounded aggregate / binned / sampled scatter data
+            trip_data = run_state_request(
+                summarize_trip_batches, nash_df, params, rate_cards,
+                mode=mode,
+                bin_width=int(params.get('bin-width', 5)),
+                cpd_bin_width=float(params.get('cpd-bin-width', 0.25)),
+                max_points=int(params.get('max-points', 5000)),
+                output_format=output_format
+            )
         print(json.dumps(trip_data))
     else:
         # Development mode: use example data
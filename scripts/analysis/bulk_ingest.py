@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Bulk Ingest Module
+Validate and clean a backlog of Nash CSVs in parallel, one file per worker.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from . import get_cache_dir, is_nash_file, sort_by_date, restore_upload_order, PROJECT_ROOT
+from .ingest import ingest_nash_file
+from ..validate_nash import NashValidator
+
+# Validator built once per worker process (loading the CA store list is
+# the only setup cost worth sharing across files)
+_WORKER_VALIDATOR: Optional[NashValidator] = None
+
+
+def resolve_nash_files(source: str) -> List[str]:
+    """
+    Resolve a directory or glob pattern to a list of Nash CSV paths.
+
+    Args:
+        source: Directory (all Nash exports inside it) or glob pattern
+
+    Returns:
+        List[str]: Matching file paths, sorted
+    """
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '*')
+    else:
+        pattern = source
+    return sorted(p for p in glob.glob(pattern) if os.path.isfile(p) and is_nash_file(p))
+
+
+def _init_worker(ca_stores_path: str) -> None:
+    """Build the per-process validator."""
+    global _WORKER_VALIDATOR
+    _WORKER_VALIDATOR = NashValidator(ca_stores_path)
+
+
+def _ingest_one(csv_path: str) -> Dict[str, Any]:
+    """
+    Ingest a single file inside a worker, never raising.
+
+    Returns:
+        dict: Per-file summary (the cleaned frame stays in the cache)
+    """
+    started = time.perf_counter()
+    summary = {
+        "file": csv_path,
+        "valid": False,
+        "rows": 0,
+        "cache_path": None,
+        "errors": [],
+        "warnings": 0
+    }
+
+    try:
+        report, clean_df = ingest_nash_file(csv_path, validator=_WORKER_VALIDATOR)
+        summary["valid"] = report["valid"]
+        summary["errors"] = report["errors"]
+        summary["warnings"] = len(report["warnings"])
+        if clean_df is not None:
+            summary["rows"] = len(clean_df)
+            summary["cache_path"] = report["cache_path"]
+    except Exception as e:
+        # Isolate failures so one bad export never sinks the batch
+        summary["errors"] = [{
+            "type": "INGEST_ERROR",
+            "message": f"Error during ingest: {str(e)}"
+        }]
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def bulk_ingest(
+    source: str,
+    output_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    ca_stores_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Ingest every Nash export in a directory or glob and merge the valid ones.
+
+    Plain and compressed exports (.csv.gz, .csv.zst, .zip) can be mixed.
+    Files are parsed and validated in a process pool, largest first, so
+    wall time tracks the largest single file. Each worker persists its
+    cleaned frame to the cache; the valid frames are then concatenated
+    into one typed dataset that load_nash_data can read directly.
+
+    Args:
+        source: Directory or glob pattern of Nash CSVs
+        output_path: Where to write the merged dataset (.pkl); defaults to
+            a timestamped file in the cache directory
+        workers: Worker process count (defaults to CPU count)
+        ca_stores_path: Path to the CA stores CSV (defaults to States/)
+
+    Returns:
+        dict: Per-file results, batch summary and merged output path
+    """
+    started = time.perf_counter()
+    files = resolve_nash_files(source)
+
+    if ca_stores_path is None:
+        ca_stores_path = os.path.join(PROJECT_ROOT, 'States', 'walmart_stores_ca_only.csv')
+
+    results = []
+    if files:
+        # Largest first keeps the longest file from starting last
+        ordered = sorted(files, key=os.path.getsize, reverse=True)
+        max_workers = min(workers or os.cpu_count() or 1, len(ordered))
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(ca_stores_path,)
+        ) as pool:
+            futures = [pool.submit(_ingest_one, path) for path in ordered]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    results.sort(key=lambda r: r["file"])
+
+    # Merge valid frames into a single dataset: files in name order, each
+    # in its upload order, then sorted by date once
+    frames = [restore_upload_order(pd.read_pickle(r["cache_path"])) for r in results if r["cache_path"]]
+    merged_rows = 0
+    if frames:
+        merged = sort_by_date(pd.concat(frames, ignore_index=True))
+        merged_rows = len(merged)
+        if output_path is None:
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            output_path = os.path.join(get_cache_dir(), f"nash_merged_{stamp}.pkl")
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        merged.to_pickle(output_path)
+    else:
+        output_path = None
+
+    succeeded = sum(1 for r in results if r["cache_path"])
+
+    return {
+        "files": results,
+        "summary": {
+            "total_files": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "total_rows": merged_rows,
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "max_file_seconds": max((r["seconds"] for r in results), default=0.0)
+        },
+        "output_path": output_path
+    }
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "Missing arguments"}))
+        sys.exit(1)
+
+    # CLI mode: python bulk_ingest.py <dir_or_glob> [output_pkl] [workers]
+    source = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) >= 3 else None
+    workers = int(sys.argv[3]) if len(sys.argv) >= 4 else None
+
+    result = bulk_ingest(source, output_path, workers)
+    print(json.dumps(result))
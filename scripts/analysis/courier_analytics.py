@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Courier Analytics Module
+Rank drivers by on-time delivery, drops per hour, dwell time and failed
+order rate, per carrier, with bounded top / bottom pages.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Any, List
+from . import lazy_import, filter_states, StateSelector, normalize_carriers, MISSING_TEXT_VALUES
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Ranked metrics: name -> True when higher is better
+COURIER_METRICS = {
+    'otd_percentage': True,
+    'drops_per_hour': True,
+    'avg_dwell_time': False,
+    'failed_orders_rate': False
+}
+
+DEFAULT_LIMIT = 10
+
+# Drivers with fewer trips are counted but not ranked
+DEFAULT_MIN_TRIPS = 5
+
+
+def _column_sums(df: pd.DataFrame, column: str, codes: np.ndarray, size: int) -> tuple:
+    """Per-code sum and non-null count of a numeric column (zeros when absent)."""
+    if column not in df.columns:
+        return np.zeros(size), np.zeros(size)
+    values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    present = ~np.isnan(values)
+    sums = np.bincount(codes[present], weights=values[present], minlength=size)
+    counts = np.bincount(codes[present], minlength=size)
+    return sums, counts
+
+
+def _ratio(part: np.ndarray, whole: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """part / whole * scale, NaN where whole is 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(whole > 0, part / np.where(whole > 0, whole, 1) * scale, np.nan)
+
+
+def courier_stats(nash_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate trips per carrier x courier on integer codes.
+
+    Carrier and courier names are factorized once; each (carrier, courier)
+    pair is packed into one int64 key, and every measure is a bincount over
+    the pair index, so no grouping touches the name strings.
+
+    Args:
+        nash_df: Trips (already state-filtered)
+
+    Returns:
+        pd.DataFrame: One row per driver with carrier, courier, trips and
+            the COURIER_METRICS (NaN when a driver has no data for one),
+            in first-appearance order of carrier codes
+    """
+    columns = ['carrier', 'courier', 'trips'] + list(COURIER_METRICS)
+    if nash_df.empty or 'Courier Name' not in nash_df.columns:
+        return pd.DataFrame(columns=columns)
+
+    couriers = nash_df['Courier Name'].astype(str)
+    named = (~couriers.isin(MISSING_TEXT_VALUES)).to_numpy()
+    df = nash_df[named]
+
+    carrier_codes, carrier_names = pd.factorize(normalize_carriers(df['Carrier']))
+    courier_codes, courier_names = pd.factorize(couriers[named])
+
+    # One key per (carrier, courier) pair, renumbered densely
+    packed = carrier_codes.astype(np.int64) * len(courier_names) + courier_codes
+    pairs, index, trips = np.unique(packed, return_inverse=True, return_counts=True)
+    index = index.ravel()
+    size = len(pairs)
+
+    ontime, ontime_count = _column_sums(df, 'Is Pickup Arrived Ontime', index, size)
+    drops, drops_count = _column_sums(df, 'Drops Per Hour Trip', index, size)
+    dwell, dwell_count = _column_sums(df, 'Driver Dwell Time', index, size)
+    failed, _ = _column_sums(df, 'Failed Orders', index, size)
+    orders, _ = _column_sums(df, 'Total Orders', index, size)
+
+    pair_carriers, pair_couriers = np.divmod(pairs, len(courier_names))
+    return pd.DataFrame({
+        'carrier': np.asarray(carrier_names, dtype=object)[pair_carriers],
+        'courier': np.asarray(courier_names, dtype=object)[pair_couriers],
+        'trips': trips,
+        'otd_percentage': _ratio(ontime, ontime_count, 100),
+        'drops_per_hour': _ratio(drops, drops_count),
+        'avg_dwell_time': _ratio(dwell, dwell_count),
+        'failed_orders_rate': _ratio(failed, orders, 100)
+    }, columns=columns)
+
+
+def select_ranked(
+    values: np.ndarray,
+    trips: np.ndarray,
+    offset: int,
+    limit: int
+) -> np.ndarray:
+    """
+    Positions of ranks offset..offset+limit by ascending value.
+
+    Partial selection: argpartition finds the (offset + limit) smallest
+    values in linear time, and only those (plus ties at the cut) are
+    sorted. Ties rank more trips first, then by position, as a full sort
+    would.
+
+    Args:
+        values: Ranking value per driver (no NaN)
+        trips: Trips per driver
+        offset: Ranks to skip
+        limit: Ranks to return
+
+    Returns:
+        np.ndarray: Positions into values, best first
+    """
+    end = offset + limit
+    if limit <= 0 or offset >= len(values):
+        return np.array([], dtype=np.int64)
+
+    if end < len(values):
+        cut = values[np.argpartition(values, end - 1)[end - 1]]
+        candidates = np.flatnonzero(values <= cut)
+    else:
+        candidates = np.arange(len(values))
+
+    order = np.lexsort((candidates, -trips[candidates], values[candidates]))
+    return candidates[order[offset:end]]
+
+
+def rank_couriers(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None,
+    metric: str = 'otd_percentage',
+    limit: int = DEFAULT_LIMIT,
+    offset: int = 0,
+    min_trips: int = DEFAULT_MIN_TRIPS
+) -> Dict[str, Any]:
+    """
+    Top and bottom drivers per carrier by one metric, one page at a time.
+
+    The response holds at most 2 x limit drivers per carrier however many
+    drivers there are; offset pages further into both ends.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
+        metric: Ranking metric, one of COURIER_METRICS
+        limit: Drivers per page at each end
+        offset: Ranks to skip at each end
+        min_trips: Drivers with fewer trips are not ranked
+
+    Returns:
+        dict: { metric, limit, offset, min_trips, by_carrier: { carrier:
+            { drivers, ranked, top: [...], bottom: [...] } } }, each driver
+            { rank, courier, trips, otd_percentage, drops_per_hour,
+            avg_dwell_time, failed_orders_rate }
+    """
+    if metric not in COURIER_METRICS:
+        raise ValueError(f"Unknown courier metric: {metric}")
+    if limit < 0 or offset < 0:
+        raise ValueError(f"Invalid page: limit={limit}, offset={offset}")
+
+    stats = courier_stats(filter_states(nash_df.copy(), states))
+
+    by_carrier = {}
+    for carrier, drivers in stats.groupby('carrier', sort=False):
+        values = drivers[metric].to_numpy(dtype=float)
+        trips = drivers['trips'].to_numpy()
+        eligible = np.flatnonzero((trips >= min_trips) & ~np.isnan(values))
+
+        # Best first: negate metrics where higher is better
+        best = -values[eligible] if COURIER_METRICS[metric] else values[eligible]
+        top = eligible[select_ranked(best, trips[eligible], offset, limit)]
+        bottom = eligible[select_ranked(-best, trips[eligible], offset, limit)]
+
+        by_carrier[carrier] = {
+            "drivers": len(drivers),
+            "ranked": len(eligible),
+            "top": _driver_rows(drivers, top, offset),
+            "bottom": _driver_rows(drivers, bottom, offset)
+        }
+
+    return {
+        "metric": metric,
+        "limit": limit,
+        "offset": offset,
+        "min_trips": min_trips,
+        "by_carrier": by_carrier
+    }
+
+
+def parse_ranking_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read and check the rank_couriers arguments of a CLI request.
+
+    Args:
+        params: Request params (metric, limit, offset, min-trips)
+
+    Returns:
+        dict: metric, limit, offset and min_trips keyword arguments
+
+    Raises:
+        ValueError: If the metric is unknown or a count is not a
+            non-negative integer
+    """
+    metric = params.get('metric', 'otd_percentage')
+    if metric not in COURIER_METRICS:
+        raise ValueError(f"Unknown courier metric: {metric}")
+
+    counts = {}
+    for name, key, default in (
+        ('limit', 'limit', DEFAULT_LIMIT),
+        ('offset', 'offset', 0),
+        ('min_trips', 'min-trips', DEFAULT_MIN_TRIPS)
+    ):
+        value = params.get(key, default)
+        try:
+            counts[name] = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {key}: {value!r} (expected an integer)") from None
+        if counts[name] < 0:
+            raise ValueError(f"Invalid {key}: {value!r} (expected an integer >= 0)")
+
+    return {"metric": metric, **counts}
+
+
+def _driver_rows(drivers: pd.DataFrame, positions: np.ndarray, offset: int) -> List[Dict[str, Any]]:
+    """Driver rows for a page of positions, ranked from offset + 1."""
+    rows = []
+    for rank, (_, driver) in enumerate(drivers.iloc[positions].iterrows(), start=offset + 1):
+        row = {"rank": rank, "courier": driver['courier'], "trips": int(driver['trips'])}
+        for metric in COURIER_METRICS:
+            value = driver[metric]
+            row[metric] = None if pd.isna(value) else round(float(value), 2)
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    import json
+    import os
+    import sys
+    from . import load_nash_data, load_request_dataset, parse_cli_request, run_state_request, PROJECT_ROOT
+
+    # CLI mode: python courier_analytics.py <nash_csv>
+    #   [--metric=otd_percentage|drops_per_hour|avg_dwell_time|failed_orders_rate]
+    #   [--limit=10] [--offset=0] [--min-trips=5] [--state=CA,TX|ALL] [--workers=N]
+    #   or: python courier_analytics.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset',))
+
+    # Check for CLI arguments
+    if request is not None:
+        params = request['params']
+        try:
+            ranking_params = parse_ranking_params(params)
+        except ValueError as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+
+        nash_df = load_request_dataset(request)
+        ranking = run_state_request(rank_couriers, nash_df, params, **ranking_params)
+        print(json.dumps(ranking))
+    else:
+        # Development mode: use example data
+        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        nash_df = load_nash_data(nash_path)
+
+        for metric in COURIER_METRICS:
+            print(f"Drivers by {metric}:")
+            print(json.dumps(rank_couriers(nash_df, metric=metric, limit=3, min_trips=1), indent=2))
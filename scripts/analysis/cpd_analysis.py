@@ -4,12 +4,138 @@ CPD (Cost Per Delivery) Analysis Module
 Calculate and compare Van CPD vs Spark CPD.
 """
 
-import pandas as pd
-from typing import Dict, Any
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, Any, List, Tuple
 from . import (
-    filter_ca_stores,
-    normalize_carrier_name
+    lazy_import,
+    filter_states,
+    StateSelector,
+    normalize_carrier_name,
+    normalize_carriers,
+    encode_categorical,
+    rows_to_columnar
+)
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Keys of compare_cpd's store and excluded trip rows, in order
+STORE_CPD_COLUMNS = (
+    'store_id', 'van_cpd', 'spark_cpd', 'savings', 'savings_percentage',
+    'van_orders', 'included_trips', 'excluded_trips'
 )
+EXCLUDED_TRIP_COLUMNS = ('store_id', 'date', 'carrier', 'batch_size', 'reason')
+
+# Legacy two-tier cards: base_rate_80 up to this batch size, base_rate_100 above
+LEGACY_TIER_BREAKPOINT = 80
+LEGACY_RATE_FIELDS = ('base_rate_80', 'base_rate_100')
+
+
+def get_rate_tiers(rate_card: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get a rate card's tier breakpoints and rates.
+
+    Tiered cards list { "max_orders": int, "rate": float } entries; the
+    last tier is open-ended (its max_orders may be null). Legacy cards map
+    to two tiers: base_rate_80 up to 80 orders, base_rate_100 above.
+
+    Args:
+        rate_card: Rate card for the vendor
+
+    Returns:
+        tuple: (ascending breakpoints, rates) where a batch of n orders
+               uses rates[searchsorted(breakpoints, n, side='left')]
+    """
+    tiers = rate_card.get('tiers')
+    if tiers:
+        ordered = sorted(
+            tiers,
+            key=lambda t: float('inf') if t.get('max_orders') is None else t['max_orders']
+        )
+        breakpoints = [t['max_orders'] for t in ordered[:-1]]
+        rates = [t.get('rate', 0) for t in ordered]
+    else:
+        breakpoints = [LEGACY_TIER_BREAKPOINT]
+        rates = [rate_card.get('base_rate_80', 0), rate_card.get('base_rate_100', 0)]
+
+    return np.asarray(breakpoints, dtype=float), np.asarray(rates, dtype=float)
+
+
+def calculate_trip_cost(rate_card: Dict[str, Any], batch_size: int) -> float:
+    """
+    Calculate the cost of a single trip.
+
+    Formula:
+    - Pick the tier rate for batch_size (see get_rate_tiers)
+    - Add per_stop_surcharge for every order in the batch
+    - Apply contractual_adjustment multiplier
+
+    Args:
+        rate_card: Rate card for the vendor
+        batch_size: Number of orders in the batch
+
+    Returns:
+        float: Trip cost
+    """
+    breakpoints, rates = get_rate_tiers(rate_card)
+    base_rate = float(rates[bisect_left(breakpoints.tolist(), batch_size)])
+    surcharge = rate_card.get('per_stop_surcharge', 0) * batch_size
+
+    adjustment = rate_card.get('contractual_adjustment', 1.0)
+    return float((base_rate + surcharge) * adjustment)
+
+
+def get_rate_card_versions(rate_card: Dict[str, Any]) -> List[Tuple[pd.Timestamp, Dict[str, Any]]]:
+    """
+    List every version of a vendor rate card, oldest first.
+
+    The card's own fields are the current version; earlier versions live
+    in its 'history' list. Each version is in force from its
+    'effective_from' date until the next one; a missing date means "since
+    the beginning".
+
+    Args:
+        rate_card: Rate card for the vendor
+
+    Returns:
+        list: (effective_from, pricing fields) per version
+    """
+    def pricing(card: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in card.items() if k not in ('history', 'effective_from')}
+
+    versions = [
+        (pd.Timestamp(card['effective_from']) if card.get('effective_from') else pd.Timestamp.min, pricing(card))
+        for card in list(rate_card.get('history', [])) + [rate_card]
+    ]
+    # Stable sort keeps the current card last among equal dates
+    return sorted(versions, key=lambda v: v[0])
+
+
+def rate_card_as_of(rate_card: Dict[str, Any], date: Any) -> Dict[str, Any]:
+    """
+    Get the rate card version in force on a date.
+
+    Dates before the first version get the first version; missing dates
+    get the current one.
+
+    Args:
+        rate_card: Rate card for the vendor
+        date: Trip date (anything pd.Timestamp accepts)
+
+    Returns:
+        dict: Pricing fields of the version in force
+    """
+    versions = get_rate_card_versions(rate_card)
+    date = pd.to_datetime(date, errors='coerce')
+    if pd.isna(date):
+        return versions[-1][1]
+
+    in_force = [fields for start, fields in versions if start <= date]
+    return in_force[-1] if in_force else versions[0][1]
 
 
 def calculate_van_cpd(
@@ -21,10 +147,10 @@ def calculate_van_cpd(
     Calculate Van CPD for a trip.
 
     Formula:
-    - If batch_size <= 80: use base_rate_80
-    - If batch_size > 80: use base_rate_100
-    - Apply contractual_adjustment multiplier
-    - CPD = (rate * adjustment) / batch_size
+    - Trip cost from calculate_trip_cost (tier rate, per-stop surcharge,
+      contractual_adjustment), using the rate card version in force on
+      the trip's Date
+    - CPD = trip_cost / batch_size
 
     Args:
         trip_data: Dictionary with trip information
@@ -37,26 +163,156 @@ def calculate_van_cpd(
     if batch_size == 0:
         return 0.0
 
-    # Determine which base rate to use
-    if batch_size <= 80:
-        base_rate = rate_card.get('base_rate_80', 0)
-    else:
-        base_rate = rate_card.get('base_rate_100', 0)
-
-    # Apply contractual adjustment
-    adjustment = rate_card.get('contractual_adjustment', 1.0)
-    trip_cost = base_rate * adjustment
+    # Price with the rate card version in force on the trip date
+    if rate_card.get('history'):
+        rate_card = rate_card_as_of(rate_card, trip_data.get('Date'))
 
     # Calculate CPD
-    cpd = trip_cost / batch_size
+    cpd = calculate_trip_cost(rate_card, batch_size) / batch_size
     return cpd
 
 
+def calculate_trip_costs(
+    carriers: pd.Series,
+    batch_sizes: Any,
+    rate_cards: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Calculate trip costs for a whole column of trips in one pass.
+
+    Vectorized equivalent of calculate_trip_cost: each vendor's tier is
+    found with np.searchsorted over the batch-size column, so the cost
+    stays one columnar pass per vendor whatever the tier count.
+
+    Args:
+        carriers: Normalized carrier name per trip
+        batch_sizes: Batch size (Total Orders) per trip
+        rate_cards: Rate cards for vendors
+
+    Returns:
+        np.ndarray: Trip cost per trip (NaN where the carrier has no rate card)
+    """
+    vendors = rate_cards.get('vendors', {})
+    batch = np.asarray(batch_sizes, dtype=float)
+    codes, uniques = pd.factorize(pd.Series(carriers))
+    costs = np.full(len(batch), np.nan)
+
+    for code, carrier in enumerate(uniques):
+        rate_card = vendors.get(carrier)
+        if not rate_card:
+            continue
+
+        mask = codes == code
+        breakpoints, rates = get_rate_tiers(rate_card)
+        vendor_batch = batch[mask]
+        base_rate = rates[np.searchsorted(breakpoints, vendor_batch, side='left')]
+        surcharge = rate_card.get('per_stop_surcharge', 0) * vendor_batch
+        costs[mask] = (base_rate + surcharge) * rate_card.get('contractual_adjustment', 1.0)
+
+    return costs
+
+
+def calculate_trip_costs_as_of(
+    carriers: pd.Series,
+    batch_sizes: Any,
+    dates: Any,
+    rate_cards: Dict[str, Any]
+) -> np.ndarray:
+    """
+    Calculate trip costs with the rate card version in force on each trip date.
+
+    Each (vendor, version) pair becomes its own rate card, and trips are
+    matched to versions with an as-of merge on date by vendor. Cost then
+    goes through calculate_trip_costs in a single pass. Without any
+    rate-card history this is exactly calculate_trip_costs.
+
+    Args:
+        carriers: Normalized carrier name per trip
+        batch_sizes: Batch size (Total Orders) per trip
+        dates: Trip date per trip (None prices every trip at current rates)
+        rate_cards: Rate cards for vendors, optionally with 'history'
+
+    Returns:
+        np.ndarray: Trip cost per trip (NaN where the carrier has no rate card)
+    """
+    vendors = {v: r for v, r in rate_cards.get('vendors', {}).items() if r}
+    if dates is None or not any(r.get('history') for r in vendors.values()):
+        return calculate_trip_costs(carriers, batch_sizes, rate_cards)
+
+    codes, uniques = pd.factorize(pd.Series(carriers).reset_index(drop=True))
+
+    # One row per (carrier, version), keyed by integer codes
+    version_cards = {}
+    version_rows = []
+    first_version = np.full(len(uniques) + 1, -1)
+    last_version = np.full(len(uniques) + 1, -1)
+    for code, carrier in enumerate(uniques):
+        rate_card = vendors.get(carrier)
+        if not rate_card:
+            continue
+        for effective_from, fields in get_rate_card_versions(rate_card):
+            version_id = len(version_cards)
+            version_cards[version_id] = fields
+            version_rows.append((code, effective_from, version_id))
+            if first_version[code] < 0:
+                first_version[code] = version_id
+            last_version[code] = version_id
+
+    versions = pd.DataFrame(version_rows, columns=['carrier', 'effective_from', 'version'])
+    versions['effective_from'] = versions['effective_from'].astype('datetime64[ns]')
+    versions = versions.sort_values('effective_from', kind='stable')
+
+    # Undated trips use the current version (code -1 = unknown carrier
+    # picks the trailing -1 sentinel)
+    trip_versions = last_version[codes]
+
+    trip_dates = pd.to_datetime(pd.Series(dates).reset_index(drop=True), errors='coerce')
+    trip_dates = trip_dates.astype('datetime64[ns]').to_numpy()
+    dated = np.flatnonzero(~np.isnat(trip_dates) & (codes >= 0))
+    if len(dated) and len(versions):
+        dated = dated[np.argsort(trip_dates[dated], kind='stable')]
+        matched = pd.merge_asof(
+            pd.DataFrame({'date': trip_dates[dated], 'carrier': codes[dated]}),
+            versions,
+            left_on='date', right_on='effective_from',
+            by='carrier', direction='backward'
+        )['version'].to_numpy(dtype=float, na_value=np.nan, copy=True)
+        # Trips older than every version use the first one
+        unmatched = np.isnan(matched)
+        matched[unmatched] = first_version[codes[dated[unmatched]]]
+        trip_versions[dated] = matched.astype(np.int64)
+
+    return calculate_trip_costs(pd.Series(trip_versions), batch_sizes, {"vendors": version_cards})
+
+
+def price_trips(df: pd.DataFrame, rate_cards: Dict[str, Any]) -> np.ndarray:
+    """
+    Calculate the cost of every trip in a Nash DataFrame.
+
+    Batch sizes are truncated to whole orders and each trip is priced with
+    the rate card version in force on its Date (see
+    calculate_trip_costs_as_of).
+
+    Args:
+        df: DataFrame with Nash trip data
+        rate_cards: Rate cards for vendors
+
+    Returns:
+        np.ndarray: Trip cost per row (NaN without orders or rate card)
+    """
+    batch = np.trunc(pd.to_numeric(df['Total Orders'], errors='coerce').to_numpy(dtype=float, na_value=np.nan))
+    carriers = df['Carrier_Normalized'] if 'Carrier_Normalized' in df.columns else normalize_carriers(df['Carrier'])
+    dates = df['Date'] if 'Date' in df.columns else None
+    return calculate_trip_costs_as_of(carriers, batch, dates, rate_cards)
+
+
 def compare_cpd(
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
     rate_cards: Dict[str, Any],
-    min_batch_size: int = 10
+    min_batch_size: int = 10,
+    output_format: str = 'rows',
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Compare Van CPD vs Spark CPD for all stores with anomaly exclusion.
@@ -66,18 +322,25 @@ def compare_cpd(
         store_registry: Store registry with Spark CPD data
         rate_cards: Rate cards for vendors
         min_batch_size: Minimum batch size to include (default 10, excludes anomalies)
+        output_format: 'rows' (default) or 'columnar' - columnar returns
+            stores and excluded_trips as struct-of-arrays, with the
+            excluded trips' store_id, carrier and reason dictionary-encoded
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Comparison data with store-level and overall metrics
               stores is an ARRAY of objects (not a dict)
               Includes exclusion metrics for transparency
     """
-    # Filter to CA stores
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Filter to the selected states (CA by default)
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
+        stores, excluded_trips = [], []
+        if output_format == 'columnar':
+            stores, excluded_trips = _columnar_cpd_rows(stores, excluded_trips)
         return {
-            "stores": [],
+            "stores": stores,
             "overall": {
                 "avg_van_cpd": 0.0,
                 "avg_spark_cpd": 0.0,
@@ -85,13 +348,16 @@ def compare_cpd(
             },
             "exclusions": {
                 "total_excluded": 0,
-                "excluded_trips": []
+                "excluded_trips": excluded_trips
             }
         }
 
     # Normalize carrier names
     ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
 
+    # Price every trip with the rate card version in force on its date
+    ca_df['Trip_Cost'] = price_trips(ca_df, rate_cards)
+
     # Track exclusions
     excluded_trips = []
     total_excluded = 0
@@ -131,19 +397,12 @@ def compare_cpd(
                 excluded_for_store += 1
                 continue
 
-            vendor_rates = rate_cards.get('vendors', {}).get(carrier)
-            if not vendor_rates:
+            # Trip cost (not CPD yet); NaN when the carrier has no rate card
+            trip_cost = row['Trip_Cost']
+            if pd.isna(trip_cost):
                 continue
 
-            # Calculate trip cost (not CPD yet)
             batch_size_int = int(batch_size)
-            if batch_size_int <= 80:
-                base_rate = vendor_rates.get('base_rate_80', 0)
-            else:
-                base_rate = vendor_rates.get('base_rate_100', 0)
-
-            adjustment = vendor_rates.get('contractual_adjustment', 1.0)
-            trip_cost = base_rate * adjustment
 
             total_cost += trip_cost
             total_orders += batch_size_int
@@ -191,6 +450,9 @@ def compare_cpd(
     }
     overall["avg_savings"] = round(overall["avg_spark_cpd"] - overall["avg_van_cpd"], 2)
 
+    if output_format == 'columnar':
+        store_cpd_list, excluded_trips = _columnar_cpd_rows(store_cpd_list, excluded_trips)
+
     return {
         "stores": store_cpd_list,
         "overall": overall,
@@ -202,74 +464,367 @@ def compare_cpd(
     }
 
 
-def calculate_cpd_by_carrier(
+def apply_rate_card_scenario(
+    rate_cards: Dict[str, Any],
+    scenario: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Build a scenario's rate cards by overlaying its vendor overrides.
+
+    Args:
+        rate_cards: Base rate cards for vendors
+        scenario: { "name": ..., "vendors": { vendor: { field: value } } }
+            where each vendor dict holds only the fields that change
+
+    Returns:
+        dict: Rate cards with the scenario applied (base is not modified)
+
+    Raises:
+        ValueError: If a scenario sets legacy base rates on a tiered card,
+            where get_rate_tiers would ignore them
+    """
+    vendors = {v: dict(r) for v, r in rate_cards.get('vendors', {}).items()}
+    for vendor, overrides in scenario.get('vendors', {}).items():
+        card = {**vendors.get(vendor, {}), **overrides}
+        legacy = [field for field in LEGACY_RATE_FIELDS if field in overrides]
+        if card.get('tiers') and legacy:
+            raise ValueError(
+                f"Scenario {scenario.get('name')!r} sets {', '.join(legacy)} on "
+                f"{vendor}'s tiered rate card; override 'tiers' instead"
+            )
+        vendors[vendor] = card
+    return {**rate_cards, "vendors": vendors}
+
+
+def _columnar_cpd_rows(
+    store_cpd_list: List[Dict[str, Any]],
+    excluded_trips: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """compare_cpd's store and excluded trip rows as struct-of-arrays."""
+    return (
+        rows_to_columnar(store_cpd_list, columns=STORE_CPD_COLUMNS),
+        rows_to_columnar(
+            excluded_trips, categorical=('store_id', 'carrier', 'reason'),
+            columns=EXCLUDED_TRIP_COLUMNS
+        )
+    )
+
+
+def compare_cpd_scenarios(
     nash_df: pd.DataFrame,
-    rate_cards: Dict[str, Any]
-) -> Dict[str, float]:
+    store_registry: Dict[str, Any],
+    rate_cards: Dict[str, Any],
+    scenarios: List[Dict[str, Any]],
+    min_batch_size: int = 10,
+    output_format: str = 'rows',
+    states: StateSelector = None
+) -> Dict[str, Any]:
     """
-    Calculate average CPD for each carrier.
+    Evaluate compare_cpd for many rate-card variants in one pass.
+
+    Trip cost depends only on carrier, batch size and (with rate-card
+    history) date, so trips are first collapsed to distinct (store,
+    carrier, batch size[, date]) groups. Each group is priced with the
+    version in force on its date, the scenario's overrides applying to the
+    current version. Costs are then computed as a (groups x scenarios)
+    matrix and summed per store, giving the van CPD and savings vs
+    spark_cpd of every store under every scenario without re-reading the
+    trips.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        store_registry: Store registry with Spark CPD data
+        rate_cards: Base rate cards for vendors
+        scenarios: Rate-card variants, each { "name": ..., "vendors": {...} }
+            with per-vendor overrides applied on top of rate_cards
+        min_batch_size: Minimum batch size to include (default 10)
+        output_format: 'rows' (default) or 'columnar' - columnar returns
+            stores as struct-of-arrays with scenario and store_id
+            dictionary-encoded
+        states: State selector (see resolve_states); defaults to CA
+
+    Returns:
+        dict: { scenarios: [{name, overall}], stores: scenario-by-store
+                table, exclusions }
+    """
+    names = [s.get('name') or f"scenario_{i + 1}" for i, s in enumerate(scenarios)]
+    variants = [apply_rate_card_scenario(rate_cards, s) for s in scenarios]
+
+    ca_df = filter_states(nash_df.copy(), states)
+    if ca_df.empty or 'Total Orders' not in ca_df.columns:
+        ca_df = pd.DataFrame({'Store Id': [], 'Carrier': [], 'Total Orders': []})
+
+    batch = pd.to_numeric(ca_df['Total Orders'], errors='coerce')
+    valid = batch.notna() & (batch != 0)
+    excluded = valid & (batch < min_batch_size)
+    included = valid & ~excluded
+
+    trips = pd.DataFrame({
+        'store_id': ca_df.loc[included, 'Store Id'].astype(str),
+        'carrier': normalize_carriers(ca_df.loc[included, 'Carrier']),
+        'batch_size': batch[included].astype(np.int64)
+    })
+    keys = ['store_id', 'carrier', 'batch_size']
+
+    # Dates only split groups when some rate card has history to price by
+    dated = 'Date' in ca_df.columns and any(
+        card.get('history') for v in variants for card in v.get('vendors', {}).values() if card
+    )
+    if dated:
+        trips['date'] = pd.to_datetime(ca_df.loc[included, 'Date'], format='mixed', errors='coerce')
+        keys.append('date')
+    groups = trips.groupby(keys, sort=True, dropna=False).size().reset_index(name='trips')
+    group_dates = groups['date'] if dated else None
+
+    # (groups x scenarios) cost and order matrices; groups whose carrier
+    # has no rate card in a scenario contribute nothing to it
+    group_trips = groups['trips'].to_numpy(dtype=float)
+    group_orders = groups['batch_size'].to_numpy(dtype=float) * group_trips
+    trip_costs = np.column_stack([
+        calculate_trip_costs_as_of(groups['carrier'], groups['batch_size'], group_dates, v) for v in variants
+    ]) if variants else np.empty((len(groups), 0))
+    priced = ~np.isnan(trip_costs)
+    costs = np.where(priced, trip_costs * group_trips[:, None], 0.0)
+    orders = priced * group_orders[:, None]
+    trip_counts = priced * group_trips[:, None]
+
+    # Reduce groups to (stores x scenarios); groups are sorted by store
+    group_stores = groups['store_id'].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, group_stores[1:] != group_stores[:-1]]) if len(groups) else np.array([], dtype=np.int64)
+    store_ids = group_stores[starts]
+    if len(starts):
+        store_costs = np.add.reduceat(costs, starts, axis=0)
+        store_orders = np.add.reduceat(orders, starts, axis=0)
+        store_trips = np.add.reduceat(trip_counts, starts, axis=0)
+    else:
+        store_costs = store_orders = store_trips = np.empty((0, len(variants)))
+
+    registry = store_registry.get('stores', {})
+    spark = np.array(
+        [registry.get(str(sid), {}).get('spark_cpd', 5.70) for sid in store_ids],  # Default if not found
+        dtype=float
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        van_cpd = store_costs / store_orders
+
+    columns = {k: [] for k in (
+        'scenario', 'store_id', 'van_cpd', 'spark_cpd', 'savings',
+        'savings_percentage', 'van_orders', 'included_trips'
+    )}
+    scenario_results = []
+    for k, name in enumerate(names):
+        present = store_orders[:, k] > 0
+        cpd_k = van_cpd[present, k]
+        spark_k = spark[present]
+        savings_k = spark_k - cpd_k
+        pct_k = np.divide(savings_k * 100, spark_k, out=np.zeros_like(savings_k), where=spark_k > 0)
+
+        columns['scenario'].extend([name] * int(present.sum()))
+        columns['store_id'].extend(store_ids[present].tolist())
+        columns['van_cpd'].extend(round(v, 2) for v in cpd_k.tolist())
+        columns['spark_cpd'].extend(round(v, 2) for v in spark_k.tolist())
+        columns['savings'].extend(round(v, 2) for v in savings_k.tolist())
+        columns['savings_percentage'].extend(round(v, 1) for v in pct_k.tolist())
+        columns['van_orders'].extend(int(v) for v in store_orders[present, k].tolist())
+        columns['included_trips'].extend(int(v) for v in store_trips[present, k].tolist())
+
+        # Weighted by order volume, as in compare_cpd
+        total_orders = store_orders[present, k].sum()
+        overall_van_cpd = store_costs[present, k].sum() / total_orders if total_orders > 0 else 0.0
+        overall = {
+            "avg_van_cpd": round(float(overall_van_cpd), 2),
+            "avg_spark_cpd": round(float(spark_k.mean()), 2) if len(spark_k) else 0.0
+        }
+        overall["avg_savings"] = round(overall["avg_spark_cpd"] - overall["avg_van_cpd"], 2)
+        scenario_results.append({"name": name, "overall": overall})
+
+    if output_format == 'columnar':
+        stores = columns
+        for key in ('scenario', 'store_id'):
+            stores[key], stores[f"{key}_dict"] = encode_categorical(stores[key])
+    else:
+        stores = [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    return {
+        "scenarios": scenario_results,
+        "stores": stores,
+        "exclusions": {
+            "total_excluded": int(excluded.sum()),
+            "min_batch_size": min_batch_size
+        }
+    }
+
+
+def sweep_min_batch_size(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    max_threshold: int = 30,
+    states: StateSelector = None
+) -> Dict[str, Any]:
+    """
+    Evaluate the anomaly-exclusion threshold for every value from 1 to N.
+
+    Equivalent to running compare_cpd with min_batch_size = 1..N, but in a
+    single pass: trips are bucketed by batch size (a counting sort, with
+    every batch >= N in the last bucket) per store, and cumulative sums over
+    the buckets give what each threshold excludes.
 
     Args:
         nash_df: DataFrame with Nash trip data
         rate_cards: Rate cards for vendors
+        max_threshold: Largest min_batch_size to evaluate (N)
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
-        dict: Average CPD by carrier
+        dict: { min_batch_sizes, overall: {avg_van_cpd, excluded_trips,
+                excluded_orders}, stores: [{store_id, van_cpd,
+                excluded_trips, excluded_orders}] } where every metric is
+                a list aligned with min_batch_sizes
     """
-    ca_df = filter_ca_stores(nash_df.copy())
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
+    thresholds = list(range(1, max_threshold + 1))
+
+    ca_df = filter_states(nash_df.copy(), states)
+    if ca_df.empty or 'Total Orders' not in ca_df.columns:
+        ca_df = pd.DataFrame({'Store Id': [], 'Carrier': [], 'Total Orders': []})
+
+    batch = pd.to_numeric(ca_df['Total Orders'], errors='coerce')
+    valid = batch.notna() & (batch != 0)
+    batch_sizes = np.floor(batch[valid].to_numpy(dtype=float)).astype(np.int64)
+    store_codes, store_ids = pd.factorize(ca_df.loc[valid, 'Store Id'].astype(str))
+    trip_costs = price_trips(ca_df.loc[valid], rate_cards)
+    priced = ~np.isnan(trip_costs)
+
+    # (stores x buckets) histograms; bucket b holds trips with batch size b
+    n_buckets = max_threshold + 1
+    n_stores = len(store_ids)
+    keys = store_codes * n_buckets + np.clip(batch_sizes, 0, max_threshold)
+
+    def histogram(weights: Any = None) -> np.ndarray:
+        counts = np.bincount(keys, weights=weights, minlength=n_stores * n_buckets)
+        return counts.reshape(n_stores, n_buckets).astype(float)
+
+    trips = histogram()
+    orders = histogram(batch_sizes)
+    costs = histogram(np.where(priced, trip_costs, 0.0))
+    priced_orders = histogram(np.where(priced, batch_sizes, 0))
+
+    # Threshold t excludes buckets 0..t-1: the cumulative sum up to t-1
+    excluded_trips = np.cumsum(trips, axis=1)[:, :max_threshold]
+    excluded_orders = np.cumsum(orders, axis=1)[:, :max_threshold]
+    included_costs = costs.sum(axis=1, keepdims=True) - np.cumsum(costs, axis=1)[:, :max_threshold]
+    included_orders = (
+        priced_orders.sum(axis=1, keepdims=True) - np.cumsum(priced_orders, axis=1)[:, :max_threshold]
+    )
+
+    def weighted_cpd(cost: np.ndarray, order_count: np.ndarray) -> np.ndarray:
+        return np.divide(cost, order_count, out=np.zeros_like(cost), where=order_count > 0)
+
+    store_cpd = np.round(weighted_cpd(included_costs, included_orders), 2)
+    overall_cpd = np.round(weighted_cpd(included_costs.sum(axis=0), included_orders.sum(axis=0)), 2)
+
+    stores = [
+        {
+            "store_id": store_id,
+            "van_cpd": store_cpd[i].tolist(),
+            "excluded_trips": excluded_trips[i].astype(np.int64).tolist(),
+            "excluded_orders": excluded_orders[i].astype(np.int64).tolist()
+        }
+        for i, store_id in enumerate(store_ids)
+    ]
 
-    carrier_cpd = {}
+    return {
+        "min_batch_sizes": thresholds,
+        "overall": {
+            "avg_van_cpd": overall_cpd.tolist(),
+            "excluded_trips": excluded_trips.sum(axis=0).astype(np.int64).tolist(),
+            "excluded_orders": excluded_orders.sum(axis=0).astype(np.int64).tolist()
+        },
+        "stores": stores
+    }
 
-    for carrier in ca_df['Carrier_Normalized'].unique():
-        carrier_df = ca_df[ca_df['Carrier_Normalized'] == carrier]
 
-        cpd_values = []
-        for _, row in carrier_df.iterrows():
-            total_orders = row['Total Orders']
+def calculate_cpd_by_carrier(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None
+) -> Dict[str, float]:
+    """
+    Calculate average CPD for each carrier.
 
-            if pd.isna(total_orders) or total_orders == 0:
-                continue
+    Trips are priced in one columnar pass (see price_trips) and averaged
+    per carrier with a groupby.
 
-            vendor_rates = rate_cards.get('vendors', {}).get(carrier)
-            if not vendor_rates:
-                continue
+    Args:
+        nash_df: DataFrame with Nash trip data
+        rate_cards: Rate cards for vendors
+        states: State selector (see resolve_states); defaults to CA
 
-            trip_cpd = calculate_van_cpd(
-                trip_data=row.to_dict(),
-                rate_card=vendor_rates,
-                batch_size=int(total_orders)
-            )
-            cpd_values.append(trip_cpd)
+    Returns:
+        dict: Average CPD by carrier (carriers without a rate card or
+            priced trips are left out)
+    """
+    ca_df = filter_states(nash_df.copy(), states)
+    if ca_df.empty or 'Total Orders' not in ca_df.columns:
+        return {}
 
-        if cpd_values:
-            carrier_cpd[carrier] = round(sum(cpd_values) / len(cpd_values), 2)
+    ca_df['Carrier_Normalized'] = normalize_carriers(ca_df['Carrier'])
+    batch = np.trunc(pd.to_numeric(ca_df['Total Orders'], errors='coerce').to_numpy(dtype=float, na_value=np.nan))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cpd = price_trips(ca_df, rate_cards) / batch
+    priced = (batch > 0) & ~np.isnan(cpd)
 
-    return carrier_cpd
+    means = pd.Series(cpd[priced]).groupby(ca_df['Carrier_Normalized'].to_numpy()[priced], sort=False).mean()
+    return {carrier: round(float(value), 2) for carrier, value in means.items()}
 
 
 if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import (
+        load_nash_data, load_request_dataset, load_request_registry,
+        load_request_rate_cards, parse_cli_request, run_state_request, PROJECT_ROOT
+    )
 
-    # Check for CLI arguments
-    if len(sys.argv) >= 4:
-        # CLI mode: python cpd_analysis.py <nash_csv> <registry_json> <rate_cards_json>
-        nash_path = sys.argv[1]
-        registry_path = sys.argv[2]
-        rates_path = sys.argv[3]
+    # CLI mode: python cpd_analysis.py <nash_csv> <registry_json> <rate_cards_json>
+    #   [--format=columnar] [--scenarios=<scenarios_json>] [--sweep=<max_min_batch_size>]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python cpd_analysis.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'registry_path', 'rate_cards_path'))
 
-        nash_df = load_nash_data(nash_path)
-
-        with open(registry_path, 'r') as f:
-            store_registry = json.load(f)
-
-        with open(rates_path, 'r') as f:
-            rate_cards = json.load(f)
-
-        cpd_comparison = compare_cpd(nash_df, store_registry, rate_cards)
+    # Check for CLI arguments
+    if request is not None:
+        params = request['params']
+        nash_df = load_request_dataset(request)
+
+        # Registry / rate cards: inline, JSON files or the SQLite data store
+        # (only the stores and vendors present in this dataset are read)
+        store_registry = load_request_registry(request, nash_df['Store Id'].astype(str).unique())
+        rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+        if 'sweep' in params:
+            # Anomaly threshold sweep: min_batch_size = 1..N in one pass
+            cpd_comparison = run_state_request(
+                sweep_min_batch_size, nash_df, params, rate_cards, int(params['sweep'])
+            )
+        elif 'scenarios' in params:
+            # What-if rate cards: list of { name, vendors: { vendor: overrides } },
+            # inline in the envelope or a JSON file path on the command line
+            scenarios = params['scenarios']
+            if isinstance(scenarios, str):
+                with open(scenarios, 'r') as f:
+                    scenarios = json.load(f)
+
+            cpd_comparison = run_state_request(
+                compare_cpd_scenarios, nash_df, params, store_registry, rate_cards, scenarios,
+                output_format=params.get('format', 'rows')
+            )
+        else:
+            cpd_comparison = run_state_request(
+                compare_cpd, nash_df, params, store_registry, rate_cards,
+                output_format=params.get('format', 'rows')
+            )
         print(json.dumps(cpd_comparison))
     else:
         # Development mode: use example data
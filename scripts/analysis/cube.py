@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Metrics Cube Module
+Pre-aggregate Nash trips into a Store Id x Carrier x day cube that reports
+roll up instead of scanning every trip.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Dict, Any, Callable, Optional, Sequence
+from . import (
+    lazy_import,
+    filter_states,
+    StateSelector,
+    get_cache_dir,
+    get_cache_path,
+    get_request_date_range,
+    normalize_carriers,
+    prune_cache_files
+)
+from .cpd_analysis import calculate_trip_costs_as_of
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# One cell per store, normalized carrier and day (NaT for undated trips)
+CUBE_DIMENSIONS = ('Store Id', 'Carrier_Normalized', 'Date')
+
+# Averaged measures: <name>_sum / <name>_count over trips with a value
+CUBE_MEAN_MEASURES = {
+    'driver_total_time': 'Driver Total Time',
+    'driver_dwell_time': 'Driver Dwell Time',
+    'driver_load_time': 'Driver Load Time',
+    'driver_sort_time': 'Driver Sort Time',
+    'trip_actual_time': 'Trip Actual Time',
+    'drops_per_hour_trip': 'Drops Per Hour Trip',
+    'drops_per_hour_total': 'Drops Per Hour Total'
+}
+
+# Order outcome counts summed per cell
+CUBE_ORDER_MEASURES = {
+    'delivered_orders': 'Delivered Orders',
+    'failed_orders': 'Failed Orders',
+    'returned_orders': 'Returned Orders',
+    'pending_orders': 'Pending Orders'
+}
+
+# Cached rollups kept per dataset and kind (e.g. the last few rate-card
+# revisions); older signatures are removed when a new one is written
+ROLLUP_VERSIONS_KEPT = 3
+
+# Row positions rolled up with min rather than sum, so rollups can list
+# stores and carriers in first-appearance order like the trip-level reports
+_FIRST_ROW_MEASURES = ('first_row', 'first_included_row')
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    """A column as floats (NaN where missing or non-numeric)."""
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def trip_dimensions(nash_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get each trip's cube cell: Store Id, normalized carrier and day.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+
+    Returns:
+        pd.DataFrame: CUBE_DIMENSIONS columns, aligned with nash_df (NaN /
+            NaT where a column is missing or unparseable)
+    """
+    if 'Carrier_Normalized' in nash_df.columns:
+        carriers = nash_df['Carrier_Normalized']
+    elif 'Carrier' in nash_df.columns:
+        carriers = normalize_carriers(nash_df['Carrier'])
+    else:
+        carriers = pd.Series(np.nan, index=nash_df.index, dtype=object)
+    if 'Date' in nash_df.columns:
+        days = pd.to_datetime(nash_df['Date'], format='mixed', errors='coerce').dt.normalize()
+    else:
+        days = pd.Series(pd.NaT, index=nash_df.index, dtype='datetime64[ns]')
+
+    return pd.DataFrame({
+        'Store Id': nash_df['Store Id'].astype(str) if 'Store Id' in nash_df.columns else np.nan,
+        'Carrier_Normalized': carriers,
+        'Date': days
+    }, index=nash_df.index)
+
+
+def build_metrics_cube(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    min_batch_size: int = 10
+) -> pd.DataFrame:
+    """
+    Aggregate Nash trips into a Store Id x Carrier_Normalized x Date cube.
+
+    Each trip is priced once (rate card version in force on its date) and
+    classified against min_batch_size, then every measure is summed per
+    cell. Measures:
+
+    - trips, orders: all trips and their Total Orders
+    - included_trips / included_orders / included_cost: trips with orders,
+      a rate card and batch >= min_batch_size (CPD numerator/denominator)
+    - excluded_trips: anomalies (0 < batch < min_batch_size)
+    - trip_cpd_sum / trip_cpd_count: per-trip CPD of every priced trip
+    - on_time / otd_trips: on-time pickups and trips with an OTD value
+    - delivered / failed / returned / pending orders
+    - <timing>_sum / <timing>_count for each CUBE_MEAN_MEASURES column
+    - first_row / first_included_row: earliest trip position in the cell
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        rate_cards: Rate cards for vendors
+        min_batch_size: Minimum batch size included in CPD (default 10)
+
+    Returns:
+        pd.DataFrame: One row per cell, dimensions and measures as columns;
+            attrs['min_batch_size'] records the threshold
+    """
+    n = len(nash_df)
+    dimensions = trip_dimensions(nash_df)
+
+    orders = _column(nash_df, 'Total Orders')
+    batch = np.trunc(orders)
+    costs = calculate_trip_costs_as_of(
+        dimensions['Carrier_Normalized'], batch,
+        nash_df['Date'] if 'Date' in nash_df.columns else None, rate_cards
+    )
+
+    has_orders = ~np.isnan(orders) & (orders != 0)
+    priced = has_orders & ~np.isnan(costs)
+    included = priced & (batch >= min_batch_size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trip_cpd = np.where(batch != 0, costs / batch, 0.0)
+
+    on_time = _column(nash_df, 'Is Pickup Arrived Ontime')
+    positions = np.arange(n, dtype=float)
+
+    measures = {
+        'trips': np.ones(n),
+        'orders': np.nan_to_num(orders),
+        'included_trips': included.astype(float),
+        'included_orders': np.where(included, batch, 0.0),
+        'included_cost': np.where(included, costs, 0.0),
+        'excluded_trips': (has_orders & (batch < min_batch_size)).astype(float),
+        'trip_cpd_sum': np.where(priced, trip_cpd, 0.0),
+        'trip_cpd_count': priced.astype(float),
+        'on_time': np.nan_to_num(on_time),
+        'otd_trips': (~np.isnan(on_time)).astype(float)
+    }
+    for name, column in CUBE_ORDER_MEASURES.items():
+        measures[name] = np.nan_to_num(_column(nash_df, column))
+
+    for name, column in CUBE_MEAN_MEASURES.items():
+        values = _column(nash_df, column)
+        if name == 'drops_per_hour_trip' and column not in nash_df.columns:
+            # Derive from orders / trip hours when the export lacks it
+            trip_time = _column(nash_df, 'Trip Actual Time')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(trip_time > 0, orders / (trip_time / 60), 0.0)
+        measures[f"{name}_sum"] = np.nan_to_num(values)
+        measures[f"{name}_count"] = (~np.isnan(values)).astype(float)
+
+    measures['first_row'] = positions
+    measures['first_included_row'] = np.where(included, positions, np.nan)
+
+    cells = pd.DataFrame(measures)
+    for dimension in CUBE_DIMENSIONS:
+        cells[dimension] = dimensions[dimension].to_numpy()
+
+    cube = rollup_cube(cells, CUBE_DIMENSIONS)
+    cube.attrs['min_batch_size'] = min_batch_size
+    return cube
+
+
+def rollup_cube(cube: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    """
+    Roll the cube up to a subset of its dimensions.
+
+    Measures are summed (first-row positions take the minimum). Derived
+    dimensions work too: add a column computed from the cells (e.g. the
+    week of Date) and roll up by it.
+
+    Args:
+        cube: Metrics cube (or a slice of it)
+        by: Columns to keep; () totals the whole cube into one row
+
+    Returns:
+        pd.DataFrame: One row per group, in first-appearance order
+    """
+    keys = list(by)
+    measures = [c for c in cube.columns if c not in CUBE_DIMENSIONS and c not in keys]
+    agg = {c: ('min' if c in _FIRST_ROW_MEASURES else 'sum') for c in measures}
+
+    if not keys:
+        return pd.DataFrame([{c: getattr(cube[c], how)() for c, how in agg.items()}])
+
+    rolled = cube.groupby(keys, dropna=False, sort=False).agg(agg).reset_index()
+    return rolled.sort_values('first_row', kind='stable').reset_index(drop=True)
+
+
+def cube_mean(totals: Any, name: str) -> float:
+    """
+    Average of a CUBE_MEAN_MEASURES (or trip_cpd) measure in a rollup row.
+
+    Args:
+        totals: Rollup row (Series or dict)
+        name: Measure name without the _sum / _count suffix
+
+    Returns:
+        float: Mean over trips with a value (0.0 when there are none)
+    """
+    count = totals[f"{name}_count"]
+    return float(totals[f"{name}_sum"] / count) if count > 0 else 0.0
+
+
+def select_cube(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None,
+    min_batch_size: int = 10
+) -> pd.DataFrame:
+    """
+    Get the cube cells of the selected states.
+
+    Uses a prebuilt cube when it matches min_batch_size, otherwise builds
+    one from the selected states' trips.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        rate_cards: Rate cards for vendors
+        states: State selector (see resolve_states); defaults to CA
+        cube: Cube built from nash_df (see load_request_cube), if any
+        min_batch_size: Minimum batch size included in CPD
+
+    Returns:
+        pd.DataFrame: Cube restricted to the selected states
+    """
+    if cube is None or cube.attrs.get('min_batch_size') != min_batch_size:
+        return build_metrics_cube(filter_states(nash_df.copy(), states), rate_cards, min_batch_size)
+    return filter_states(cube.copy(), states)
+
+
+def slice_cell_dates(cells: pd.DataFrame, start: Optional[Any] = None, end: Optional[Any] = None) -> pd.DataFrame:
+    """
+    Keep the cells of a rollup dated start..end (days, inclusive).
+
+    Args:
+        cells: Cube or sketch cells (Date column of days)
+        start: First day included; None for open
+        end: Last day included; None for open
+
+    Returns:
+        pd.DataFrame: Cells in range (undated cells dropped)
+    """
+    dates = cells['Date']
+    in_range = dates.notna()
+    if start is not None:
+        in_range &= dates >= pd.Timestamp(start).normalize()
+    if end is not None:
+        in_range &= dates <= pd.Timestamp(end).normalize()
+    return cells[in_range]
+
+
+def get_rollup_path(kind: str, dataset_id: str, signature: Any) -> str:
+    """
+    Get the cache path of a rollup (cube, sketches) of a dataset version.
+
+    The name is <dataset>.<kind>-<signature digest>, so the rollups of a
+    dataset share its cleaned frame's name prefix and go with it (see
+    save_cached_frame).
+
+    Args:
+        kind: Rollup kind
+        dataset_id: Identity of the dataset version (cache key or cleaned
+            frame path)
+        signature: JSON-serializable inputs the rollup depends on (rate
+            cards, thresholds, accuracy)
+
+    Returns:
+        str: Path of the cached rollup (may not exist yet)
+    """
+    dataset = os.path.splitext(os.path.basename(dataset_id))[0]
+    key = json.dumps(signature, sort_keys=True, default=str)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), f"{dataset}.{kind}-{digest}.pkl")
+
+
+def _touch(path: str) -> None:
+    """Mark a cached rollup as recently used (see prune_cache_files)."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def load_request_rollup(
+    request: Dict[str, Any],
+    kind: str,
+    signature: Any,
+    build: Callable[[], pd.DataFrame]
+) -> pd.DataFrame:
+    """
+    Get a rollup of a CLI request's dataset, building it once.
+
+    Rollups are cached next to the cleaned frames, keyed by the dataset
+    version and signature, so later reports on the same upload skip
+    scanning the trips. Each dataset keeps ROLLUP_VERSIONS_KEPT signatures
+    per kind, the most recently used. A request for a date range gets the
+    days of the cached rollup in range; without one cached yet, its rollup
+    is built from the (already sliced) trips and not cached.
+
+    Args:
+        request: CLI request (dataset path or cache_key)
+        kind: Rollup kind (see get_rollup_path)
+        signature: Inputs the rollup depends on besides the dataset
+        build: Builds the rollup from the request's trips
+
+    Returns:
+        pd.DataFrame: The rollup
+    """
+    start, end = get_request_date_range(request)
+    try:
+        dataset_id = request.get('cache_key') or get_cache_path(request['dataset'])
+    except (KeyError, OSError):
+        return build()
+
+    rollup_path = get_rollup_path(kind, os.path.basename(dataset_id), signature)
+    if os.path.exists(rollup_path):
+        try:
+            rollup = pd.read_pickle(rollup_path)
+            _touch(rollup_path)
+            return slice_cell_dates(rollup, start, end) if start or end else rollup
+        except Exception:
+            # Corrupt or incompatible cache entry - rebuild it
+            pass
+
+    if start or end:
+        return build()
+
+    rollup = build()
+    try:
+        os.makedirs(os.path.dirname(rollup_path), exist_ok=True)
+        tmp_path = f"{rollup_path}.{os.getpid()}.tmp"
+        rollup.to_pickle(tmp_path)
+        os.replace(tmp_path, rollup_path)
+        # Other signatures of this dataset and kind: <dataset>.<kind>-
+        kind_prefix = os.path.basename(rollup_path).rsplit('-', 1)[0] + '-'
+        prune_cache_files(kind_prefix, rollup_path, ROLLUP_VERSIONS_KEPT)
+    except OSError:
+        # Read-only cache: serve the rollup without persisting it
+        pass
+    return rollup
+
+
+def load_request_cube(
+    request: Dict[str, Any],
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    min_batch_size: int = 10
+) -> pd.DataFrame:
+    """
+    Get the metrics cube of a CLI request's dataset, building it once.
+
+    Cached per dataset version, rate cards and min_batch_size (see
+    load_request_rollup).
+
+    Args:
+        request: CLI request (dataset path or cache_key)
+        nash_df: The request's dataset, already loaded (and date-sliced)
+        rate_cards: Rate cards for vendors
+        min_batch_size: Minimum batch size included in CPD
+
+    Returns:
+        pd.DataFrame: Metrics cube over every state
+    """
+    return load_request_rollup(
+        request, 'cube', [rate_cards, min_batch_size],
+        lambda: build_metrics_cube(nash_df, rate_cards, min_batch_size)
+    )
@@ -4,29 +4,36 @@ Dashboard Metrics Calculator
 Calculate overall metrics for dashboard display.
 """
 
-import pandas as pd
-from typing import Dict, Any, List
-from . import (
-    filter_ca_stores,
-    calculate_otd_percentage,
-    safe_mean,
-    safe_sum,
-    normalize_carrier_name
-)
+from __future__ import annotations
+
+from typing import Dict, Any, List, Optional
+from . import lazy_import, StateSelector
+from .cube import rollup_cube, select_cube
+
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
 
 
 def calculate_dashboard_metrics(
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
-    rate_cards: Dict[str, Any]
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None
 ) -> Dict[str, Any]:
     """
     Calculate high-level dashboard metrics.
 
+    Every metric is a rollup of the metrics cube, so with a prebuilt cube
+    the cost is proportional to cube cells rather than trips.
+
     Args:
         nash_df: DataFrame with Nash trip data
         store_registry: Dict with store Spark CPD data
         rate_cards: Dict with vendor rates
+        states: State selector (see resolve_states); defaults to CA
+        cube: Metrics cube of nash_df (see load_request_cube); built from
+            nash_df when omitted
 
     Returns:
         dict: Dashboard metrics including:
@@ -39,10 +46,10 @@ def calculate_dashboard_metrics(
             - active_stores: Count of active stores
             - carriers: List of carriers in data
     """
-    # Filter to CA stores only
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Cube cells of the selected states (CA by default)
+    cells = select_cube(nash_df, rate_cards, states, cube)
 
-    if ca_df.empty:
+    if cells.empty:
         return {
             "total_orders": 0,
             "total_trips": 0,
@@ -54,25 +61,27 @@ def calculate_dashboard_metrics(
             "carriers": []
         }
 
+    totals = rollup_cube(cells, ()).iloc[0]
+
     # Calculate total orders and trips
-    total_orders = int(safe_sum(ca_df['Total Orders']))
-    total_trips = len(ca_df)
+    total_orders = int(totals['orders'])
+    total_trips = int(totals['trips'])
 
     # Calculate OTD percentage
-    otd_percentage = calculate_otd_percentage(ca_df)
+    otd_percentage = (totals['on_time'] / totals['otd_trips'] * 100) if totals['otd_trips'] > 0 else 0.0
 
-    # Count active stores
-    active_stores = ca_df['Store Id'].nunique()
+    # Stores in first-appearance order, and unique carriers (normalized)
+    store_ids = rollup_cube(cells, ['Store Id'])['Store Id'].tolist()
+    active_stores = len(store_ids)
+    carriers = sorted(cells['Carrier_Normalized'].unique().tolist())
 
-    # Get unique carriers (normalized)
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
-    carriers = sorted(ca_df['Carrier_Normalized'].unique().tolist())
-
-    # Calculate average Van CPD
-    avg_van_cpd = _calculate_avg_van_cpd(ca_df, rate_cards)
+    # Average Van CPD: weighted (total_cost / total_orders), excluding
+    # anomalies (batches < min_batch_size) and trips without a rate card
+    included_orders = int(totals['included_orders'])
+    avg_van_cpd = float(totals['included_cost']) / included_orders if included_orders > 0 else 0.0
 
     # Calculate average Spark CPD from store registry
-    avg_spark_cpd = _calculate_avg_spark_cpd(ca_df, store_registry)
+    avg_spark_cpd = _calculate_avg_spark_cpd(store_ids, store_registry)
 
     return {
         "total_orders": total_orders,
@@ -86,71 +95,12 @@ def calculate_dashboard_metrics(
     }
 
 
-def _calculate_avg_van_cpd(df: pd.DataFrame, rate_cards: Dict[str, Any], min_batch_size: int = 10) -> float:
-    """
-    Calculate average Van CPD across all trips using weighted average.
-
-    Weighted average: total_cost / total_orders
-    This is more accurate than simple average because it accounts for batch size differences.
-
-    Excludes anomalies (batches < min_batch_size) to prevent skewed metrics.
-
-    Args:
-        df: Filtered DataFrame with Nash data
-        rate_cards: Rate card data
-        min_batch_size: Minimum batch size to include (default 10)
-
-    Returns:
-        float: Average Van CPD (weighted, with anomaly exclusion)
-    """
-    total_cost = 0.0
-    total_orders = 0
-
-    for _, row in df.iterrows():
-        carrier = normalize_carrier_name(row['Carrier'])
-        batch_size = row['Total Orders']
-
-        # Skip if no orders
-        if pd.isna(batch_size) or batch_size == 0:
-            continue
-
-        batch_size_int = int(batch_size)
-
-        # Exclude anomalies (small batches)
-        if batch_size_int < min_batch_size:
-            continue
-
-        # Get rate card for carrier
-        vendor_rates = rate_cards.get('vendors', {}).get(carrier)
-        if not vendor_rates:
-            continue
-
-        # Determine which base rate to use based on batch size
-        if batch_size_int <= 80:
-            base_rate = vendor_rates.get('base_rate_80', 0)
-        else:
-            base_rate = vendor_rates.get('base_rate_100', 0)
-
-        # Apply contractual adjustment
-        adjustment = vendor_rates.get('contractual_adjustment', 1.0)
-        trip_cost = base_rate * adjustment
-
-        # Accumulate totals
-        total_cost += trip_cost
-        total_orders += batch_size_int
-
-    if total_orders == 0:
-        return 0.0
-
-    return total_cost / total_orders
-
-
-def _calculate_avg_spark_cpd(df: pd.DataFrame, store_registry: Dict[str, Any]) -> float:
+def _calculate_avg_spark_cpd(store_ids: List[str], store_registry: Dict[str, Any]) -> float:
     """
     Calculate average Spark CPD from store registry.
 
     Args:
-        df: Filtered DataFrame with Nash data
+        store_ids: Stores in the data
         store_registry: Store registry data
 
     Returns:
@@ -162,11 +112,8 @@ def _calculate_avg_spark_cpd(df: pd.DataFrame, store_registry: Dict[str, Any]) -
         # No store data yet, return placeholder
         return 5.70
 
-    # Get unique stores in the data
-    unique_stores = df['Store Id'].unique()
-
     cpd_values = []
-    for store_id in unique_stores:
+    for store_id in store_ids:
         store_data = stores.get(str(store_id))
         if store_data and 'spark_cpd' in store_data:
             cpd_values.append(store_data['spark_cpd'])
@@ -181,33 +128,44 @@ if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
-
-    # Check for CLI arguments
-    if len(sys.argv) >= 4:
-        # CLI mode: use provided paths
-        nash_path = sys.argv[1]
-        registry_path = sys.argv[2]
-        rates_path = sys.argv[3]
-    else:
+    from . import (
+        load_request_dataset, load_request_registry, load_request_rate_cards,
+        normalize_carriers, parse_cli_request, run_state_request, PROJECT_ROOT
+    )
+    from .cube import load_request_cube
+
+    # CLI mode: python dashboard.py <nash_csv> <registry_json> <rate_cards_json>
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python dashboard.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'registry_path', 'rate_cards_path'))
+    cli_mode = request is not None
+
+    if not cli_mode:
         # Development mode: use example data
-        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
-        registry_path = os.path.join(PROJECT_ROOT, 'data', 'ca_store_registry.json')
-        rates_path = os.path.join(PROJECT_ROOT, 'data', 'ca_rate_cards.json')
+        request = {
+            'dataset': os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv'),
+            'registry_path': os.path.join(PROJECT_ROOT, 'data', 'ca_store_registry.json'),
+            'rate_cards_path': os.path.join(PROJECT_ROOT, 'data', 'ca_rate_cards.json'),
+            'params': {}
+        }
 
-    nash_df = load_nash_data(nash_path)
+    nash_df = load_request_dataset(request)
 
-    with open(registry_path, 'r') as f:
-        store_registry = json.load(f)
+    # Registry / rate cards: inline, JSON files or the SQLite data store
+    # (only the stores and vendors present in this dataset are read)
+    store_registry = load_request_registry(request, nash_df['Store Id'].astype(str).unique())
+    rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
 
-    with open(rates_path, 'r') as f:
-        rate_cards = json.load(f)
+    # Metrics cube of this dataset, built on its first report
+    cube = load_request_cube(request, nash_df, rate_cards)
 
-    # Calculate metrics
-    metrics = calculate_dashboard_metrics(nash_df, store_registry, rate_cards)
+    # Calculate metrics (keyed by state when a state is requested)
+    metrics = run_state_request(
+        calculate_dashboard_metrics, nash_df, request['params'], store_registry, rate_cards, cube=cube
+    )
 
     # Print results
-    if len(sys.argv) >= 4:
+    if cli_mode:
         # CLI mode: compact JSON
         print(json.dumps(metrics))
     else:
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Distinct Counts Module
+Count distinct stores, couriers and trips per carrier and week from
+mergeable sketches (exact hash sets or HyperLogLog registers) kept per
+Store Id x Carrier x day like the metrics cube.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Any, Iterable, Optional, Sequence
+from . import lazy_import, filter_states, StateSelector, MISSING_TEXT_VALUES
+from .cube import CUBE_DIMENSIONS, load_request_rollup, trip_dimensions
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Counted values: name -> Nash column
+DISTINCT_COLUMNS = {
+    'stores': 'Store Id',
+    'couriers': 'Courier Name',
+    'trips': 'Walmart Trip Id'
+}
+
+# 'exact' keeps every distinct value's hash, 'approximate' keeps
+# HyperLogLog registers, 'auto' picks exact up to EXACT_MAX_TRIPS trips
+DISTINCT_MODES = ('auto', 'exact', 'approximate')
+EXACT_MAX_TRIPS = 100_000
+
+# 2^12 registers: relative standard error 1.04 / sqrt(4096) ~ 1.6%
+DEFAULT_PRECISION = 12
+
+
+def relative_error(precision: int) -> float:
+    """
+    Relative standard error of a HyperLogLog estimate.
+
+    Args:
+        precision: Register index bits p (2^p registers)
+
+    Returns:
+        float: 1.04 / sqrt(2^p)
+    """
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """
+    64-bit hash of each value (as text, so '2082' and 2082 count once).
+
+    Args:
+        values: Values to hash
+
+    Returns:
+        np.ndarray: uint64 hash per value, stable across processes
+    """
+    return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+
+
+def hll_registers(hashes: np.ndarray, precision: int = DEFAULT_PRECISION) -> Dict[str, np.ndarray]:
+    """
+    HyperLogLog register and rank of each hash.
+
+    The top `precision` bits pick the register; the rank is the position
+    of the first 1 bit in the rest (leading zeros + 1).
+
+    Args:
+        hashes: uint64 hashes
+        precision: Register index bits p
+
+    Returns:
+        dict: { register, rank } arrays
+    """
+    if not 4 <= precision <= 18:
+        raise ValueError(f"Invalid precision: {precision}")
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    width = 64 - precision
+    register = (hashes >> np.uint64(width)).astype(np.int32)
+    rest = hashes & np.uint64((1 << width) - 1)
+
+    # Bit length of rest: float log2 can round up just below a power of 2
+    nonzero = rest > 0
+    length = np.zeros(len(rest), dtype=np.int64)
+    bits = np.floor(np.log2(rest[nonzero].astype(float))).astype(np.int64) + 1
+    bits -= (rest[nonzero] >> (bits - 1).astype(np.uint64)) == 0
+    length[nonzero] = bits
+
+    return {"register": register, "rank": (width - length + 1).astype(np.int8)}
+
+
+def build_distinct_sketches(
+    nash_df: pd.DataFrame,
+    mode: str = 'auto',
+    precision: int = DEFAULT_PRECISION
+) -> pd.DataFrame:
+    """
+    Sketch the DISTINCT_COLUMNS of Nash trips per Store Id x carrier x day.
+
+    Exact sketches are one row per (cell, column, value hash). Approximate
+    sketches are one row per (cell, column, HyperLogLog register) with its
+    maximum rank. Either merges across cells, chunks or uploads by union /
+    max (see merge_distinct_sketches).
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        mode: 'exact', 'approximate' or 'auto' (exact up to EXACT_MAX_TRIPS)
+        precision: HyperLogLog register index bits (approximate mode)
+
+    Returns:
+        pd.DataFrame: Sketch rows; attrs records mode and precision
+    """
+    if mode not in DISTINCT_MODES:
+        raise ValueError(f"Invalid mode: {mode}")
+    if mode == 'auto':
+        mode = 'exact' if len(nash_df) <= EXACT_MAX_TRIPS else 'approximate'
+
+    dimensions = trip_dimensions(nash_df)
+
+    parts = []
+    for name, column in DISTINCT_COLUMNS.items():
+        if column not in nash_df.columns:
+            continue
+        values = nash_df[column]
+        present = (values.notna() & ~values.astype(str).isin(MISSING_TEXT_VALUES)).to_numpy()
+        part = dimensions[present].reset_index(drop=True)
+        part['column'] = name
+        part['hash'] = hash_values(values[present])
+        parts.append(part)
+
+    if parts:
+        hashes = pd.concat(parts, ignore_index=True)
+    else:
+        hashes = dimensions.iloc[0:0].assign(column=pd.Series(dtype=object), hash=pd.Series(dtype=np.uint64))
+
+    sketches = _to_mode(hashes, mode, precision)
+    sketches.attrs.update(mode=mode, precision=precision)
+    return sketches
+
+
+def _to_mode(rows: pd.DataFrame, mode: str, precision: int) -> pd.DataFrame:
+    """Deduplicate hash rows, or fold them into HyperLogLog registers."""
+    keys = list(CUBE_DIMENSIONS) + ['column']
+    if mode == 'exact':
+        return rows.drop_duplicates(keys + ['hash'], ignore_index=True)
+
+    if 'hash' in rows.columns:
+        registers = hll_registers(rows['hash'].to_numpy(), precision)
+        rows = rows.drop(columns='hash').assign(**registers)
+    return rows.groupby(keys + ['register'], dropna=False, sort=False)['rank'].max().reset_index()
+
+
+def merge_distinct_sketches(sketches: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merge distinct-count sketches (chunks, partitions, uploads).
+
+    Exact sketches merge into an exact sketch; any approximate input makes
+    the result approximate (exact hashes are folded into registers).
+
+    Args:
+        sketches: Sketch frames built with the same precision
+
+    Returns:
+        pd.DataFrame: One sketch covering every input's trips
+    """
+    frames = list(sketches)
+    precisions = {frame.attrs.get('precision', DEFAULT_PRECISION) for frame in frames}
+    if len(precisions) > 1:
+        raise ValueError(f"Cannot merge sketches of different precision: {sorted(precisions)}")
+    precision = precisions.pop() if precisions else DEFAULT_PRECISION
+
+    if all(frame.attrs.get('mode') == 'exact' for frame in frames):
+        mode = 'exact'
+        merged = _to_mode(pd.concat(frames, ignore_index=True), mode, precision)
+    else:
+        mode = 'approximate'
+        merged = _to_mode(
+            pd.concat([_to_mode(frame, mode, precision) for frame in frames], ignore_index=True),
+            mode, precision
+        )
+
+    merged.attrs.update(mode=mode, precision=precision)
+    return merged
+
+
+def distinct_counts(sketches: pd.DataFrame, by: Sequence[str]) -> pd.DataFrame:
+    """
+    Merge sketches up to groups and count each column's distinct values.
+
+    Args:
+        sketches: Sketch frame (see build_distinct_sketches), possibly with
+            derived grouping columns (e.g. the week of Date)
+        by: Grouping columns; () merges everything
+
+    Returns:
+        pd.DataFrame: One row per group and column (sorted) with 'distinct'
+    """
+    keys = list(by) + ['column']
+    if sketches.empty:
+        return pd.DataFrame(columns=keys + ['distinct'])
+
+    if sketches.attrs.get('mode') == 'exact':
+        counts = sketches.groupby(keys, dropna=False)['hash'].nunique()
+        return counts.rename('distinct').reset_index()
+
+    # HyperLogLog: merge registers (max rank), then the harmonic-mean
+    # estimate, with linear counting while many registers are empty
+    registers = sketches.groupby(keys + ['register'], dropna=False)['rank'].max().reset_index()
+    registers['inverse'] = np.exp2(-registers['rank'].astype(float))
+    stats = registers.groupby(keys, dropna=False).agg(
+        filled=('register', 'size'), inverse=('inverse', 'sum')
+    ).reset_index()
+
+    m = float(1 << sketches.attrs.get('precision', DEFAULT_PRECISION))
+    alpha = 0.7213 / (1 + 1.079 / m)
+    empty = m - stats['filled']
+    raw = alpha * m * m / (stats['inverse'] + empty)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / empty)
+    estimate = np.where((raw <= 2.5 * m) & (empty > 0), linear, raw)
+
+    return stats[keys].assign(distinct=np.round(estimate).astype(np.int64))
+
+
+def analyze_distinct_counts(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None,
+    sketches: Optional[pd.DataFrame] = None,
+    mode: str = 'auto'
+) -> Dict[str, Any]:
+    """
+    Count distinct stores, couriers and trips overall, per carrier and week.
+
+    With prebuilt sketches no trip is scanned, whatever the date range.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
+        sketches: Distinct-count sketches of nash_df (see
+            load_request_distinct_sketches); built from nash_df when omitted
+        mode: Sketch mode when building ('auto', 'exact', 'approximate')
+
+    Returns:
+        dict: { mode, relative_error, total, by_carrier, by_week,
+            by_carrier_week } with { stores, couriers, trips } counts;
+            weeks keyed by their Monday
+    """
+    if sketches is None:
+        cells = build_distinct_sketches(filter_states(nash_df.copy(), states), mode)
+    else:
+        cells = filter_states(sketches.copy(), states)
+
+    weeks = cells['Date'] - pd.to_timedelta(cells['Date'].dt.weekday, unit='D')
+    cells['Week_Start'] = weeks.dt.strftime('%Y-%m-%d')
+
+    mode = cells.attrs.get('mode', 'exact')
+    total = _counts_by(cells, [])
+    by_carrier_week = {}
+    for (carrier, week), counts in _counts_by(cells, ['Carrier_Normalized', 'Week_Start']).items():
+        by_carrier_week.setdefault(carrier, {})[week] = counts
+
+    return {
+        "mode": mode,
+        "relative_error": 0.0 if mode == 'exact' else round(relative_error(cells.attrs['precision']), 4),
+        "total": total.get((), _empty_counts()),
+        "by_carrier": {key[0]: counts for key, counts in _counts_by(cells, ['Carrier_Normalized']).items()},
+        "by_week": {key[0]: counts for key, counts in _counts_by(cells, ['Week_Start']).items()},
+        "by_carrier_week": by_carrier_week
+    }
+
+
+def _empty_counts() -> Dict[str, int]:
+    """Zero count for every DISTINCT_COLUMNS name."""
+    return {name: 0 for name in DISTINCT_COLUMNS}
+
+
+def _counts_by(cells: pd.DataFrame, by: Sequence[str]) -> Dict[tuple, Dict[str, int]]:
+    """Distinct counts per group (tuple of by values), sorted."""
+    known = cells
+    for column in by:
+        known = known[known[column].notna()]
+
+    counts = {}
+    for _, row in distinct_counts(known, by).iterrows():
+        key = tuple(row[column] for column in by)
+        counts.setdefault(key, _empty_counts())[row['column']] = int(row['distinct'])
+    return counts
+
+
+def load_request_distinct_sketches(
+    request: Dict[str, Any],
+    nash_df: pd.DataFrame,
+    mode: str = 'auto',
+    precision: int = DEFAULT_PRECISION
+) -> pd.DataFrame:
+    """
+    Get the distinct-count sketches of a CLI request's dataset, building them once.
+
+    Cached next to the metrics cube, per dataset version, mode and
+    precision (see load_request_rollup).
+
+    Args:
+        request: CLI request (dataset path or cache_key)
+        nash_df: The request's dataset, already loaded (and date-sliced)
+        mode: 'auto', 'exact' or 'approximate'
+        precision: HyperLogLog register index bits
+
+    Returns:
+        pd.DataFrame: Sketches over every state
+    """
+    return load_request_rollup(
+        request, 'distinct', [mode, precision],
+        lambda: build_distinct_sketches(nash_df, mode, precision)
+    )
+
+
+if __name__ == '__main__':
+    import json
+    import os
+    import sys
+    from . import load_nash_data, load_request_dataset, parse_cli_request, run_state_request, PROJECT_ROOT
+
+    # CLI mode: python distinct_counts.py <nash_csv> [--mode=auto|exact|approximate]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python distinct_counts.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset',))
+
+    # Check for CLI arguments
+    if request is not None:
+        nash_df = load_request_dataset(request)
+        params = request['params']
+
+        # Read from the dataset's cached sketches, built on first use
+        sketches = load_request_distinct_sketches(request, nash_df, params.get('mode') or 'auto')
+        counts = run_state_request(analyze_distinct_counts, nash_df, params, sketches=sketches)
+        print(json.dumps(counts))
+    else:
+        # Development mode: use example data
+        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        nash_df = load_nash_data(nash_path)
+
+        print("Distinct Counts (exact):")
+        print(json.dumps(analyze_distinct_counts(nash_df, mode='exact'), indent=2))
+
+        print("\nDistinct Counts (approximate):")
+        print(json.dumps(analyze_distinct_counts(nash_df, mode='approximate')['total'], indent=2))
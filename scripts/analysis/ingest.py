@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Nash Ingest Module
+Validate and clean an uploaded Nash CSV in a single parse.
+"""
+
+from __future__ import annotations
+
+import os
+import pandas as pd
+from typing import Dict, Any, Optional, Tuple
+from . import clean_nash_data, sort_by_date, save_cached_frame, PROJECT_ROOT
+from ..validate_nash import NashValidator
+
+
+def ingest_nash_file(
+    csv_path: str,
+    ca_stores_path: Optional[str] = None,
+    validator: Optional[NashValidator] = None
+) -> Tuple[Dict[str, Any], Optional[pd.DataFrame]]:
+    """
+    Validate a Nash CSV and persist its cleaned frame, parsing it once.
+
+    The raw frame goes through the NashValidator checks, then through the
+    load_nash_data cleaning. When validation passes, the cleaned frame is
+    cached so later load_nash_data calls never touch the CSV again.
+
+    Args:
+        csv_path: Path to the Nash CSV file
+        ca_stores_path: Path to the CA stores CSV (defaults to States/)
+        validator: Pre-built validator to reuse across files
+
+    Returns:
+        tuple: (validation report, cleaned DataFrame or None if invalid)
+    """
+    if validator is None:
+        if ca_stores_path is None:
+            ca_stores_path = os.path.join(PROJECT_ROOT, 'States', 'walmart_stores_ca_only.csv')
+        validator = NashValidator(ca_stores_path)
+
+    try:
+        raw_df = pd.read_csv(csv_path)
+    except FileNotFoundError:
+        report = NashValidator.empty_result()
+        report["valid"] = False
+        report["errors"].append({
+            "type": "FILE_NOT_FOUND",
+            "message": f"File not found: {csv_path}"
+        })
+        return report, None
+    except Exception as e:
+        report = NashValidator.empty_result()
+        report["valid"] = False
+        report["errors"].append({
+            "type": "VALIDATION_ERROR",
+            "message": f"Error during validation: {str(e)}"
+        })
+        return report, None
+
+    report = validator.validate_frame(raw_df)
+    if not report["valid"]:
+        return report, None
+
+    # Validation does not modify the frame, so clean it in place, then
+    # persist it in date order for range slicing
+    clean_df = sort_by_date(clean_nash_data(raw_df))
+    report["cache_path"] = save_cached_frame(clean_df, csv_path)
+
+    return report, clean_df
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print(json.dumps({"error": "Missing arguments"}))
+        sys.exit(1)
+
+    # CLI mode: python ingest.py <nash_csv>
+    report, _ = ingest_nash_file(sys.argv[1])
+    print(json.dumps(report, default=str))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+OTD Heatmap Module
+On-time pickup rate and mean lateness by hour of day x weekday of the
+planned trip start, overall, per carrier and per store.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Any, Iterable, Optional
+from . import lazy_import, filter_states, StateSelector, normalize_carriers
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Nash timestamp format (e.g. 10/08/2025 10:43:18 AM)
+TIMESTAMP_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+# Grid shape: weekday (Monday = 0) x hour of day
+WEEKDAYS = 7
+HOURS = 24
+GRID_CELLS = WEEKDAYS * HOURS
+
+
+def _parse_fixed_width(text: pd.Series) -> pd.Series:
+    """
+    Parse zero-padded TIMESTAMP_FORMAT strings from their bytes.
+
+    The fields sit at fixed offsets, so they are read as digit arrays over
+    every row at once (strptime with %p runs per value).
+
+    Returns:
+        pd.Series: datetime64 values, NaT where a value is not in the
+            22-character zero-padded form
+    """
+    # Only 22-character ASCII values can be encoded as fixed-width bytes;
+    # the rest are blanked here and left to the fallbacks
+    candidates = ((text.str.len() == 22) & text.map(str.isascii)).to_numpy()
+    raw = np.where(candidates, text.to_numpy(dtype=object), '').astype('S22')
+    chars = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 22)
+    digits = chars.astype(np.int64) - ord('0')
+
+    def field(start: int, end: int) -> np.ndarray:
+        return sum(digits[:, i] * 10 ** (end - 1 - i) for i in range(start, end))
+
+    positions = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18]
+    matches = (
+        candidates
+        & ((digits[:, positions] >= 0) & (digits[:, positions] <= 9)).all(axis=1)
+        & (chars[:, [2, 5, 10, 13, 16, 19, 21]] == np.frombuffer(b'// :: M', dtype=np.uint8)).all(axis=1)
+        & np.isin(chars[:, 20], np.frombuffer(b'AP', dtype=np.uint8))
+    )
+
+    parts = pd.DataFrame({
+        'year': field(6, 10),
+        'month': field(0, 2),
+        'day': field(3, 5),
+        'hour': field(11, 13) % 12 + np.where(chars[:, 20] == ord('P'), 12, 0),
+        'minute': field(14, 16),
+        'second': field(17, 19)
+    })
+    parsed = pd.to_datetime(parts[matches], errors='coerce')
+    return parsed.reindex(range(len(text))).set_axis(text.index)
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Parse Nash timestamps, vectorized.
+
+    Zero-padded Nash timestamps are parsed from their bytes in one pass;
+    only values not in that form go through strptime, and only values
+    TIMESTAMP_FORMAT does not match at all through mixed-format inference.
+
+    Args:
+        values: Timestamp strings (or already parsed datetimes)
+
+    Returns:
+        pd.Series: datetime64 values, NaT where unparseable
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    text = values.astype(str).str.strip()
+    parsed = _parse_fixed_width(text)
+    pending = parsed.isna() & ~text.isin(('', 'nan', 'None', 'NaT'))
+    if pending.any():
+        parsed[pending] = pd.to_datetime(text[pending], format=TIMESTAMP_FORMAT, errors='coerce')
+        pending &= parsed.isna()
+    if pending.any():
+        parsed[pending] = pd.to_datetime(text[pending], format='mixed', errors='coerce')
+    return parsed
+
+
+def grid_cells(timestamps: pd.Series) -> np.ndarray:
+    """
+    Integer grid cell of each timestamp: weekday * 24 + hour (-1 for NaT).
+
+    Args:
+        timestamps: datetime64 values
+
+    Returns:
+        np.ndarray: int64 cell code per value in [-1, GRID_CELLS)
+    """
+    present = timestamps.notna().to_numpy()
+    cells = np.full(len(timestamps), -1, dtype=np.int64)
+    valid = timestamps[present]
+    cells[present] = valid.dt.weekday.to_numpy() * HOURS + valid.dt.hour.to_numpy()
+    return cells
+
+
+def heatmap_grids(
+    group_codes: np.ndarray,
+    cells: np.ndarray,
+    ontime: np.ndarray,
+    lateness: np.ndarray,
+    groups: int
+) -> Dict[str, np.ndarray]:
+    """
+    Aggregate trips onto one 7 x 24 grid per group with bincounts.
+
+    Each trip's (group, cell) pair is one integer bin, so every measure is
+    a single bincount over groups x GRID_CELLS bins.
+
+    Args:
+        group_codes: Group code per trip
+        cells: Grid cell per trip (see grid_cells; -1 is skipped)
+        ontime: 1.0 / 0.0 on-time flag per trip (NaN when unknown)
+        lateness: Minutes late per trip (NaN when unknown)
+        groups: Number of groups
+
+    Returns:
+        dict: trips, otd (on-time trips), otd_count, lateness and
+            lateness_count arrays of shape (groups, 7, 24)
+    """
+    size = groups * GRID_CELLS
+    shape = (groups, WEEKDAYS, HOURS)
+    placed = cells >= 0
+    bins = group_codes[placed] * GRID_CELLS + cells[placed]
+    ontime = ontime[placed]
+    lateness = lateness[placed]
+
+    has_ontime = ~np.isnan(ontime)
+    has_lateness = ~np.isnan(lateness)
+    return {
+        "trips": np.bincount(bins, minlength=size).reshape(shape),
+        "otd": np.bincount(bins[has_ontime], weights=ontime[has_ontime], minlength=size).reshape(shape),
+        "otd_count": np.bincount(bins[has_ontime], minlength=size).reshape(shape),
+        "lateness": np.bincount(bins[has_lateness], weights=lateness[has_lateness], minlength=size).reshape(shape),
+        "lateness_count": np.bincount(bins[has_lateness], minlength=size).reshape(shape)
+    }
+
+
+def analyze_otd_heatmap(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None,
+    store_ids: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    OTD % and mean lateness by weekday x hour of the planned trip start.
+
+    Lateness is Pickup Arrived minus Trip Planned Start in minutes
+    (negative when early). Timestamps are parsed once into integer grid
+    cells and every grid comes out of bincounts, so the cost is linear in
+    trips.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
+        store_ids: Stores to return in by_store (all when omitted)
+
+    Returns:
+        dict: { weekdays, hours, overall, by_carrier: { carrier: grid },
+            by_store: { store: grid } }; each grid is { trips,
+            otd_percentage, avg_lateness_minutes } as 7 x 24 lists
+            (Monday first, None where a cell has no data)
+    """
+    ca_df = filter_states(nash_df.copy(), states)
+    result = {
+        "weekdays": ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+        "hours": list(range(HOURS))
+    }
+
+    if ca_df.empty or 'Trip Planned Start' not in ca_df.columns:
+        no_trips = np.array([], dtype=np.int64)
+        empty = heatmap_grids(no_trips, no_trips, np.array([]), np.array([]), 1)
+        return {**result, "overall": _grid_payload(empty, 0), "by_carrier": {}, "by_store": {}}
+
+    planned = parse_timestamps(ca_df['Trip Planned Start'])
+    cells = grid_cells(planned)
+
+    if 'Pickup Arrived' in ca_df.columns:
+        delay = parse_timestamps(ca_df['Pickup Arrived']) - planned
+        lateness = (delay.dt.total_seconds() / 60).to_numpy(dtype=float, na_value=np.nan)
+    else:
+        lateness = np.full(len(ca_df), np.nan)
+
+    if 'Is Pickup Arrived Ontime' in ca_df.columns:
+        ontime = pd.to_numeric(ca_df['Is Pickup Arrived Ontime'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    else:
+        ontime = np.full(len(ca_df), np.nan)
+
+    overall = heatmap_grids(np.zeros(len(ca_df), dtype=np.int64), cells, ontime, lateness, 1)
+    result["overall"] = _grid_payload(overall, 0)
+
+    carrier_codes, carriers = pd.factorize(normalize_carriers(ca_df['Carrier']))
+    by_carrier = heatmap_grids(carrier_codes.astype(np.int64), cells, ontime, lateness, len(carriers))
+    result["by_carrier"] = {carrier: _grid_payload(by_carrier, code) for code, carrier in enumerate(carriers)}
+
+    store_codes, stores = pd.factorize(ca_df['Store Id'].astype(str))
+    by_store = heatmap_grids(store_codes.astype(np.int64), cells, ontime, lateness, len(stores))
+    wanted = None if store_ids is None else {str(store_id) for store_id in store_ids}
+    result["by_store"] = {
+        store: _grid_payload(by_store, code)
+        for code, store in enumerate(stores)
+        if wanted is None or store in wanted
+    }
+
+    return result
+
+
+def _grid_payload(grids: Dict[str, np.ndarray], code: int) -> Dict[str, Any]:
+    """One group's grids as 7 x 24 nested lists (None for empty cells)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        otd = np.round(grids["otd"][code] / grids["otd_count"][code] * 100, 2)
+        lateness = np.round(grids["lateness"][code] / grids["lateness_count"][code], 1)
+    return {
+        "trips": grids["trips"][code].tolist(),
+        "otd_percentage": _nan_to_none(otd),
+        "avg_lateness_minutes": _nan_to_none(lateness)
+    }
+
+
+def _nan_to_none(grid: np.ndarray) -> list:
+    """Nested lists of a float grid with NaN as None (JSON null)."""
+    values = grid.astype(object)
+    values[np.isnan(grid)] = None
+    return values.tolist()
+
+
+if __name__ == '__main__':
+    import json
+    import os
+    import sys
+    from . import load_nash_data, load_request_dataset, parse_cli_request, run_state_request, PROJECT_ROOT
+
+    # CLI mode: python otd_heatmap.py <nash_csv> [--stores=2082,5930]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python otd_heatmap.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset',))
+
+    # Check for CLI arguments
+    if request is not None:
+        nash_df = load_request_dataset(request)
+        params = request['params']
+
+        stores = params.get('stores')
+        if isinstance(stores, str):
+            stores = [store_id.strip() for store_id in stores.split(',') if store_id.strip()]
+
+        heatmap = run_state_request(analyze_otd_heatmap, nash_df, params, store_ids=stores)
+        print(json.dumps(heatmap))
+    else:
+        # Development mode: use example data
+        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        nash_df = load_nash_data(nash_path)
+
+        heatmap = analyze_otd_heatmap(nash_df)
+        print("OTD Heatmap (overall, busiest weekday):")
+        busiest = int(np.argmax(np.sum(heatmap['overall']['trips'], axis=1)))
+        print(json.dumps({
+            "weekday": heatmap['weekdays'][busiest],
+            "trips": heatmap['overall']['trips'][busiest],
+            "otd_percentage": heatmap['overall']['otd_percentage'][busiest],
+            "avg_lateness_minutes": heatmap['overall']['avg_lateness_minutes'][busiest]
+        }, indent=2))
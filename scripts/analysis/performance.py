@@ -4,28 +4,99 @@ Performance Metrics Module
 Calculate detailed performance metrics.
 """
 
-import pandas as pd
-from typing import Dict, Any
+from __future__ import annotations
+
+from typing import Dict, Any, Optional, Sequence
 from . import (
-    filter_ca_stores,
-    calculate_otd_percentage,
-    safe_mean,
-    safe_sum
+    lazy_import,
+    filter_states,
+    StateSelector,
+    normalize_carriers,
+    safe_mean
+)
+from .sketches import DEFAULT_QUANTILES, build_quantile_sketches, sketch_quantiles
+
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
+
+# Columns the performance reports aggregate; each gets a sum and a
+# non-null count per carrier, so means are sum / count
+PERFORMANCE_COLUMNS = (
+    'Driver Dwell Time',
+    'Driver Load Time',
+    'Driver Sort Time',
+    'Trip Actual Time',
+    'Drops Per Hour Trip',
+    'Drops Per Hour Total',
+    'Is Pickup Arrived Ontime',
+    'Total Orders',
+    'Delivered Orders',
+    'Failed Orders',
+    'Returned Orders',
+    'Pending Orders'
 )
 
 
-def calculate_performance_metrics(nash_df: pd.DataFrame) -> Dict[str, Any]:
+def _aggregate(ca_df: pd.DataFrame, by_carrier: bool = False) -> Any:
+    """
+    Sum and count every performance column in one aggregation call.
+
+    Args:
+        ca_df: Trips of the selected states
+        by_carrier: Group by normalized carrier instead of totalling
+
+    Returns:
+        pd.Series of '<column>_sum' / '<column>_count' measures, or a
+            pd.DataFrame of them with one row per carrier (first-appearance
+            order) when by_carrier
+    """
+    columns = [column for column in PERFORMANCE_COLUMNS if column in ca_df.columns]
+
+    if not by_carrier:
+        stats = ca_df[columns].agg(['sum', 'count'])
+        return pd.Series({
+            f"{column}_{how}": stats.at[how, column] for column in columns for how in ('sum', 'count')
+        })
+
+    named = {}
+    for column in columns:
+        named[f"{column}_sum"] = (column, 'sum')
+        named[f"{column}_count"] = (column, 'count')
+    carriers = normalize_carriers(ca_df['Carrier']).rename('Carrier_Normalized')
+    return ca_df.groupby(carriers, sort=False, dropna=False).agg(**named)
+
+
+def _total(totals: pd.Series, column: str) -> float:
+    """Sum of a column in an aggregate row (0.0 when absent)."""
+    return float(totals.get(f"{column}_sum", 0.0))
+
+
+def _mean(totals: pd.Series, column: str) -> float:
+    """Mean of a column's non-null values in an aggregate row (0.0 when none)."""
+    count = totals.get(f"{column}_count", 0)
+    return _total(totals, column) / float(count) if count > 0 else 0.0
+
+
+def _rate(part: float, whole: float) -> float:
+    """Percentage of whole, rounded (0.0 when whole is 0)."""
+    return round((part / whole * 100) if whole > 0 else 0.0, 2)
+
+
+def calculate_performance_metrics(nash_df: pd.DataFrame, states: StateSelector = None) -> Dict[str, Any]:
     """
     Calculate detailed performance metrics.
 
+    All measures come out of a single aggregation pass over the trips.
+
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Performance metrics including timing, efficiency, and delivery stats
     """
-    # Filter to CA stores
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Filter to the selected states (CA by default)
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
         return {
@@ -50,37 +121,33 @@ def calculate_performance_metrics(nash_df: pd.DataFrame) -> Dict[str, Any]:
             }
         }
 
+    totals = _aggregate(ca_df)
+
     # Calculate timing metrics
     timing = {
-        "avg_driver_dwell_time": round(safe_mean(ca_df['Driver Dwell Time']), 2),
-        "avg_load_time": round(safe_mean(ca_df['Driver Load Time']), 2),
-        "avg_driver_sort_time": round(safe_mean(ca_df['Driver Sort Time']), 2),
-        "avg_trip_actual_time": round(safe_mean(ca_df['Trip Actual Time']), 2)
+        "avg_driver_dwell_time": round(_mean(totals, 'Driver Dwell Time'), 2),
+        "avg_load_time": round(_mean(totals, 'Driver Load Time'), 2),
+        "avg_driver_sort_time": round(_mean(totals, 'Driver Sort Time'), 2),
+        "avg_trip_actual_time": round(_mean(totals, 'Trip Actual Time'), 2)
     }
 
     # Calculate efficiency metrics
-    total_orders = safe_sum(ca_df['Total Orders'])
+    total_orders = _total(totals, 'Total Orders')
 
     efficiency = {
-        "drops_per_hour_trip": round(safe_mean(ca_df['Drops Per Hour Trip']), 2),
-        "drops_per_hour_total": round(safe_mean(ca_df['Drops Per Hour Total']), 2),
-        "failed_orders_rate": round(
-            (safe_sum(ca_df['Failed Orders']) / total_orders * 100) if total_orders > 0 else 0.0,
-            2
-        ),
-        "returned_orders_rate": round(
-            (safe_sum(ca_df['Returned Orders']) / total_orders * 100) if total_orders > 0 else 0.0,
-            2
-        )
+        "drops_per_hour_trip": round(_mean(totals, 'Drops Per Hour Trip'), 2),
+        "drops_per_hour_total": round(_mean(totals, 'Drops Per Hour Total'), 2),
+        "failed_orders_rate": _rate(_total(totals, 'Failed Orders'), total_orders),
+        "returned_orders_rate": _rate(_total(totals, 'Returned Orders'), total_orders)
     }
 
     # Calculate delivery metrics
     delivery = {
-        "otd_percentage": round(calculate_otd_percentage(ca_df), 2),
-        "delivered_orders": int(safe_sum(ca_df['Delivered Orders'])),
-        "failed_orders": int(safe_sum(ca_df['Failed Orders'])),
-        "returned_orders": int(safe_sum(ca_df['Returned Orders'])),
-        "pending_orders": int(safe_sum(ca_df['Pending Orders']))
+        "otd_percentage": round(_mean(totals, 'Is Pickup Arrived Ontime') * 100, 2),
+        "delivered_orders": int(_total(totals, 'Delivered Orders')),
+        "failed_orders": int(_total(totals, 'Failed Orders')),
+        "returned_orders": int(_total(totals, 'Returned Orders')),
+        "pending_orders": int(_total(totals, 'Pending Orders'))
     }
 
     return {
@@ -90,17 +157,18 @@ def calculate_performance_metrics(nash_df: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
-def analyze_timing_by_store(nash_df: pd.DataFrame) -> Dict[str, Any]:
+def analyze_timing_by_store(nash_df: pd.DataFrame, states: StateSelector = None) -> Dict[str, Any]:
     """
     Analyze timing metrics for each store.
 
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Timing metrics by store
     """
-    ca_df = filter_ca_stores(nash_df.copy())
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
         return {}
@@ -121,17 +189,18 @@ def analyze_timing_by_store(nash_df: pd.DataFrame) -> Dict[str, Any]:
     return store_timing
 
 
-def calculate_delivery_success_rates(nash_df: pd.DataFrame) -> Dict[str, Any]:
+def calculate_delivery_success_rates(nash_df: pd.DataFrame, states: StateSelector = None) -> Dict[str, Any]:
     """
     Calculate delivery success rates and order status breakdown.
 
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Delivery success metrics
     """
-    ca_df = filter_ca_stores(nash_df.copy())
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
         return {
@@ -139,44 +208,37 @@ def calculate_delivery_success_rates(nash_df: pd.DataFrame) -> Dict[str, Any]:
             "by_carrier": {}
         }
 
-    # Overall success rates
-    total_orders = safe_sum(ca_df['Total Orders'])
-    delivered = safe_sum(ca_df['Delivered Orders'])
-    failed = safe_sum(ca_df['Failed Orders'])
-    returned = safe_sum(ca_df['Returned Orders'])
-    pending = safe_sum(ca_df['Pending Orders'])
+    # One pass: per-carrier order counts, with the overall figures their
+    # total (whole counts, so the sums are exact)
+    by_carrier_totals = _aggregate(ca_df, by_carrier=True)
+    totals = by_carrier_totals.sum()
+
+    total_orders = _total(totals, 'Total Orders')
+    delivered = _total(totals, 'Delivered Orders')
+    failed = _total(totals, 'Failed Orders')
+    returned = _total(totals, 'Returned Orders')
 
     overall = {
         "total_orders": int(total_orders),
         "delivered": int(delivered),
         "failed": int(failed),
         "returned": int(returned),
-        "pending": int(pending),
-        "success_rate": round((delivered / total_orders * 100) if total_orders > 0 else 0.0, 2),
-        "failure_rate": round((failed / total_orders * 100) if total_orders > 0 else 0.0, 2),
-        "return_rate": round((returned / total_orders * 100) if total_orders > 0 else 0.0, 2)
+        "pending": int(_total(totals, 'Pending Orders')),
+        "success_rate": _rate(delivered, total_orders),
+        "failure_rate": _rate(failed, total_orders),
+        "return_rate": _rate(returned, total_orders)
     }
 
-    # By carrier
-    from . import normalize_carrier_name
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
-
     by_carrier = {}
-    for carrier in ca_df['Carrier_Normalized'].unique():
-        carrier_df = ca_df[ca_df['Carrier_Normalized'] == carrier]
-
-        carrier_total = safe_sum(carrier_df['Total Orders'])
-        carrier_delivered = safe_sum(carrier_df['Delivered Orders'])
-        carrier_failed = safe_sum(carrier_df['Failed Orders'])
+    for carrier, carrier_totals in by_carrier_totals.iterrows():
+        carrier_total = _total(carrier_totals, 'Total Orders')
+        carrier_delivered = _total(carrier_totals, 'Delivered Orders')
 
         by_carrier[carrier] = {
             "total_orders": int(carrier_total),
             "delivered": int(carrier_delivered),
-            "failed": int(carrier_failed),
-            "success_rate": round(
-                (carrier_delivered / carrier_total * 100) if carrier_total > 0 else 0.0,
-                2
-            )
+            "failed": int(_total(carrier_totals, 'Failed Orders')),
+            "success_rate": _rate(carrier_delivered, carrier_total)
         }
 
     return {
@@ -185,20 +247,82 @@ def calculate_delivery_success_rates(nash_df: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
+def calculate_latency_percentiles(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None,
+    sketches: Optional[pd.DataFrame] = None,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES
+) -> Dict[str, Any]:
+    """
+    Calculate dwell, load and trip time percentiles per carrier, store and week.
+
+    Percentiles are read from mergeable quantile sketches (see
+    build_quantile_sketches), within 1% of an exact value of that rank.
+    With prebuilt sketches no trip is scanned.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
+        sketches: Quantile sketches of nash_df (see load_request_sketches);
+            built from nash_df when omitted
+        quantiles: Quantiles to report (p50 / p90 / p99 by default)
+
+    Returns:
+        dict: { by_carrier, by_store, by_week: { group: { metric:
+            { count, p50, p90, p99 } } } }, weeks keyed by their Monday
+    """
+    if sketches is None:
+        cells = build_quantile_sketches(filter_states(nash_df.copy(), states))
+    else:
+        cells = filter_states(sketches.copy(), states)
+
+    weeks = cells['Date'] - pd.to_timedelta(cells['Date'].dt.weekday, unit='D')
+    cells['Week_Start'] = weeks.dt.strftime('%Y-%m-%d')
+
+    return {
+        "by_carrier": _percentiles_by(cells, 'Carrier_Normalized', quantiles),
+        "by_store": _percentiles_by(cells, 'Store Id', quantiles),
+        "by_week": _percentiles_by(cells, 'Week_Start', quantiles)
+    }
+
+
+def _percentiles_by(cells: pd.DataFrame, dimension: str, quantiles: Sequence[float]) -> Dict[str, Any]:
+    """Percentiles of every metric per value of a dimension (sorted)."""
+    table = sketch_quantiles(cells[cells[dimension].notna()], [dimension], quantiles)
+    names = [column for column in table.columns if column.startswith('p')]
+
+    percentiles = {}
+    for _, row in table.iterrows():
+        percentiles.setdefault(row[dimension], {})[row['metric']] = {
+            "count": int(row['count']),
+            **{name: round(float(row[name]), 2) for name in names}
+        }
+    return percentiles
+
+
 if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import load_nash_data, load_request_dataset, parse_cli_request, run_state_request, PROJECT_ROOT
+    from .sketches import load_request_sketches
 
-    # Check for CLI arguments
-    if len(sys.argv) >= 2:
-        # CLI mode: python performance.py <nash_csv>
-        nash_path = sys.argv[1]
-
-        nash_df = load_nash_data(nash_path)
+    # CLI mode: python performance.py <nash_csv> [--percentiles]
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python performance.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset',))
 
-        performance = calculate_performance_metrics(nash_df)
+    # Check for CLI arguments
+    if request is not None:
+        nash_df = load_request_dataset(request)
+        params = request['params']
+
+        if 'percentiles' in params:
+            # Read from the dataset's cached sketches, built on first use
+            sketches = load_request_sketches(request, nash_df)
+            performance = run_state_request(calculate_latency_percentiles, nash_df, params, sketches=sketches)
+        else:
+            performance = run_state_request(calculate_performance_metrics, nash_df, params)
         print(json.dumps(performance))
     else:
         # Development mode: use example data
@@ -219,3 +343,7 @@ if __name__ == '__main__':
         # Print first 3 stores only
         sample_stores = dict(list(timing_by_store.items())[:3])
         print(json.dumps(sample_stores, indent=2))
+
+        print("\nLatency Percentiles by Carrier:")
+        percentiles = calculate_latency_percentiles(nash_df)
+        print(json.dumps(percentiles['by_carrier'], indent=2))
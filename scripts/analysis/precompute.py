@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Report Precompute Module
+Compute every default report payload from a single load of an upload.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Any, Callable, Optional
+from . import (
+    lazy_import,
+    load_request_dataset,
+    load_request_registry,
+    load_request_rate_cards,
+    normalize_carriers,
+    parse_cli_request
+)
+from .cube import build_metrics_cube, load_request_cube
+from .sketches import load_request_sketches
+from .distinct_counts import load_request_distinct_sketches
+from .dashboard import calculate_dashboard_metrics
+from .all_stores import analyze_all_stores
+from .vendor_analysis import analyze_vendors
+from .cpd_analysis import compare_cpd
+from .batch_analysis import get_trip_level_batch_data
+from .performance import calculate_performance_metrics
+from .weekly_metrics import analyze_weekly_metrics
+
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
+
+
+def _report_builders(
+    nash_df: pd.DataFrame,
+    store_registry: Dict[str, Any],
+    rate_cards: Dict[str, Any],
+    cube: pd.DataFrame
+) -> Dict[str, Callable[[], Any]]:
+    """Default-parameter report payloads, matching each script's CLI output."""
+    return {
+        "dashboard": lambda: calculate_dashboard_metrics(nash_df, store_registry, rate_cards, cube=cube),
+        "stores": lambda: analyze_all_stores(nash_df, store_registry, rate_cards),
+        "vendors": lambda: analyze_vendors(nash_df, rate_cards, cube=cube),
+        "cpd": lambda: compare_cpd(nash_df, store_registry, rate_cards),
+        "batch": lambda: get_trip_level_batch_data(nash_df, rate_cards),
+        "performance": lambda: calculate_performance_metrics(nash_df),
+        "weekly": lambda: analyze_weekly_metrics(nash_df, rate_cards, cube=cube)
+    }
+
+
+def precompute_reports(
+    nash_df: pd.DataFrame,
+    store_registry: Dict[str, Any],
+    rate_cards: Dict[str, Any],
+    cube: Optional[pd.DataFrame] = None
+) -> Dict[str, Any]:
+    """
+    Compute every report with default parameters from one loaded dataset.
+
+    The reports only read nash_df, so they share the frame, and the
+    dashboard, vendor and weekly reports share one metrics cube. A failing
+    report is recorded in errors without stopping the others.
+
+    Args:
+        nash_df: Nash trip data
+        store_registry: Store registry with Spark CPD data
+        rate_cards: Vendor rate cards
+        cube: Metrics cube of nash_df (built here when omitted)
+
+    Returns:
+        dict: { reports: { name: payload }, errors: { name: message },
+            seconds: { name: compute time } }
+    """
+    reports = {}
+    errors = {}
+    seconds = {}
+
+    if cube is None:
+        cube = build_metrics_cube(nash_df, rate_cards)
+
+    for name, build in _report_builders(nash_df, store_registry, rate_cards, cube).items():
+        started = time.perf_counter()
+        try:
+            reports[name] = build()
+        except Exception as e:
+            errors[name] = str(e)
+        seconds[name] = round(time.perf_counter() - started, 3)
+
+    return {"reports": reports, "errors": errors, "seconds": seconds}
+
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    # CLI mode: python precompute.py <nash_csv> <registry_json> <rate_cards_json>
+    #   or: python precompute.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'registry_path', 'rate_cards_path'))
+
+    if request is None:
+        print(json.dumps({"error": "Missing arguments"}))
+        sys.exit(1)
+
+    nash_df = load_request_dataset(request)
+
+    # Registry / rate cards read once for every report (only the stores and
+    # vendors present in this dataset)
+    store_registry = load_request_registry(request, nash_df['Store Id'].astype(str).unique())
+    rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+    # Build (and cache) the metrics cube and the quantile / distinct-count
+    # sketches for later on-demand reports too
+    cube = load_request_cube(request, nash_df, rate_cards)
+    load_request_sketches(request, nash_df)
+    load_request_distinct_sketches(request, nash_df)
+
+    print(json.dumps(precompute_reports(nash_df, store_registry, rate_cards, cube)))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Quantile Sketches Module
+Mergeable relative-error quantile sketches of latency-style metrics, kept
+per Store Id x Carrier x day like the metrics cube.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Any, Iterable, Sequence
+from . import lazy_import, iter_nash_data
+from .cube import CUBE_DIMENSIONS, load_request_rollup, trip_dimensions
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Sketched metrics: name -> Nash column
+SKETCH_METRICS = {
+    'dwell_time': 'Driver Dwell Time',
+    'load_time': 'Driver Load Time',
+    'trip_time': 'Trip Actual Time'
+}
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Every reported quantile is within 1% of a value of that rank
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Magnitudes below this are counted in the zero bucket
+_MIN_MAGNITUDE = 1e-9
+
+# Keeps positive bucket keys above the zero bucket (log indexes of
+# realistic magnitudes stay far below it)
+_KEY_OFFSET = 1 << 20
+
+# Columns identifying a bucket of a cell's sketch
+SKETCH_KEYS = CUBE_DIMENSIONS + ('metric', 'key')
+
+
+def _log_gamma(relative_accuracy: float) -> float:
+    """Log of the bucket growth factor for a relative accuracy."""
+    if not 0 < relative_accuracy < 1:
+        raise ValueError(f"Invalid relative accuracy: {relative_accuracy}")
+    return math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+
+
+def sketch_keys(values: np.ndarray, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> np.ndarray:
+    """
+    Map values to logarithmic bucket keys (DDSketch buckets).
+
+    Bucket i holds magnitudes in (gamma^(i-1), gamma^i], with
+    gamma = (1 + a) / (1 - a). Keys are signed and increase with the value:
+    negatives below 0, the zero bucket at 0, positives above.
+
+    Args:
+        values: Non-NaN values
+        relative_accuracy: Relative accuracy a of the sketch
+
+    Returns:
+        np.ndarray: int64 bucket key per value
+    """
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    nonzero = magnitude > _MIN_MAGNITUDE
+
+    keys = np.zeros(len(values), dtype=np.int64)
+    index = np.ceil(np.log(magnitude[nonzero]) / _log_gamma(relative_accuracy))
+    keys[nonzero] = (index.astype(np.int64) + _KEY_OFFSET) * np.sign(values[nonzero]).astype(np.int64)
+    return keys
+
+
+def key_values(keys: np.ndarray, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> np.ndarray:
+    """
+    Representative value of each bucket key (within a of the bucket's values).
+
+    Args:
+        keys: Bucket keys (see sketch_keys)
+        relative_accuracy: Relative accuracy the keys were built with
+
+    Returns:
+        np.ndarray: float value per key
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    gamma = math.exp(_log_gamma(relative_accuracy))
+    index = np.abs(keys) - _KEY_OFFSET
+    values = np.sign(keys) * 2 * np.power(gamma, index.astype(float)) / (gamma + 1)
+    return np.where(keys == 0, 0.0, values)
+
+
+def build_quantile_sketches(
+    nash_df: pd.DataFrame,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY
+) -> pd.DataFrame:
+    """
+    Sketch the SKETCH_METRICS of Nash trips per Store Id x carrier x day.
+
+    A sketch is a bucket histogram, kept as one row per (cell, metric,
+    bucket key) with its count. Merging sketches - across cells, chunks
+    or partitions - is summing counts per key, so no trip values are held.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        relative_accuracy: Relative accuracy of quantiles read back
+
+    Returns:
+        pd.DataFrame: SKETCH_KEYS columns and count; attrs records the
+            relative_accuracy
+    """
+    dimensions = trip_dimensions(nash_df)
+
+    parts = []
+    for metric, column in SKETCH_METRICS.items():
+        if column not in nash_df.columns:
+            continue
+        values = pd.to_numeric(nash_df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        present = ~np.isnan(values)
+        part = dimensions[present].reset_index(drop=True)
+        part['metric'] = metric
+        part['key'] = sketch_keys(values[present], relative_accuracy)
+        parts.append(part)
+
+    if parts:
+        buckets = pd.concat(parts, ignore_index=True)
+    else:
+        buckets = dimensions.iloc[0:0].assign(metric=pd.Series(dtype=object), key=pd.Series(dtype=np.int64))
+    sketches = buckets.groupby(list(SKETCH_KEYS), dropna=False, sort=False).size().rename('count').reset_index()
+    sketches.attrs['relative_accuracy'] = relative_accuracy
+    return sketches
+
+
+def merge_sketches(sketches: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merge sketches of disjoint trips (chunks, partitions, uploads).
+
+    Args:
+        sketches: Sketch frames built with the same relative accuracy
+
+    Returns:
+        pd.DataFrame: One sketch covering every input's trips
+    """
+    frames = list(sketches)
+    accuracies = {frame.attrs.get('relative_accuracy') for frame in frames}
+    if len(accuracies) > 1:
+        raise ValueError(f"Cannot merge sketches of different accuracy: {sorted(accuracies)}")
+
+    merged = pd.concat(frames, ignore_index=True).groupby(
+        list(SKETCH_KEYS), dropna=False, sort=False
+    )['count'].sum().reset_index()
+    merged.attrs['relative_accuracy'] = accuracies.pop() if accuracies else DEFAULT_RELATIVE_ACCURACY
+    return merged
+
+
+def sketch_nash_file(
+    file_path: str,
+    chunksize: int = 100_000,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY
+) -> pd.DataFrame:
+    """
+    Sketch a Nash CSV chunk by chunk (see iter_nash_data).
+
+    Args:
+        file_path: Path to Nash CSV file (plain or compressed)
+        chunksize: Rows per chunk
+        relative_accuracy: Relative accuracy of quantiles read back
+
+    Returns:
+        pd.DataFrame: Sketches of the whole file
+    """
+    return merge_sketches(
+        build_quantile_sketches(chunk, relative_accuracy)
+        for chunk in iter_nash_data(file_path, chunksize)
+    )
+
+
+def sketch_quantiles(
+    sketches: pd.DataFrame,
+    by: Sequence[str],
+    quantiles: Sequence[float] = DEFAULT_QUANTILES
+) -> pd.DataFrame:
+    """
+    Merge sketches up to groups and read quantiles of each metric.
+
+    Args:
+        sketches: Sketch frame (see build_quantile_sketches), possibly with
+            derived grouping columns (e.g. the week of Date)
+        by: Grouping columns; () merges everything
+        quantiles: Quantiles in [0, 1]
+
+    Returns:
+        pd.DataFrame: One row per group and metric (sorted) with count and
+            one 'p<100q>' column per quantile (p50, p90, p99)
+    """
+    relative_accuracy = sketches.attrs.get('relative_accuracy', DEFAULT_RELATIVE_ACCURACY)
+    keys = list(by) + ['metric']
+    columns = keys + ['count'] + [f"p{q * 100:g}" for q in quantiles]
+    if sketches.empty:
+        return pd.DataFrame(columns=columns)
+
+    buckets = sketches.groupby(keys + ['key'], dropna=False, sort=True)['count'].sum().reset_index()
+    groups = buckets.groupby(keys, dropna=False, sort=False).ngroup().to_numpy()
+    bucket_keys = buckets['key'].to_numpy()
+    counts = buckets['count'].to_numpy()
+
+    # Buckets are sorted by group, then key: one global running count
+    # locates every group's ranks with a binary search
+    cumulative = np.cumsum(counts)
+    starts = np.r_[0, np.flatnonzero(np.diff(groups)) + 1]
+    totals = np.add.reduceat(counts, starts)
+    before = cumulative[starts] - counts[starts]
+
+    result = buckets.iloc[starts][keys].reset_index(drop=True)
+    result['count'] = totals
+    for q in quantiles:
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantile: {q}")
+        positions = np.searchsorted(cumulative, before + q * (totals - 1), side='right')
+        result[f"p{q * 100:g}"] = key_values(bucket_keys[positions], relative_accuracy)
+    return result[columns]
+
+
+def load_request_sketches(
+    request: Dict[str, Any],
+    nash_df: pd.DataFrame,
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY
+) -> pd.DataFrame:
+    """
+    Get the quantile sketches of a CLI request's dataset, building them once.
+
+    Cached next to the metrics cube, per dataset version and accuracy (see
+    load_request_rollup).
+
+    Args:
+        request: CLI request (dataset path or cache_key)
+        nash_df: The request's dataset, already loaded (and date-sliced)
+        relative_accuracy: Relative accuracy of quantiles read back
+
+    Returns:
+        pd.DataFrame: Sketches over every state
+    """
+    return load_request_rollup(
+        request, 'sketches', [relative_accuracy],
+        lambda: build_quantile_sketches(nash_df, relative_accuracy)
+    )
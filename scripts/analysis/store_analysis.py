@@ -4,10 +4,13 @@ Store-Level Analysis Module
 Analyze metrics for each individual store.
 """
 
-import pandas as pd
+from __future__ import annotations
+
 from typing import Dict, Any
 from . import (
-    filter_ca_stores,
+    lazy_import,
+    filter_states,
+    StateSelector,
     calculate_otd_percentage,
     safe_mean,
     safe_sum,
@@ -16,12 +19,23 @@ from . import (
 )
 from .cpd_analysis import calculate_van_cpd
 
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
+
+# Keys of each analyze_store result, in order
+STORE_METRIC_COLUMNS = (
+    'store_id', 'total_orders', 'total_trips', 'van_cpd', 'spark_cpd',
+    'cpd_difference', 'otd_percentage', 'avg_batch_size', 'target_batch_size',
+    'carriers', 'date_range'
+)
+
 
 def analyze_store(
     store_id: str,
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
-    rate_cards: Dict[str, Any]
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Calculate metrics for a specific store.
@@ -31,12 +45,13 @@ def analyze_store(
         nash_df: DataFrame with Nash trip data
         store_registry: Store registry with Spark CPD data
         rate_cards: Rate cards for vendors
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Store-specific metrics
     """
-    # Filter to CA stores and specific store
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Filter to the selected states and the specific store
+    ca_df = filter_states(nash_df.copy(), states)
     store_df = ca_df[ca_df['Store Id'] == str(store_id)]
 
     if store_df.empty:
@@ -100,7 +115,8 @@ def analyze_store(
 def analyze_all_stores(
     nash_df: pd.DataFrame,
     store_registry: Dict[str, Any],
-    rate_cards: Dict[str, Any]
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None
 ) -> Dict[str, Any]:
     """
     Analyze all stores in the Nash data.
@@ -109,11 +125,12 @@ def analyze_all_stores(
         nash_df: DataFrame with Nash trip data
         store_registry: Store registry with Spark CPD data
         rate_cards: Rate cards for vendors
+        states: State selector (see resolve_states); defaults to CA
 
     Returns:
         dict: Metrics for all stores
     """
-    ca_df = filter_ca_stores(nash_df.copy())
+    ca_df = filter_states(nash_df.copy(), states)
 
     if ca_df.empty:
         return {}
@@ -121,7 +138,7 @@ def analyze_all_stores(
     store_metrics = {}
     for store_id in ca_df['Store Id'].unique():
         store_metrics[str(store_id)] = analyze_store(
-            store_id, nash_df, store_registry, rate_cards
+            store_id, nash_df, store_registry, rate_cards, states=states
         )
 
     return store_metrics
@@ -168,25 +185,30 @@ if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import (
+        load_nash_data, load_request_dataset, load_request_registry,
+        load_request_rate_cards, normalize_carriers, parse_cli_request, PROJECT_ROOT
+    )
 
-    # Check for CLI arguments
-    if len(sys.argv) >= 5:
-        # CLI mode: python store_analysis.py <nash_csv> <store_id> <registry_json> <rate_cards_json>
-        nash_path = sys.argv[1]
-        store_id = sys.argv[2]
-        registry_path = sys.argv[3]
-        rates_path = sys.argv[4]
-
-        nash_df = load_nash_data(nash_path)
+    # CLI mode: python store_analysis.py <nash_csv> <store_id> <registry_json> <rate_cards_json>
+    #   [--state=TX]
+    #   or: python store_analysis.py --stdin (JSON request envelope on stdin, params.store_id)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'store_id', 'registry_path', 'rate_cards_path'))
 
-        with open(registry_path, 'r') as f:
-            store_registry = json.load(f)
-
-        with open(rates_path, 'r') as f:
-            rate_cards = json.load(f)
-
-        metrics = analyze_store(store_id, nash_df, store_registry, rate_cards)
+    # Check for CLI arguments
+    if request is not None:
+        store_id = str(request['params']['store_id'])
+        nash_df = load_request_dataset(request)
+
+        # Registry / rate cards: inline, JSON files or the SQLite data store
+        # (only this store and the vendors present in this dataset are read)
+        store_registry = load_request_registry(request, [store_id])
+        rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+        # A store is in a single state, so the result is not keyed by state
+        metrics = analyze_store(
+            store_id, nash_df, store_registry, rate_cards, states=request['params'].get('state')
+        )
         print(json.dumps(metrics))
     else:
         # Development mode: use example data
@@ -4,173 +4,114 @@ Vendor Performance Comparison Module
 Compare performance across FOX, NTG, FDC.
 """
 
-import pandas as pd
-from typing import Dict, Any
+from __future__ import annotations
+
+from typing import Dict, Any, Optional
 from . import (
-    filter_ca_stores,
-    calculate_otd_percentage,
-    safe_mean,
-    safe_sum,
-    normalize_carrier_name
+    lazy_import,
+    StateSelector
 )
-from .cpd_analysis import calculate_van_cpd
+from .cube import cube_mean, rollup_cube, select_cube
+
+# Deferred until a report touches a frame (see lazy_import)
+pd = lazy_import('pandas')
 
 
 def analyze_vendors(
     nash_df: pd.DataFrame,
-    rate_cards: Dict[str, Any]
+    rate_cards: Dict[str, Any],
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None
 ) -> Dict[str, Any]:
     """
     Compare vendor performance metrics.
 
+    Vendors are a rollup of the metrics cube by carrier, so with a
+    prebuilt cube the cost is proportional to cube cells rather than trips.
+
     Args:
         nash_df: DataFrame with Nash trip data
         rate_cards: Rate cards for vendors
+        states: State selector (see resolve_states); defaults to CA
+        cube: Metrics cube of nash_df (see load_request_cube); built from
+            nash_df when omitted
 
     Returns:
         dict: Performance metrics by vendor (FOX, NTG, FDC)
     """
-    # Filter to CA stores
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Cube cells of the selected states (CA by default)
+    cells = select_cube(nash_df, rate_cards, states, cube)
 
-    if ca_df.empty:
+    if cells.empty:
         return {}
 
-    # Normalize carrier names
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
-
-    # Analyze each vendor
+    # Analyze each vendor, in order of first appearance in the data
     vendor_metrics = {}
-
-    for vendor in ca_df['Carrier_Normalized'].unique():
-        vendor_df = ca_df[ca_df['Carrier_Normalized'] == vendor]
-
-        metrics = _analyze_vendor(vendor_df, vendor, rate_cards)
-        vendor_metrics[vendor] = metrics
+    for _, totals in rollup_cube(cells, ['Carrier_Normalized']).iterrows():
+        vendor_metrics[totals['Carrier_Normalized']] = _analyze_vendor(totals)
 
     return vendor_metrics
 
 
-def _analyze_vendor(
-    vendor_df: pd.DataFrame,
-    vendor_name: str,
-    rate_cards: Dict[str, Any]
-) -> Dict[str, Any]:
+def _analyze_vendor(totals: pd.Series) -> Dict[str, Any]:
     """
     Analyze a single vendor's performance.
 
     Args:
-        vendor_df: DataFrame filtered to vendor
-        vendor_name: Name of the vendor
-        rate_cards: Rate card data
+        totals: The vendor's row of the cube rolled up by carrier
 
     Returns:
         dict: Vendor performance metrics
     """
-    # Total trips and orders
-    total_trips = len(vendor_df)
-    total_orders = int(safe_sum(vendor_df['Total Orders']))
-
-    # Calculate average CPD
-    avg_cpd = _calculate_vendor_avg_cpd(vendor_df, vendor_name, rate_cards)
-
     # Calculate OTD percentage
-    otd_percentage = calculate_otd_percentage(vendor_df)
-
-    # Calculate average driver time (in minutes)
-    avg_driver_time = safe_mean(vendor_df['Driver Total Time'])
-
-    # Calculate drops per hour
-    # Use 'Drops Per Hour Trip' if available
-    if 'Drops Per Hour Trip' in vendor_df.columns:
-        drops_per_hour = safe_mean(vendor_df['Drops Per Hour Trip'])
-    else:
-        # Calculate from data: orders / (trip_actual_time / 60)
-        vendor_df_calc = vendor_df.copy()
-        vendor_df_calc['calc_dph'] = vendor_df_calc.apply(
-            lambda row: (row['Total Orders'] / (row['Trip Actual Time'] / 60))
-            if pd.notna(row['Trip Actual Time']) and row['Trip Actual Time'] > 0
-            else 0,
-            axis=1
-        )
-        drops_per_hour = safe_mean(vendor_df_calc['calc_dph'])
+    otd_trips = totals['otd_trips']
+    otd_percentage = (totals['on_time'] / otd_trips * 100) if otd_trips > 0 else 0.0
 
     return {
-        "total_trips": total_trips,
-        "total_orders": total_orders,
-        "avg_cpd": round(avg_cpd, 2),
+        "total_trips": int(totals['trips']),
+        "total_orders": int(totals['orders']),
+        # Mean per-trip CPD over trips with orders (0.0 without a rate card)
+        "avg_cpd": round(cube_mean(totals, 'trip_cpd'), 2),
         "otd_percentage": round(otd_percentage, 2),
-        "avg_driver_time": round(avg_driver_time, 2),
-        "drops_per_hour": round(drops_per_hour, 2)
+        # Average driver time (in minutes)
+        "avg_driver_time": round(cube_mean(totals, 'driver_total_time'), 2),
+        # 'Drops Per Hour Trip', or orders / trip hours when not exported
+        "drops_per_hour": round(cube_mean(totals, 'drops_per_hour_trip'), 2)
     }
 
 
-def _calculate_vendor_avg_cpd(
-    vendor_df: pd.DataFrame,
-    vendor_name: str,
-    rate_cards: Dict[str, Any]
-) -> float:
-    """
-    Calculate average CPD for a vendor.
-
-    Args:
-        vendor_df: DataFrame filtered to vendor
-        vendor_name: Name of the vendor
-        rate_cards: Rate card data
-
-    Returns:
-        float: Average CPD
-    """
-    vendor_rates = rate_cards.get('vendors', {}).get(vendor_name)
-    if not vendor_rates:
-        return 0.0
-
-    cpd_values = []
-
-    for _, row in vendor_df.iterrows():
-        total_orders = row['Total Orders']
-
-        if pd.isna(total_orders) or total_orders == 0:
-            continue
-
-        trip_cpd = calculate_van_cpd(
-            trip_data=row.to_dict(),
-            rate_card=vendor_rates,
-            batch_size=int(total_orders)
-        )
-        cpd_values.append(trip_cpd)
-
-    if not cpd_values:
-        return 0.0
-
-    return sum(cpd_values) / len(cpd_values)
-
-
-def compare_vendor_efficiency(nash_df: pd.DataFrame) -> Dict[str, Any]:
+def compare_vendor_efficiency(
+    nash_df: pd.DataFrame,
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None
+) -> Dict[str, Any]:
     """
     Compare operational efficiency metrics across vendors.
 
+    Same carrier rollup of the metrics cube as analyze_vendors, so a
+    shared cube serves both reports.
+
     Args:
         nash_df: DataFrame with Nash trip data
+        states: State selector (see resolve_states); defaults to CA
+        cube: Metrics cube of nash_df (see load_request_cube); built from
+            nash_df when omitted
 
     Returns:
         dict: Efficiency comparison metrics
     """
-    ca_df = filter_ca_stores(nash_df.copy())
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
+    # Timing and order measures do not depend on pricing
+    cells = select_cube(nash_df, {"vendors": {}}, states, cube)
 
     efficiency = {}
-
-    for vendor in ca_df['Carrier_Normalized'].unique():
-        vendor_df = ca_df[ca_df['Carrier_Normalized'] == vendor]
-
-        efficiency[vendor] = {
-            "avg_load_time": round(safe_mean(vendor_df['Driver Load Time']), 2),
-            "avg_dwell_time": round(safe_mean(vendor_df['Driver Dwell Time']), 2),
-            "avg_trip_time": round(safe_mean(vendor_df['Trip Actual Time']), 2),
+    for _, totals in rollup_cube(cells, ['Carrier_Normalized']).iterrows():
+        total_orders = totals['orders']
+        efficiency[totals['Carrier_Normalized']] = {
+            "avg_load_time": round(cube_mean(totals, 'driver_load_time'), 2),
+            "avg_dwell_time": round(cube_mean(totals, 'driver_dwell_time'), 2),
+            "avg_trip_time": round(cube_mean(totals, 'trip_actual_time'), 2),
             "delivery_success_rate": round(
-                (safe_sum(vendor_df['Delivered Orders']) / safe_sum(vendor_df['Total Orders']) * 100)
-                if safe_sum(vendor_df['Total Orders']) > 0 else 0.0,
+                (totals['delivered_orders'] / total_orders * 100) if total_orders > 0 else 0.0,
                 2
             )
         }
@@ -182,20 +123,29 @@ if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import (
+        load_nash_data, load_request_dataset, load_request_rate_cards,
+        normalize_carriers, parse_cli_request, run_state_request, PROJECT_ROOT
+    )
+    from .cube import build_metrics_cube, load_request_cube
+
+    # CLI mode: python vendor_analysis.py <nash_csv> <rate_cards_json>
+    #   [--state=CA,TX|ALL] [--workers=N]
+    #   or: python vendor_analysis.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'rate_cards_path'))
 
     # Check for CLI arguments
-    if len(sys.argv) >= 3:
-        # CLI mode: python vendor_analysis.py <nash_csv> <rate_cards_json>
-        nash_path = sys.argv[1]
-        rates_path = sys.argv[2]
+    if request is not None:
+        nash_df = load_request_dataset(request)
 
-        nash_df = load_nash_data(nash_path)
+        # Rate cards: inline, JSON file or the SQLite data store (only the
+        # vendors present in this dataset are read)
+        rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
 
-        with open(rates_path, 'r') as f:
-            rate_cards = json.load(f)
+        # Metrics cube of this dataset, built on its first report
+        cube = load_request_cube(request, nash_df, rate_cards)
 
-        vendor_metrics = analyze_vendors(nash_df, rate_cards)
+        vendor_metrics = run_state_request(analyze_vendors, nash_df, request['params'], rate_cards, cube=cube)
         print(json.dumps(vendor_metrics))
     else:
         # Development mode: use example data
@@ -207,11 +157,14 @@ if __name__ == '__main__':
         with open(rates_path, 'r') as f:
             rate_cards = json.load(f)
 
+        # One cube (one pass over the trips) for both reports
+        cube = build_metrics_cube(nash_df, rate_cards)
+
         # Analyze vendors
         print("Vendor Performance Analysis:")
-        vendor_metrics = analyze_vendors(nash_df, rate_cards)
+        vendor_metrics = analyze_vendors(nash_df, rate_cards, cube=cube)
         print(json.dumps(vendor_metrics, indent=2))
 
         print("\nVendor Efficiency Comparison:")
-        efficiency = compare_vendor_efficiency(nash_df)
+        efficiency = compare_vendor_efficiency(nash_df, cube=cube)
         print(json.dumps(efficiency, indent=2))
@@ -4,16 +4,31 @@ Weekly Metrics Analysis Module
 Analyze CA store performance metrics week-over-week.
 """
 
-import pandas as pd
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
-from . import (
-    filter_ca_stores,
-    normalize_carrier_name,
-    safe_mean,
-    safe_sum
-)
-from .cpd_analysis import calculate_van_cpd
+from __future__ import annotations
+
+from typing import Dict, Any, List, Optional
+from datetime import timedelta
+from . import lazy_import, StateSelector
+from .cube import rollup_cube, select_cube
+
+# Deferred until a report touches a frame (see lazy_import)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Store x week matrices: name -> (numerator, denominator, scale); a None
+# denominator is a plain sum
+MATRIX_MEASURES = {
+    'orders': ('included_orders', None, 1),
+    'trips': ('included_trips', None, 1),
+    'cost': ('included_cost', None, 1),
+    'cpd': ('included_cost', 'included_orders', 1),
+    'otd_percentage': ('on_time', 'otd_trips', 100)
+}
+
+# 'dense' returns full matrices, 'sparse' only the store-weeks with trips,
+# 'auto' picks sparse below SPARSE_MAX_DENSITY filled cells
+MATRIX_ENCODINGS = ('auto', 'dense', 'sparse')
+SPARSE_MAX_DENSITY = 0.5
 
 
 def get_week_start(date: pd.Timestamp) -> pd.Timestamp:
@@ -32,10 +47,12 @@ def get_week_start(date: pd.Timestamp) -> pd.Timestamp:
 def analyze_weekly_metrics(
     nash_df: pd.DataFrame,
     rate_cards: Dict[str, Any],
-    min_batch_size: int = 10
+    min_batch_size: int = 10,
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None
 ) -> Dict[str, Any]:
     """
-    Analyze metrics week-over-week for all CA stores.
+    Analyze metrics week-over-week for all stores of the selected states (CA by default).
 
     Metrics included:
     - Total orders, trips, batches per week
@@ -44,18 +61,27 @@ def analyze_weekly_metrics(
     - Store performance per week
     - Exclusions per week
 
+    Weeks are rollups of the metrics cube's days, so with a prebuilt cube
+    the cost is proportional to cube cells rather than trips. Trips are
+    priced with the rate card version in force on their date, so past
+    weeks keep their historical CPD after rate changes.
+
     Args:
         nash_df: DataFrame with Nash trip data
         rate_cards: Rate cards for CPD calculation
         min_batch_size: Minimum batch size to include (default 10)
+        states: State selector (see resolve_states); defaults to CA
+        cube: Metrics cube of nash_df (see load_request_cube); rebuilt
+            from nash_df when omitted or built with another min_batch_size
 
     Returns:
         dict: Weekly metrics with all dimensions
     """
-    # Filter to CA stores
-    ca_df = filter_ca_stores(nash_df.copy())
+    # Dated cube cells of the selected states (CA by default)
+    cells = select_cube(nash_df, rate_cards, states, cube, min_batch_size)
+    cells = cells[cells['Date'].notna()]
 
-    if ca_df.empty or 'Date' not in ca_df.columns:
+    if cells.empty:
         return {
             "weeks": [],
             "summary": {
@@ -64,109 +90,33 @@ def analyze_weekly_metrics(
             }
         }
 
-    # Normalize carrier names
-    ca_df['Carrier_Normalized'] = ca_df['Carrier'].apply(normalize_carrier_name)
-
     # Add week column (Monday of each week)
-    ca_df['Week_Start'] = ca_df['Date'].apply(get_week_start)
+    cells = cells.assign(Week_Start=cells['Date'] - pd.to_timedelta(cells['Date'].dt.weekday, unit='D'))
 
-    weekly_data = []
-    excluded_by_week = {}
+    weeks = rollup_cube(cells, ['Week_Start']).sort_values('Week_Start')
+    stores_by_week = _included_by_week(cells, 'Store Id')
+    carriers_by_week = _included_by_week(cells, 'Carrier_Normalized')
 
-    # Group by week
-    for week_start, week_df in ca_df.groupby('Week_Start'):
+    weekly_data = []
+    for _, week in weeks.iterrows():
+        week_start = week['Week_Start']
         week_end = week_start + timedelta(days=6)
 
-        # Overall metrics for the week
-        total_trips = len(week_df)
-        total_orders = 0
-        total_cost = 0.0
-        excluded_count = 0
-
-        # Store metrics
-        store_metrics = {}
-
-        # Carrier metrics
-        carrier_metrics = {}
-
-        for _, row in week_df.iterrows():
-            batch_size = row['Total Orders']
-            carrier = row['Carrier_Normalized']
-            store_id = str(row['Store Id'])
-
-            if pd.isna(batch_size) or batch_size == 0:
-                continue
-
-            batch_size_int = int(batch_size)
-
-            # Anomaly exclusion
-            if batch_size_int < min_batch_size:
-                excluded_count += 1
-                continue
-
-            # Get rate card
-            vendor_rates = rate_cards.get('vendors', {}).get(carrier)
-            if not vendor_rates:
-                continue
-
-            # Calculate trip cost
-            if batch_size_int <= 80:
-                base_rate = vendor_rates.get('base_rate_80', 0)
-            else:
-                base_rate = vendor_rates.get('base_rate_100', 0)
-
-            adjustment = vendor_rates.get('contractual_adjustment', 1.0)
-            trip_cost = base_rate * adjustment
-
-            total_cost += trip_cost
-            total_orders += batch_size_int
-
-            # Track by store
-            if store_id not in store_metrics:
-                store_metrics[store_id] = {
-                    "orders": 0,
-                    "trips": 0,
-                    "cost": 0.0
-                }
-            store_metrics[store_id]["orders"] += batch_size_int
-            store_metrics[store_id]["trips"] += 1
-            store_metrics[store_id]["cost"] += trip_cost
-
-            # Track by carrier
-            if carrier not in carrier_metrics:
-                carrier_metrics[carrier] = {
-                    "orders": 0,
-                    "trips": 0,
-                    "cost": 0.0
-                }
-            carrier_metrics[carrier]["orders"] += batch_size_int
-            carrier_metrics[carrier]["trips"] += 1
-            carrier_metrics[carrier]["cost"] += trip_cost
-
-        # Calculate weighted average CPD for the week
-        avg_cpd = (total_cost / total_orders) if total_orders > 0 else 0.0
-
-        # Format store metrics
-        stores_list = []
-        for store_id, metrics in store_metrics.items():
-            store_cpd = (metrics["cost"] / metrics["orders"]) if metrics["orders"] > 0 else 0.0
-            stores_list.append({
-                "store_id": store_id,
-                "orders": metrics["orders"],
-                "trips": metrics["trips"],
-                "cpd": round(store_cpd, 2)
-            })
-
-        # Format carrier metrics
-        carriers_list = []
-        for carrier, metrics in carrier_metrics.items():
-            carrier_cpd = (metrics["cost"] / metrics["orders"]) if metrics["orders"] > 0 else 0.0
-            carriers_list.append({
-                "carrier": carrier,
-                "orders": metrics["orders"],
-                "trips": metrics["trips"],
-                "cpd": round(carrier_cpd, 2)
-            })
+        # Weighted average CPD for the week (anomalies and trips without a
+        # rate card excluded)
+        total_orders = int(week['included_orders'])
+        avg_cpd = (week['included_cost'] / total_orders) if total_orders > 0 else 0.0
+        excluded_count = int(week['excluded_trips'])
+        total_trips = int(week['trips'])
+
+        stores_list = [
+            {"store_id": store_id, **metrics}
+            for store_id, metrics in stores_by_week.get(week_start, [])
+        ]
+        carriers_list = [
+            {"carrier": carrier, **metrics}
+            for carrier, metrics in carriers_by_week.get(week_start, [])
+        ]
 
         weekly_data.append({
             "week_start": week_start.strftime('%Y-%m-%d'),
@@ -176,19 +126,15 @@ def analyze_weekly_metrics(
             "total_batches": total_trips - excluded_count,
             "avg_cpd": round(avg_cpd, 2),
             "excluded_trips": excluded_count,
-            "active_stores": len(store_metrics),
+            "active_stores": len(stores_list),
             "stores": stores_list,
             "carriers": carriers_list
         })
 
-    # Sort by week
-    weekly_data.sort(key=lambda x: x['week_start'])
-
     # Calculate summary
-    all_dates = ca_df['Date'].dropna()
     date_range = {
-        "start": all_dates.min().strftime('%Y-%m-%d') if not all_dates.empty else None,
-        "end": all_dates.max().strftime('%Y-%m-%d') if not all_dates.empty else None
+        "start": cells['Date'].min().strftime('%Y-%m-%d'),
+        "end": cells['Date'].max().strftime('%Y-%m-%d')
     }
 
     return {
@@ -201,24 +147,177 @@ def analyze_weekly_metrics(
     }
 
 
+def _included_by_week(cells: pd.DataFrame, dimension: str) -> Dict[Any, List[Any]]:
+    """
+    Orders, trips and CPD of included trips per week and dimension value.
+
+    Args:
+        cells: Dated cube cells with a Week_Start column
+        dimension: 'Store Id' or 'Carrier_Normalized'
+
+    Returns:
+        dict: { week_start: [(value, { orders, trips, cpd })] }, values in
+            order of their first included trip
+    """
+    rolled = rollup_cube(cells, ['Week_Start', dimension])
+    rolled = rolled[rolled['included_trips'] > 0].sort_values('first_included_row', kind='stable')
+
+    by_week = {}
+    for _, row in rolled.iterrows():
+        orders = int(row['included_orders'])
+        by_week.setdefault(row['Week_Start'], []).append((row[dimension], {
+            "orders": orders,
+            "trips": int(row['included_trips']),
+            "cpd": round((row['included_cost'] / orders) if orders > 0 else 0.0, 2)
+        }))
+    return by_week
+
+
+def store_week_matrices(cells: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Pivot dated cube cells into store x week matrices.
+
+    Stores and weeks are integer-coded once and each cell's measures land
+    at store * weeks + week of one flat bincount per measure, so the pivot
+    is a single pass over the cells.
+
+    Args:
+        cells: Dated cube cells (see select_cube)
+
+    Returns:
+        dict: { stores, weeks (Monday datetime64), present (bool matrix of
+            store-weeks with trips), matrices: { name: float matrix } },
+            matrices NaN where a store-week has no trips or a ratio has no
+            denominator
+    """
+    week_start = cells['Date'] - pd.to_timedelta(cells['Date'].dt.weekday, unit='D')
+    store_codes, stores = pd.factorize(cells['Store Id'].astype(str), sort=True)
+    week_codes, weeks = pd.factorize(week_start, sort=True)
+
+    shape = (len(stores), len(weeks))
+    flat = store_codes.astype(np.int64) * len(weeks) + week_codes
+
+    def pivot(measure: str) -> np.ndarray:
+        weights = cells[measure].to_numpy(dtype=float)
+        return np.bincount(flat, weights=weights, minlength=shape[0] * shape[1]).reshape(shape)
+
+    present = pivot('trips') > 0
+    matrices = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, (numerator, denominator, scale) in MATRIX_MEASURES.items():
+            values = pivot(numerator)
+            if denominator is not None:
+                whole = pivot(denominator)
+                values = np.where(whole > 0, values / whole * scale, np.nan)
+            matrices[name] = np.where(present, values, np.nan)
+
+    return {
+        "stores": np.asarray(stores, dtype=object),
+        "weeks": np.asarray(weeks, dtype='datetime64[ns]'),
+        "present": present,
+        "matrices": matrices
+    }
+
+
+def analyze_store_week_matrix(
+    nash_df: pd.DataFrame,
+    rate_cards: Dict[str, Any],
+    min_batch_size: int = 10,
+    states: StateSelector = None,
+    cube: Optional[pd.DataFrame] = None,
+    encoding: str = 'auto'
+) -> Dict[str, Any]:
+    """
+    Store x week matrices of orders, trips, cost, CPD and OTD for charts.
+
+    Orders, trips, cost and CPD cover included trips (anomalies excluded,
+    as in analyze_weekly_metrics); OTD covers every trip with a value.
+
+    Args:
+        nash_df: DataFrame with Nash trip data
+        rate_cards: Rate cards for CPD calculation
+        min_batch_size: Minimum batch size to include (default 10)
+        states: State selector (see resolve_states); defaults to CA
+        cube: Metrics cube of nash_df (see load_request_cube)
+        encoding: One of MATRIX_ENCODINGS
+
+    Returns:
+        dict: { encoding, stores, weeks, density, min_batch_size, ... };
+            dense: matrices: { name: [[value per week] per store] };
+            sparse: rows, cols (store / week index per entry) and
+            values: { name: [value per entry] }. Missing values are None.
+    """
+    if encoding not in MATRIX_ENCODINGS:
+        raise ValueError(f"Unknown matrix encoding: {encoding}")
+
+    cells = select_cube(nash_df, rate_cards, states, cube, min_batch_size)
+    pivoted = store_week_matrices(cells[cells['Date'].notna()])
+    present = pivoted["present"]
+    density = float(present.mean()) if present.size else 0.0
+
+    if encoding == 'auto':
+        encoding = 'sparse' if density < SPARSE_MAX_DENSITY else 'dense'
+
+    result = {
+        "encoding": encoding,
+        "stores": pivoted["stores"].tolist(),
+        "weeks": [str(week)[:10] for week in pivoted["weeks"]],
+        "density": round(density, 4),
+        "min_batch_size": min_batch_size
+    }
+
+    if encoding == 'dense':
+        result["matrices"] = {name: _to_json(matrix) for name, matrix in pivoted["matrices"].items()}
+    else:
+        rows, cols = np.nonzero(present)
+        result["rows"] = rows.tolist()
+        result["cols"] = cols.tolist()
+        result["values"] = {name: _to_json(matrix[rows, cols]) for name, matrix in pivoted["matrices"].items()}
+
+    return result
+
+
+def _to_json(values: np.ndarray) -> list:
+    """Nested lists of a float array rounded to 2 places, NaN as None (JSON null)."""
+    rounded = np.round(values, 2).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+
 if __name__ == '__main__':
     import json
     import os
     import sys
-    from . import load_nash_data, PROJECT_ROOT
+    from . import (
+        load_nash_data, load_request_dataset, load_request_rate_cards,
+        normalize_carriers, parse_cli_request, run_state_request, PROJECT_ROOT
+    )
+    from .cube import load_request_cube
 
-    # Check for CLI arguments
-    if len(sys.argv) >= 3:
-        # CLI mode: python weekly_metrics.py <nash_csv> <rate_cards_json>
-        nash_path = sys.argv[1]
-        rates_path = sys.argv[2]
+    # CLI mode: python weekly_metrics.py <nash_csv> <rate_cards_json>
+    #   [--matrix [--encoding=auto|dense|sparse]] [--state=CA,TX|ALL] [--workers=N]
+    #   or: python weekly_metrics.py --stdin (JSON request envelope on stdin)
+    request = parse_cli_request(sys.argv[1:], ('dataset', 'rate_cards_path'))
 
-        nash_df = load_nash_data(nash_path)
-
-        with open(rates_path, 'r') as f:
-            rate_cards = json.load(f)
-
-        weekly_metrics = analyze_weekly_metrics(nash_df, rate_cards)
+    # Check for CLI arguments
+    if request is not None:
+        nash_df = load_request_dataset(request)
+
+        # Rate cards: inline, JSON file or the SQLite data store (only the
+        # vendors present in this dataset are read)
+        rate_cards = load_request_rate_cards(request, normalize_carriers(nash_df['Carrier']).unique())
+
+        # Metrics cube of this dataset, built on its first report
+        cube = load_request_cube(request, nash_df, rate_cards)
+
+        params = request['params']
+        if 'matrix' in params:
+            weekly_metrics = run_state_request(
+                analyze_store_week_matrix, nash_df, params, rate_cards,
+                cube=cube, encoding=params.get('encoding') or 'auto'
+            )
+        else:
+            weekly_metrics = run_state_request(analyze_weekly_metrics, nash_df, params, rate_cards, cube=cube)
         print(json.dumps(weekly_metrics))
     else:
         # Development mode: use example data
@@ -234,3 +333,6 @@ if __name__ == '__main__':
         print("Weekly Metrics Analysis:")
         weekly_metrics = analyze_weekly_metrics(nash_df, rate_cards)
         print(json.dumps(weekly_metrics, indent=2))
+
+        print("\nStore x Week Matrix:")
+        print(json.dumps(analyze_store_week_matrix(nash_df, rate_cards, encoding='dense'), indent=2))
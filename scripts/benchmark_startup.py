@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measure the import time and spawn-to-exit time of the analysis CLIs, with
+a -X importtime breakdown of where startup goes.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Analysis CLIs the Node server spawns
+ENTRY_POINTS = (
+    'dashboard', 'all_stores', 'store_analysis', 'vendor_analysis', 'cpd_analysis',
+    'batch_analysis', 'performance', 'weekly_metrics', 'distinct_counts', 'courier_analytics',
+    'otd_heatmap', 'precompute'
+)
+
+# Modules whose import must stay deferred until a report needs them
+DEFERRED_MODULES = ('pandas', 'numpy', 'sqlite3')
+
+EXAMPLE_NASH = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+EXAMPLE_RATE_CARDS = os.path.join(PROJECT_ROOT, 'tests', 'fixtures', 'ca_rate_cards.json')
+EXAMPLE_REGISTRY = os.path.join(PROJECT_ROOT, 'tests', 'fixtures', 'ca_store_registry.json')
+
+# Rollups (cube, sketches) the CLIs cache while benchmarked go here rather
+# than into the project's cache directory
+BENCHMARK_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'nash-benchmark-cache')
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Parse `python -X importtime` output.
+
+    Args:
+        stderr: stderr of a python -X importtime run
+
+    Returns:
+        List[dict]: { module, depth, self_ms, cumulative_ms } per import
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({
+            "module": name.strip(),
+            # Nesting is shown as two spaces per level
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+    return entries
+
+
+def _run_python(args: List[str], stdin: Optional[str] = None) -> subprocess.CompletedProcess:
+    """Run the current interpreter from the project root."""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    env.setdefault('NASH_CACHE_DIR', BENCHMARK_CACHE_DIR)
+    return subprocess.run(
+        [sys.executable] + args,
+        input=stdin, capture_output=True, text=True, cwd=PROJECT_ROOT, env=env
+    )
+
+
+def measure_import(entry_point: str) -> Dict[str, Any]:
+    """
+    Measure importing an analysis module, as a CLI spawn does before main.
+
+    Args:
+        entry_point: Module name in scripts.analysis
+
+    Returns:
+        dict: { module, import_ms, deferred: { module: not imported } }
+    """
+    module = f"scripts.analysis.{entry_point}"
+    result = _run_python(['-X', 'importtime', '-c', f"import {module}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {result.stderr[-500:]}")
+
+    entries = parse_importtime(result.stderr)
+    import_ms = next(e["cumulative_ms"] for e in entries if e["module"] == module)
+
+    # A lazily loaded package never shows up itself (its body runs outside
+    # the import system), but its submodules do
+    def imported(name: str) -> bool:
+        return any(e["module"] == name or e["module"].startswith(name + '.') for e in entries)
+
+    return {
+        "module": module,
+        "import_ms": round(import_ms, 1),
+        "deferred": {name: not imported(name) for name in DEFERRED_MODULES}
+    }
+
+
+def _example_request(entry_point: str) -> str:
+    """Request envelope running an entry point on the example data."""
+    params = {"store_id": "2082"} if entry_point == 'store_analysis' else {}
+    return json.dumps({
+        "dataset": EXAMPLE_NASH,
+        "registry_path": EXAMPLE_REGISTRY,
+        "rate_cards_path": EXAMPLE_RATE_CARDS,
+        "params": params
+    })
+
+
+def measure_run(entry_point: str, runs: int = 5, top: int = 5) -> Dict[str, Any]:
+    """
+    Measure full CLI runs on the example data.
+
+    Args:
+        entry_point: Module name in scripts.analysis
+        runs: Timed runs (the median is reported)
+        top: Number of top-level imports to report in the breakdown
+
+    Returns:
+        dict: { run_ms, import_ms, imports: [{ module, cumulative_ms }] }
+    """
+    module = f"scripts.analysis.{entry_point}"
+    request = _example_request(entry_point)
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = _run_python(['-m', module, '--stdin'], stdin=request)
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"{module} failed: {result.stderr[-500:]}")
+
+    # One more run for the import breakdown (importtime adds overhead)
+    entries = parse_importtime(_run_python(['-X', 'importtime', '-m', module, '--stdin'], stdin=request).stderr)
+    top_level = sorted((e for e in entries if e["depth"] == 0), key=lambda e: -e["cumulative_ms"])
+
+    return {
+        "run_ms": round(statistics.median(timings), 1),
+        "import_ms": round(sum(e["cumulative_ms"] for e in top_level), 1),
+        "imports": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_ms"], 1)}
+            for e in top_level[:top]
+        ]
+    }
+
+
+def benchmark_startup(runs: int = 5) -> Dict[str, Any]:
+    """
+    Benchmark every analysis CLI.
+
+    Args:
+        runs: Timed runs per entry point
+
+    Returns:
+        dict: { python, entry_points: { name: { import_ms, deferred, run_ms, imports } } }
+    """
+    results = {}
+    for entry_point in ENTRY_POINTS:
+        measured = measure_import(entry_point)
+        run = measure_run(entry_point, runs)
+        results[entry_point] = {
+            "import_ms": measured["import_ms"],
+            "deferred": measured["deferred"],
+            "run_ms": run["run_ms"],
+            "run_import_ms": run["import_ms"],
+            "imports": run["imports"]
+        }
+    return {"python": sys.version.split()[0], "entry_points": results}
+
+
+if __name__ == '__main__':
+    # CLI mode: python scripts/benchmark_startup.py [runs]
+    runs = int(sys.argv[1]) if len(sys.argv) >= 2 else 5
+    print(json.dumps(benchmark_startup(runs), indent=2))
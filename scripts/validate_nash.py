@@ -4,6 +4,7 @@ Nash Data Validator
 Validates Nash CSV files for required columns, data types, and CA store compliance.
 """
 
+import numpy as np
 import pandas as pd
 import json
 import sys
@@ -54,6 +55,146 @@ REQUIRED_COLUMNS = [
 EXPECTED_CARRIERS = ["FOX", "NTG", "FDC", "Fox-Drop", "FRONTDoor Collective",
                      "JW Logistics", "DeliverOL", "Roadie (WMT)"]
 
+# Nash timestamp format (e.g. "10/08/2025 11:31:27 AM")
+NASH_TIMESTAMP_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+# Plausible range for Drops Per Hour Trip
+DROPS_PER_HOUR_BOUNDS = (0.0, 60.0)
+
+# Number of offending row indices reported per rule
+RULE_SAMPLE_SIZE = 10
+
+
+def _numeric(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Column as a float array, with unparseable values as NaN."""
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def _timestamp(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Column as datetime64[ns], with unparseable values as NaT."""
+    parsed = pd.to_datetime(df[col], format=NASH_TIMESTAMP_FORMAT, errors='coerce')
+    return parsed.to_numpy(dtype='datetime64[ns]')
+
+
+def _orders_exceed_total(df: pd.DataFrame) -> np.ndarray:
+    status_sum = (
+        _numeric(df, "Delivered Orders")
+        + _numeric(df, "Failed Orders")
+        + _numeric(df, "Returned Orders")
+        + _numeric(df, "Pending Orders")
+    )
+    return status_sum > _numeric(df, "Total Orders")
+
+
+def _load_end_before_start(df: pd.DataFrame) -> np.ndarray:
+    # NaT comparisons are False, so unparseable timestamps never count
+    return _timestamp(df, "Load End Time") < _timestamp(df, "Load Start Time")
+
+
+def _drops_per_hour_out_of_bounds(df: pd.DataFrame) -> np.ndarray:
+    low, high = DROPS_PER_HOUR_BOUNDS
+    dph = _numeric(df, "Drops Per Hour Trip")
+    return (dph < low) | (dph > high)
+
+
+def _ontime_not_binary(df: pd.DataFrame) -> np.ndarray:
+    ontime = _numeric(df, "Is Pickup Arrived Ontime")
+    return ~np.isnan(ontime) & (ontime != 0) & (ontime != 1)
+
+
+def _duplicate_trip_id(df: pd.DataFrame) -> np.ndarray:
+    trip_ids = df["Walmart Trip Id"]
+    return (trip_ids.duplicated(keep='first') & trip_ids.notna()).to_numpy()
+
+
+# Row-level data-quality rules. Each check returns a boolean violation mask
+# over the whole frame, so a rule costs a few vectorized column passes.
+DATA_QUALITY_RULES = [
+    {
+        "rule": "ORDER_STATUS_EXCEEDS_TOTAL",
+        "description": "Delivered + Failed + Returned + Pending Orders > Total Orders",
+        "columns": ["Delivered Orders", "Failed Orders", "Returned Orders",
+                    "Pending Orders", "Total Orders"],
+        "check": _orders_exceed_total
+    },
+    {
+        "rule": "LOAD_END_BEFORE_START",
+        "description": "Load End Time is earlier than Load Start Time",
+        "columns": ["Load Start Time", "Load End Time"],
+        "check": _load_end_before_start
+    },
+    {
+        "rule": "DROPS_PER_HOUR_OUT_OF_BOUNDS",
+        "description": (
+            f"Drops Per Hour Trip outside {DROPS_PER_HOUR_BOUNDS[0]:g}-"
+            f"{DROPS_PER_HOUR_BOUNDS[1]:g}"
+        ),
+        "columns": ["Drops Per Hour Trip"],
+        "check": _drops_per_hour_out_of_bounds
+    },
+    {
+        "rule": "ONTIME_FLAG_NOT_BINARY",
+        "description": "Is Pickup Arrived Ontime is not 0 or 1",
+        "columns": ["Is Pickup Arrived Ontime"],
+        "check": _ontime_not_binary
+    },
+    {
+        "rule": "DUPLICATE_TRIP_ID",
+        "description": "Walmart Trip Id appears on an earlier row",
+        "columns": ["Walmart Trip Id"],
+        "check": _duplicate_trip_id
+    }
+]
+
+
+def evaluate_data_quality_rules(
+    df: pd.DataFrame,
+    rules: List[Dict[str, Any]] = None,
+    sample_size: int = RULE_SAMPLE_SIZE
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate row-level data-quality rules over a raw Nash frame.
+
+    Args:
+        df: Raw DataFrame as read from a Nash CSV
+        rules: Rules to evaluate (defaults to DATA_QUALITY_RULES)
+        sample_size: Number of offending row indices to report per rule
+
+    Returns:
+        List of per-rule results with violation counts and sample row
+        indices (0-based data rows). Rules whose columns are missing are
+        reported as skipped.
+    """
+    if rules is None:
+        rules = DATA_QUALITY_RULES
+
+    results = []
+    for rule in rules:
+        missing = [col for col in rule["columns"] if col not in df.columns]
+        if missing:
+            results.append({
+                "rule": rule["rule"],
+                "description": rule["description"],
+                "skipped": True,
+                "missing_columns": missing,
+                "violations": 0,
+                "sample_rows": []
+            })
+            continue
+
+        mask = np.asarray(rule["check"](df), dtype=bool)
+        offending = np.flatnonzero(mask)
+        results.append({
+            "rule": rule["rule"],
+            "description": rule["description"],
+            "skipped": False,
+            "violations": int(offending.size),
+            "sample_rows": offending[:sample_size].tolist()
+        })
+
+    return results
+
+
 class NashValidator:
     """Validator for Nash CSV data files."""
 
@@ -66,7 +207,8 @@ class NashValidator:
         """
         self.ca_stores = pd.read_csv(ca_stores_path)
         self.ca_store_ids = set(self.ca_stores['Store ID'].astype(str))
-        print(f"Loaded {len(self.ca_store_ids)} CA store IDs")
+        # stderr keeps stdout clean for callers that emit JSON
+        print(f"Loaded {len(self.ca_store_ids)} CA store IDs", file=sys.stderr)
 
     def validate(self, csv_path: str) -> Dict[str, Any]:
         """
@@ -78,16 +220,44 @@ class NashValidator:
         Returns:
             Dictionary with validation results
         """
-        result = {
-            "valid": True,
-            "errors": [],
-            "warnings": [],
-            "stats": {}
-        }
-
         try:
             # Read the CSV file
             df = pd.read_csv(csv_path)
+        except FileNotFoundError:
+            result = self.empty_result()
+            result["valid"] = False
+            result["errors"].append({
+                "type": "FILE_NOT_FOUND",
+                "message": f"File not found: {csv_path}"
+            })
+            return result
+        except Exception as e:
+            result = self.empty_result()
+            result["valid"] = False
+            result["errors"].append({
+                "type": "VALIDATION_ERROR",
+                "message": f"Error during validation: {str(e)}"
+            })
+            return result
+
+        return self.validate_frame(df)
+
+    def validate_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Validate an already-parsed Nash frame.
+
+        The frame is not modified, so the caller can go on to clean the
+        same frame without re-reading the file.
+
+        Args:
+            df: Raw DataFrame as read from a Nash CSV
+
+        Returns:
+            Dictionary with validation results
+        """
+        result = self.empty_result()
+
+        try:
             result["stats"]["total_rows"] = len(df)
 
             # Check for required columns
@@ -118,10 +288,10 @@ class NashValidator:
             # Validate Store Id column
             if "Store Id" in df.columns:
                 # Convert Store Id to string for comparison
-                df["Store Id"] = df["Store Id"].astype(str)
+                store_ids = df["Store Id"].astype(str)
 
                 # Check for CA stores
-                stores_in_data = set(df["Store Id"].unique())
+                stores_in_data = set(store_ids.unique())
                 ca_stores_in_data = stores_in_data.intersection(self.ca_store_ids)
                 non_ca_stores = stores_in_data - self.ca_store_ids
 
@@ -129,17 +299,18 @@ class NashValidator:
                 result["stats"]["ca_stores_found"] = len(ca_stores_in_data)
                 result["stats"]["non_ca_stores_found"] = len(non_ca_stores)
 
-                # Filter to CA stores only
-                ca_rows = df[df["Store Id"].isin(self.ca_store_ids)]
-                non_ca_rows = df[~df["Store Id"].isin(self.ca_store_ids)]
+                # Count CA vs non-CA rows
+                is_ca = store_ids.isin(self.ca_store_ids)
+                ca_row_count = int(is_ca.sum())
+                non_ca_row_count = len(df) - ca_row_count
 
-                result["stats"]["valid_rows"] = len(ca_rows)
+                result["stats"]["valid_rows"] = ca_row_count
 
-                if len(non_ca_rows) > 0:
+                if non_ca_row_count > 0:
                     result["warnings"].append({
                         "type": "NON_CA_STORES",
-                        "count": len(non_ca_rows),
-                        "message": f"{len(non_ca_rows)} rows excluded (non-CA stores)",
+                        "count": non_ca_row_count,
+                        "message": f"{non_ca_row_count} rows excluded (non-CA stores)",
                         "stores": sorted(list(non_ca_stores))[:10]  # Show first 10
                     })
 
@@ -160,8 +331,8 @@ class NashValidator:
             # Validate Date column
             if "Date" in df.columns:
                 try:
-                    df["Date"] = pd.to_datetime(df["Date"])
-                    date_range = f"{df['Date'].min()} to {df['Date'].max()}"
+                    dates = pd.to_datetime(df["Date"])
+                    date_range = f"{dates.min()} to {dates.max()}"
                     result["stats"]["date_range"] = date_range
                 except Exception as e:
                     result["warnings"].append({
@@ -193,12 +364,21 @@ class NashValidator:
                             "message": f"{null_count} null values found in critical column '{col}'"
                         })
 
-        except FileNotFoundError:
-            result["valid"] = False
-            result["errors"].append({
-                "type": "FILE_NOT_FOUND",
-                "message": f"File not found: {csv_path}"
-            })
+            # Row-level data-quality rules
+            rule_results = evaluate_data_quality_rules(df)
+            result["stats"]["data_quality"] = {
+                r["rule"]: r["violations"] for r in rule_results if not r["skipped"]
+            }
+            for r in rule_results:
+                if r["violations"] > 0:
+                    result["warnings"].append({
+                        "type": "DATA_QUALITY",
+                        "rule": r["rule"],
+                        "count": r["violations"],
+                        "sample_rows": r["sample_rows"],
+                        "message": f"{r['violations']} rows violate: {r['description']}"
+                    })
+
         except Exception as e:
             result["valid"] = False
             result["errors"].append({
@@ -208,6 +388,16 @@ class NashValidator:
 
         return result
 
+    @staticmethod
+    def empty_result() -> Dict[str, Any]:
+        """Create an empty validation result."""
+        return {
+            "valid": True,
+            "errors": [],
+            "warnings": [],
+            "stats": {}
+        }
+
 def main():
     """Main function."""
     if len(sys.argv) < 2:
@@ -1,5 +1,6 @@
 import multer from 'multer';
 import path from 'path';
+import { getNashFileExtension, isNashFile } from '../utils/nash-file';
 
 const storage = multer.diskStorage({
   destination: (_req, _file, cb) => {
@@ -7,15 +8,18 @@ const storage = multer.diskStorage({
   },
   filename: (_req, file, cb) => {
     const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1E9);
-    cb(null, file.fieldname + '-' + uniqueSuffix + path.extname(file.originalname));
+    // Keep compound extensions like .csv.gz intact
+    const extension = getNashFileExtension(file.originalname) || path.extname(file.originalname);
+    cb(null, file.fieldname + '-' + uniqueSuffix + extension);
   }
 });
 
 const fileFilter = (_req: Express.Request, file: Express.Multer.File, cb: multer.FileFilterCallback) => {
-  if (file.mimetype === 'text/csv' || path.extname(file.originalname).toLowerCase() === '.csv') {
+  // Plain CSV or compressed exports (.csv.gz, .zip)
+  if (file.mimetype === 'text/csv' || isNashFile(file.originalname)) {
     cb(null, true);
   } else {
-    cb(new Error('Only CSV files are allowed'));
+    cb(new Error('Only CSV files (optionally .csv.gz or .zip) are allowed'));
   }
 };
 
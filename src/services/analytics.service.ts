@@ -1,194 +1,493 @@
-import { runPythonScript } from '../utils/python-bridge';
-import { loadStoreRegistry, loadRateCards } from '../utils/data-store';
-import path from 'path';
 import fs from 'fs';
+import path from 'path';
+import { runPythonScript } from '../utils/python-bridge';
+import { ensureDataStore, getDataStoreRevision } from '../utils/data-store';
+import { JobQueue, JobQueueStats } from '../utils/job-queue';
+import { ResultCache } from '../utils/result-cache';
+
+/**
+ * Payload layout for list-heavy reports: 'rows' is an array of objects
+ * (default), 'columnar' is a struct of arrays with dictionary-encoded
+ * repeated strings
+ */
+export type OutputFormat = 'rows' | 'columnar';
+
+// What-if rate cards: per-vendor field overrides applied on top of the
+// current rate cards
+export interface RateCardScenario {
+  name?: string;
+  vendors?: Record<string, Record<string, number>>;
+}
+
+// Batch-size vs CPD scatter: every trip ('points') or a bounded summary
+export type ScatterMode = 'points' | 'aggregate' | 'binned' | 'sample';
+
+export interface ScatterOptions {
+  mode?: ScatterMode;
+  binWidth?: number;
+  cpdBinWidth?: number;
+  maxPoints?: number;
+}
+
+/**
+ * States to analyze: a state code, comma-separated codes ('CA,TX') or
+ * 'ALL'. Reports requested with a state are keyed by state; without one
+ * they cover CA.
+ */
+export type StateSelection = string;
+
+/**
+ * Distinct-count sketch mode: exact hash sets, HyperLogLog estimates
+ * (~1.6% relative error) or exact for small datasets ('auto')
+ */
+export type DistinctMode = 'auto' | 'exact' | 'approximate';
+
+export type MatrixEncoding = 'auto' | 'dense' | 'sparse';
+
+export type CourierMetric = 'otd_percentage' | 'drops_per_hour' | 'avg_dwell_time' | 'failed_orders_rate';
+
+/**
+ * Driver ranking options: the ranking metric, a page of ranks
+ * (limit / offset at each end) and the minimum trips to be ranked
+ */
+export interface CourierRankingOptions {
+  metric?: CourierMetric;
+  limit?: number;
+  offset?: number;
+  minTrips?: number;
+}
+
+/**
+ * Which trips a report covers: states and an inclusive date range
+ * (YYYY-MM-DD, either bound optional). Date ranges are sliced from the
+ * date-sorted dataset by binary search.
+ */
+export interface ReportScope {
+  state?: StateSelection;
+  start?: string;
+  end?: string;
+}
+
+// Reports computed eagerly after each upload (scripts/analysis/precompute.py),
+// with the script and params of the on-demand request each one answers
+const PRECOMPUTED_REPORTS: Record<string, { script: string; params: Record<string, unknown> }> = {
+  dashboard: { script: 'dashboard.py', params: {} },
+  stores: { script: 'all_stores.py', params: { format: 'rows' } },
+  vendors: { script: 'vendor_analysis.py', params: {} },
+  cpd: { script: 'cpd_analysis.py', params: { format: 'rows' } },
+  batch: { script: 'batch_analysis.py', params: { format: 'rows' } },
+  performance: { script: 'performance.py', params: {} },
+  weekly: { script: 'weekly_metrics.py', params: {} }
+};
+
+export type PrecomputeState = 'ingesting' | 'computing' | 'ready' | 'failed';
+
+// Progress of the post-upload precompute of the latest upload
+export interface PrecomputeStatus {
+  dataset: string;
+  state: PrecomputeState;
+  startedAt: string;
+  finishedAt?: string;
+  reports: Record<string, 'pending' | 'ready' | 'failed'>;
+  errors?: Record<string, string>;
+  error?: string;
+}
 
 /**
  * Analytics Service
  * Bridges Node.js backend with Python analysis scripts
  */
 export class AnalyticsService {
-  private static tempDir = path.join(__dirname, '../../temp');
+  // Each Python job holds a full copy of the dataset in memory, so cap how
+  // many run at once (ANALYTICS_MAX_CONCURRENCY, default 2)
+  private static queue = new JobQueue(
+    parseInt(process.env.ANALYTICS_MAX_CONCURRENCY || '2', 10)
+  );
+
+  // Report payloads by job key (ANALYTICS_RESULT_CACHE_SIZE, default 32)
+  private static results = new ResultCache<Record<string, unknown>>(
+    parseInt(process.env.ANALYTICS_RESULT_CACHE_SIZE || '32', 10)
+  );
+
+  // Latest post-upload precompute: its status, the job keys it will fill
+  // and a promise settling when it finishes
+  private static precompute: {
+    status: PrecomputeStatus;
+    keys: Set<string>;
+    done: Promise<void>;
+  } | null = null;
+
+  /**
+   * Queue depth, running jobs and wait times of the Python job queue
+   */
+  static getQueueStats(): JobQueueStats {
+    return this.queue.stats();
+  }
 
   /**
-   * Ensure temp directory exists
+   * Identity of a job: script, dataset version, registry / rate card
+   * revision and params. A replaced upload at the same path gets a new key
+   * through its size and mtime; a rate card edit through the revision.
    */
-  private static ensureTempDir(): void {
-    if (!fs.existsSync(this.tempDir)) {
-      fs.mkdirSync(this.tempDir, { recursive: true });
+  private static jobKey(
+    scriptName: string,
+    csvFilePath: string,
+    params: Record<string, unknown>
+  ): string {
+    let version = '';
+    try {
+      const stat = fs.statSync(csvFilePath);
+      version = `${stat.size}:${stat.mtimeMs}`;
+    } catch {
+      // Missing file: let the script report the error
     }
+    const sortedParams = Object.keys(params).sort().map(key => [key, params[key]]);
+    return JSON.stringify([scriptName, csvFilePath, version, getDataStoreRevision(), sortedParams]);
   }
 
   /**
-   * Create temp JSON files for Python scripts
+   * Run an analysis script with a JSON request envelope on stdin.
+   *
+   * The envelope names the dataset, the SQLite data store holding the
+   * registry and rate cards (scripts read only the stores and vendors in
+   * the upload) and the script parameters, so no temp files are written.
+   * Results are served from the result cache when present (precomputed
+   * after upload or computed earlier); otherwise the script runs through
+   * the job queue.
    */
-  private static async createTempFiles(): Promise<{
-    registryPath: string;
-    rateCardsPath: string;
-  }> {
-    this.ensureTempDir();
+  private static async runAnalysis(
+    scriptName: string,
+    csvFilePath: string,
+    params: Record<string, unknown> = {}
+  ): Promise<Record<string, unknown>> {
+    const key = this.jobKey(scriptName, csvFilePath, params);
 
-    const storeRegistry = await loadStoreRegistry();
-    const rateCards = await loadRateCards();
+    const cached = this.results.get(key);
+    if (cached) {
+      return cached;
+    }
+
+    // The running precompute will produce this payload: wait for it
+    // rather than computing it a second time
+    const pending = this.precompute;
+    if (pending && pending.keys.has(key)) {
+      await pending.done;
+      const precomputed = this.results.get(key);
+      if (precomputed) {
+        return precomputed;
+      }
+    }
+
+    const result = await this.queue.run(key, () =>
+      runPythonScript(scriptName, ['--stdin'], this.envelope(csvFilePath, params))
+    );
+    // Error payloads are returned but not cached, so the next request retries
+    if (!('error' in result)) {
+      this.results.set(key, result);
+    }
+    return result;
+  }
 
-    const registryPath = path.join(this.tempDir, `registry_${Date.now()}.json`);
-    const rateCardsPath = path.join(this.tempDir, `rate_cards_${Date.now()}.json`);
+  /**
+   * Add the state selection and date range to a script's params, when given
+   */
+  private static withScope(
+    params: Record<string, unknown>,
+    scope: ReportScope
+  ): Record<string, unknown> {
+    const scoped = { ...params };
+    if (scope.state) scoped.state = scope.state;
+    if (scope.start) scoped.start = scope.start;
+    if (scope.end) scoped.end = scope.end;
+    return scoped;
+  }
 
-    fs.writeFileSync(registryPath, JSON.stringify(storeRegistry));
-    fs.writeFileSync(rateCardsPath, JSON.stringify(rateCards));
+  /**
+   * Request envelope for a script: dataset, data store (created on a fresh
+   * deploy) and params
+   */
+  private static envelope(
+    csvFilePath: string,
+    params: Record<string, unknown>
+  ): Record<string, unknown> {
+    const dbPath = ensureDataStore();
+    return {
+      dataset: csvFilePath,
+      registry_path: dbPath,
+      rate_cards_path: dbPath,
+      params
+    };
+  }
 
-    return { registryPath, rateCardsPath };
+  /**
+   * Status of the latest post-upload precompute (null before any upload)
+   */
+  static getPrecomputeStatus(): PrecomputeStatus | null {
+    return this.precompute ? this.precompute.status : null;
   }
 
   /**
-   * Clean up temp files
+   * Ingest an upload, then compute every default report from one load of
+   * it in the background, filling the result cache.
+   *
+   * Report requests for the upload made meanwhile wait for the precompute
+   * instead of starting their own run. Resolves when done; never rejects.
    */
-  private static cleanupTempFiles(...files: string[]): void {
-    for (const file of files) {
+  static precomputeReports(csvFilePath: string): Promise<void> {
+    const names = Object.keys(PRECOMPUTED_REPORTS);
+    const keys = new Map(names.map(name => [
+      name,
+      this.jobKey(PRECOMPUTED_REPORTS[name].script, csvFilePath, PRECOMPUTED_REPORTS[name].params)
+    ]));
+
+    const status: PrecomputeStatus = {
+      dataset: path.basename(csvFilePath),
+      state: 'ingesting',
+      startedAt: new Date().toISOString(),
+      reports: Object.fromEntries(names.map(name => [name, 'pending' as const]))
+    };
+
+    const run = async (): Promise<void> => {
       try {
-        if (fs.existsSync(file)) {
-          fs.unlinkSync(file);
-        }
+        await this.ingestUpload(csvFilePath);
       } catch (error) {
-        console.error(`Failed to cleanup temp file ${file}:`, error);
+        // Without the cached frame the precompute parses the CSV itself
+        console.error('Ingest error:', error);
       }
-    }
+
+      status.state = 'computing';
+      const output = await this.queue.run(this.jobKey('precompute.py', csvFilePath, {}), () =>
+        runPythonScript('precompute.py', ['--stdin'], this.envelope(csvFilePath, {}))
+      );
+
+      const reports = (output.reports || {}) as Record<string, Record<string, unknown>>;
+      const errors = (output.errors || {}) as Record<string, string>;
+      for (const name of names) {
+        const report = reports[name];
+        if (report !== undefined && !(name in errors) && !('error' in report)) {
+          this.results.set(keys.get(name) as string, report);
+          status.reports[name] = 'ready';
+        } else {
+          status.reports[name] = 'failed';
+        }
+      }
+
+      if (Object.keys(errors).length > 0) {
+        status.errors = errors;
+      }
+      status.state = 'ready';
+    };
+
+    const done = run()
+      .catch((error) => {
+        console.error('Precompute error:', error);
+        status.state = 'failed';
+        status.error = error instanceof Error ? error.message : String(error);
+        for (const name of names) {
+          if (status.reports[name] === 'pending') {
+            status.reports[name] = 'failed';
+          }
+        }
+      })
+      .finally(() => {
+        status.finishedAt = new Date().toISOString();
+      });
+
+    this.precompute = { status, keys: new Set(keys.values()), done };
+    return done;
   }
 
   /**
-   * Calculate dashboard metrics from uploaded Nash CSV
+   * Validate and clean an uploaded Nash CSV in one parse, caching the
+   * cleaned frame so later analyses skip re-parsing the CSV
    */
-  static async calculateDashboard(csvFilePath: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
+  static async ingestUpload(csvFilePath: string): Promise<Record<string, unknown>> {
+    return this.queue.run(this.jobKey('ingest.py', csvFilePath, {}), () =>
+      runPythonScript('ingest.py', [csvFilePath])
+    );
+  }
 
-    try {
-      const result = await runPythonScript('dashboard.py', [
-        csvFilePath,
-        registryPath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+  /**
+   * Calculate dashboard metrics from uploaded Nash CSV
+   */
+  static async calculateDashboard(
+    csvFilePath: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('dashboard.py', csvFilePath, this.withScope({}, scope));
   }
 
   /**
    * Analyze a specific store
    */
-  static async analyzeStore(csvFilePath: string, storeId: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
-
-    try {
-      const result = await runPythonScript('store_analysis.py', [
-        csvFilePath,
-        storeId,
-        registryPath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+  static async analyzeStore(
+    csvFilePath: string,
+    storeId: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('store_analysis.py', csvFilePath, this.withScope({ store_id: storeId }, scope));
   }
 
   /**
    * Compare vendor performance
    */
-  static async compareVendors(csvFilePath: string): Promise<Record<string, unknown>> {
-    this.ensureTempDir();
-
-    const rateCards = await loadRateCards();
-    const rateCardsPath = path.join(this.tempDir, `rate_cards_${Date.now()}.json`);
-    fs.writeFileSync(rateCardsPath, JSON.stringify(rateCards));
-
-    try {
-      const result = await runPythonScript('vendor_analysis.py', [
-        csvFilePath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(rateCardsPath);
-    }
+  static async compareVendors(
+    csvFilePath: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('vendor_analysis.py', csvFilePath, this.withScope({}, scope));
   }
 
   /**
    * Analyze CPD comparison (Van vs Spark)
    */
-  static async analyzeCpd(csvFilePath: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
+  static async analyzeCpd(
+    csvFilePath: string,
+    format: OutputFormat = 'rows',
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('cpd_analysis.py', csvFilePath, this.withScope({ format }, scope));
+  }
 
-    try {
-      const result = await runPythonScript('cpd_analysis.py', [
-        csvFilePath,
-        registryPath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+  /**
+   * Sweep the anomaly-exclusion threshold (min_batch_size = 1..maxThreshold)
+   */
+  static async sweepMinBatchSize(
+    csvFilePath: string,
+    maxThreshold: number = 30,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('cpd_analysis.py', csvFilePath, this.withScope({ sweep: maxThreshold }, scope));
+  }
+
+  /**
+   * Evaluate CPD comparison under many what-if rate-card scenarios at once
+   */
+  static async analyzeCpdScenarios(
+    csvFilePath: string,
+    scenarios: RateCardScenario[],
+    format: OutputFormat = 'rows',
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('cpd_analysis.py', csvFilePath, this.withScope({ scenarios, format }, scope));
   }
 
   /**
    * Analyze batch performance (trip-level data for scatter plot)
    */
-  static async analyzeBatches(csvFilePath: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
+  static async analyzeBatches(
+    csvFilePath: string,
+    format: OutputFormat = 'rows',
+    scatter: ScatterOptions = {},
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    const params: Record<string, unknown> = { format };
+    if (scatter.mode) params.mode = scatter.mode;
+    if (scatter.binWidth !== undefined) params['bin-width'] = scatter.binWidth;
+    if (scatter.cpdBinWidth !== undefined) params['cpd-bin-width'] = scatter.cpdBinWidth;
+    if (scatter.maxPoints !== undefined) params['max-points'] = scatter.maxPoints;
 
-    try {
-      const result = await runPythonScript('batch_analysis.py', [
-        csvFilePath,
-        registryPath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+    return this.runAnalysis('batch_analysis.py', csvFilePath, this.withScope(params, scope));
   }
 
   /**
    * Calculate performance metrics
    */
-  static async calculatePerformance(csvFilePath: string): Promise<Record<string, unknown>> {
-    const result = await runPythonScript('performance.py', [csvFilePath]);
-    return result;
+  static async calculatePerformance(
+    csvFilePath: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('performance.py', csvFilePath, this.withScope({}, scope));
   }
 
   /**
-   * Analyze all stores in Nash CSV (returns array of store metrics)
+   * Dwell, load and trip time percentiles (p50/p90/p99) per carrier, store
+   * and week, read from the dataset's cached quantile sketches
    */
-  static async analyzeAllStores(csvFilePath: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
+  static async calculateLatencyPercentiles(
+    csvFilePath: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('performance.py', csvFilePath, this.withScope({ percentiles: true }, scope));
+  }
 
-    try {
-      const result = await runPythonScript('all_stores.py', [
-        csvFilePath,
-        registryPath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+  /**
+   * Distinct stores, couriers and trips overall, per carrier and per week,
+   * read from the dataset's cached distinct-count sketches
+   */
+  static async countDistinct(
+    csvFilePath: string,
+    mode?: DistinctMode,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('distinct_counts.py', csvFilePath, this.withScope(mode ? { mode } : {}, scope));
+  }
+
+  /**
+   * Top and bottom drivers per carrier by one metric, one page at a time
+   */
+  static async rankCouriers(
+    csvFilePath: string,
+    options: CourierRankingOptions = {},
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    const params: Record<string, unknown> = {};
+    if (options.metric) params.metric = options.metric;
+    if (options.limit !== undefined) params.limit = options.limit;
+    if (options.offset !== undefined) params.offset = options.offset;
+    if (options.minTrips !== undefined) params['min-trips'] = options.minTrips;
+
+    return this.runAnalysis('courier_analytics.py', csvFilePath, this.withScope(params, scope));
+  }
+
+  /**
+   * OTD % and mean pickup lateness by weekday x hour of the planned trip
+   * start (7 x 24 grids), overall, per carrier and per store
+   */
+  static async analyzeOtdHeatmap(
+    csvFilePath: string,
+    storeIds?: string[],
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    const params: Record<string, unknown> = {};
+    if (storeIds && storeIds.length > 0) params.stores = storeIds.join(',');
+
+    return this.runAnalysis('otd_heatmap.py', csvFilePath, this.withScope(params, scope));
+  }
+
+  /**
+   * Analyze all stores in Nash CSV (returns array of store metrics)
+   */
+  static async analyzeAllStores(
+    csvFilePath: string,
+    format: OutputFormat = 'rows',
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('all_stores.py', csvFilePath, this.withScope({ format }, scope));
   }
 
   /**
    * Analyze week-over-week metrics with anomaly exclusion
    */
-  static async analyzeWeeklyMetrics(csvFilePath: string): Promise<Record<string, unknown>> {
-    const { registryPath, rateCardsPath } = await this.createTempFiles();
+  static async analyzeWeeklyMetrics(
+    csvFilePath: string,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    return this.runAnalysis('weekly_metrics.py', csvFilePath, this.withScope({}, scope));
+  }
 
-    try {
-      const result = await runPythonScript('weekly_metrics.py', [
-        csvFilePath,
-        rateCardsPath
-      ]);
-      return result;
-    } finally {
-      this.cleanupTempFiles(registryPath, rateCardsPath);
-    }
+  /**
+   * Store x week matrices (orders, trips, cost, CPD, OTD) with store and
+   * week index vectors, dense or as sparse store-week entries
+   */
+  static async analyzeStoreWeekMatrix(
+    csvFilePath: string,
+    encoding?: MatrixEncoding,
+    scope: ReportScope = {}
+  ): Promise<Record<string, unknown>> {
+    const params: Record<string, unknown> = { matrix: true };
+    if (encoding) params.encoding = encoding;
+
+    return this.runAnalysis('weekly_metrics.py', csvFilePath, this.withScope(params, scope));
   }
 }
@@ -5,6 +5,7 @@ import fs from 'fs';
 import { upload } from './middleware/upload';
 import { HealthCheckResponse, UploadResponse, ErrorResponse } from './types';
 import { NashValidator } from './utils/nash-validator';
+import { getNashFileExtension, isNashFile } from './utils/nash-file';
 import {
   loadStoreRegistry,
   loadRateCards,
@@ -12,9 +13,21 @@ import {
   getStore,
   updateRateCard,
   getRateCard,
-  bulkUploadSparkCPD
+  bulkUploadSparkCPD,
+  validateRateTiers
 } from './utils/data-store';
-import { AnalyticsService } from './services/analytics.service';
+import {
+  AnalyticsService,
+  CourierMetric,
+  CourierRankingOptions,
+  DistinctMode,
+  MatrixEncoding,
+  OutputFormat,
+  ScatterMode,
+  ScatterOptions,
+  ReportScope,
+  StateSelection
+} from './services/analytics.service';
 
 const app = express();
 const PORT = process.env.PORT || 3000;
@@ -71,14 +84,21 @@ app.post('/api/upload', upload.single('file'), async (req: Request, res: Respons
       } as ErrorResponse);
     }
 
-    // Keep the file for analytics (rename with timestamp)
+    // Keep the file for analytics (rename with timestamp, keeping any
+    // compression extension so analyses decompress it on read)
     const timestamp = Date.now();
-    const newPath = path.join(
-      path.dirname(req.file.path),
-      `nash_${timestamp}.csv`
-    );
+    const extension = getNashFileExtension(req.file.originalname) || '.csv';
+    const savedAs = `nash_${timestamp}${extension}`;
+    const newPath = path.join(path.dirname(req.file.path), savedAs);
     fs.renameSync(req.file.path, newPath);
 
+    // Parse the upload once in the background, cache the cleaned frame and
+    // precompute every report so the first viewer skips the cold compute
+    // (progress: /api/analytics/precompute-status)
+    if (process.env.NODE_ENV !== 'test') {
+      AnalyticsService.precomputeReports(newPath);
+    }
+
     // Calculate CA stores (total - non-CA)
     const totalRows = validationResult.stats?.totalRows || 0;
     const nonCAStores = validationResult.stats?.nonCAStores || 0;
@@ -88,7 +108,7 @@ app.post('/api/upload', upload.single('file'), async (req: Request, res: Respons
       success: true,
       message: 'File uploaded and validated successfully',
       filename: req.file.originalname,
-      savedAs: `nash_${timestamp}.csv`,
+      savedAs: savedAs,
       size: req.file.size,
       validationResult: {
         totalRows: totalRows,
@@ -256,6 +276,30 @@ app.put('/api/rate-cards/:vendor', async (req: Request, res: Response) => {
       });
     }
 
+    if (updates.tiers !== undefined) {
+      const tiersError = validateRateTiers(updates.tiers);
+      if (tiersError) {
+        return res.status(400).json({
+          success: false,
+          error: tiersError
+        });
+      }
+    }
+
+    if (updates.per_stop_surcharge !== undefined && (typeof updates.per_stop_surcharge !== 'number' || updates.per_stop_surcharge < 0)) {
+      return res.status(400).json({
+        success: false,
+        error: 'per_stop_surcharge must be a non-negative number'
+      });
+    }
+
+    if (updates.effective_from !== undefined && (typeof updates.effective_from !== 'string' || !/^\d{4}-\d{2}-\d{2}$/.test(updates.effective_from))) {
+      return res.status(400).json({
+        success: false,
+        error: 'effective_from must be a YYYY-MM-DD date'
+      });
+    }
+
     await updateRateCard(vendor, updates);
 
     const updatedCard = await getRateCard(vendor);
@@ -273,14 +317,14 @@ app.put('/api/rate-cards/:vendor', async (req: Request, res: Response) => {
   }
 });
 
-// Helper function to get latest Nash CSV file
+// Helper function to get latest Nash CSV file (plain or compressed)
 function getLatestNashFile(): string | null {
   if (!fs.existsSync(uploadsDir)) {
     return null;
   }
 
   const files = fs.readdirSync(uploadsDir)
-    .filter(f => f.endsWith('.csv'))
+    .filter(f => isNashFile(f))
     .map(f => ({
       name: f,
       path: path.join(uploadsDir, f),
@@ -291,10 +335,98 @@ function getLatestNashFile(): string | null {
   return files.length > 0 ? files[0].path : null;
 }
 
+// Read the ?format= query parameter (columnar or default rows)
+function getOutputFormat(req: Request): OutputFormat {
+  return req.query.format === 'columnar' ? 'columnar' : 'rows';
+}
+
+// Read the ?state= query parameter: a state code, comma-separated codes or
+// ALL (anything else falls back to the default CA report)
+function getStateSelection(req: Request): StateSelection | undefined {
+  const state = typeof req.query.state === 'string' ? req.query.state.replace(/\s/g, '').toUpperCase() : '';
+  return /^(ALL|[A-Z]{2}(,[A-Z]{2})*)$/.test(state) ? state : undefined;
+}
+
+// Read the report scope: ?state= plus an inclusive ?start=&end= date range
+// (YYYY-MM-DD; malformed dates are ignored)
+function getReportScope(req: Request): ReportScope {
+  const scope: ReportScope = { state: getStateSelection(req) };
+  for (const bound of ['start', 'end'] as const) {
+    const value = req.query[bound];
+    if (typeof value === 'string' && /^\d{4}-\d{2}-\d{2}$/.test(value) && !isNaN(Date.parse(value))) {
+      scope[bound] = value;
+    }
+  }
+  return scope;
+}
+
+const SCATTER_MODES: ScatterMode[] = ['points', 'aggregate', 'binned', 'sample'];
+
+// Read batch scatter options (?mode=&bin_width=&cpd_bin_width=&max_points=)
+function getScatterOptions(req: Request): ScatterOptions {
+  const options: ScatterOptions = {};
+  const mode = req.query.mode as ScatterMode;
+  if (SCATTER_MODES.includes(mode)) {
+    options.mode = mode;
+  }
+
+  const binWidth = parseInt(req.query.bin_width as string, 10);
+  if (binWidth > 0) options.binWidth = binWidth;
+
+  const cpdBinWidth = parseFloat(req.query.cpd_bin_width as string);
+  if (cpdBinWidth > 0) options.cpdBinWidth = cpdBinWidth;
+
+  const maxPoints = parseInt(req.query.max_points as string, 10);
+  if (maxPoints > 0) options.maxPoints = maxPoints;
+
+  return options;
+}
+
+const COURIER_METRICS: CourierMetric[] = ['otd_percentage', 'drops_per_hour', 'avg_dwell_time', 'failed_orders_rate'];
+
+// Largest driver page served at each end of a ranking
+const MAX_COURIER_PAGE = 100;
+
+// Read driver ranking options (?metric=&limit=&offset=&min_trips=)
+function getCourierRankingOptions(req: Request): CourierRankingOptions {
+  const options: CourierRankingOptions = {};
+  const metric = req.query.metric as CourierMetric;
+  if (COURIER_METRICS.includes(metric)) {
+    options.metric = metric;
+  }
+
+  const limit = parseInt(req.query.limit as string, 10);
+  if (limit > 0) options.limit = Math.min(limit, MAX_COURIER_PAGE);
+
+  const offset = parseInt(req.query.offset as string, 10);
+  if (offset >= 0) options.offset = offset;
+
+  const minTrips = parseInt(req.query.min_trips as string, 10);
+  if (minTrips >= 0) options.minTrips = minTrips;
+
+  return options;
+}
+
 // Analytics Endpoints
 
+// GET /api/analytics/precompute-status - Progress of the post-upload precompute
+app.get('/api/analytics/precompute-status', (_req: Request, res: Response) => {
+  res.json({
+    success: true,
+    precompute: AnalyticsService.getPrecomputeStatus()
+  });
+});
+
+// GET /api/analytics/queue - Python job queue depth and wait times
+app.get('/api/analytics/queue', (_req: Request, res: Response) => {
+  res.json({
+    success: true,
+    queue: AnalyticsService.getQueueStats()
+  });
+});
+
 // GET /api/analytics/dashboard - Calculate dashboard metrics
-app.get('/api/analytics/dashboard', async (_req: Request, res: Response) => {
+app.get('/api/analytics/dashboard', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -305,7 +437,7 @@ app.get('/api/analytics/dashboard', async (_req: Request, res: Response) => {
       });
     }
 
-    const result = await AnalyticsService.calculateDashboard(latestFile);
+    const result = await AnalyticsService.calculateDashboard(latestFile, getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('Dashboard analytics error:', error);
@@ -317,7 +449,7 @@ app.get('/api/analytics/dashboard', async (_req: Request, res: Response) => {
 });
 
 // GET /api/analytics/stores - Analyze all stores
-app.get('/api/analytics/stores', async (_req: Request, res: Response) => {
+app.get('/api/analytics/stores', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -328,9 +460,8 @@ app.get('/api/analytics/stores', async (_req: Request, res: Response) => {
       });
     }
 
-    // Get all stores from Nash data (let Python filter CA stores)
-    // The Python analysis scripts handle CA filtering automatically
-    const result = await AnalyticsService.analyzeAllStores(latestFile);
+    // The Python analysis scripts filter to the selected states (CA by default)
+    const result = await AnalyticsService.analyzeAllStores(latestFile, getOutputFormat(req), getReportScope(req));
 
     res.json(result);
   } catch (error) {
@@ -355,7 +486,7 @@ app.get('/api/analytics/stores/:storeId', async (req: Request, res: Response) =>
       });
     }
 
-    const result = await AnalyticsService.analyzeStore(latestFile, storeId);
+    const result = await AnalyticsService.analyzeStore(latestFile, storeId, getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('Store analysis error:', error);
@@ -367,7 +498,7 @@ app.get('/api/analytics/stores/:storeId', async (req: Request, res: Response) =>
 });
 
 // GET /api/analytics/vendors - Compare vendor performance
-app.get('/api/analytics/vendors', async (_req: Request, res: Response) => {
+app.get('/api/analytics/vendors', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -378,7 +509,7 @@ app.get('/api/analytics/vendors', async (_req: Request, res: Response) => {
       });
     }
 
-    const result = await AnalyticsService.compareVendors(latestFile);
+    const result = await AnalyticsService.compareVendors(latestFile, getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('Vendor analytics error:', error);
@@ -390,7 +521,7 @@ app.get('/api/analytics/vendors', async (_req: Request, res: Response) => {
 });
 
 // GET /api/analytics/cpd-comparison - Compare Van CPD vs Spark CPD
-app.get('/api/analytics/cpd-comparison', async (_req: Request, res: Response) => {
+app.get('/api/analytics/cpd-comparison', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -401,7 +532,7 @@ app.get('/api/analytics/cpd-comparison', async (_req: Request, res: Response) =>
       });
     }
 
-    const result = await AnalyticsService.analyzeCpd(latestFile);
+    const result = await AnalyticsService.analyzeCpd(latestFile, getOutputFormat(req), getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('CPD analytics error:', error);
@@ -412,8 +543,69 @@ app.get('/api/analytics/cpd-comparison', async (_req: Request, res: Response) =>
   }
 });
 
+// GET /api/analytics/cpd-threshold-sweep - CPD and exclusions for min_batch_size 1..max
+app.get('/api/analytics/cpd-threshold-sweep', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const max = parseInt(req.query.max as string, 10);
+    const result = await AnalyticsService.sweepMinBatchSize(latestFile, max > 0 ? max : 30, getReportScope(req));
+    res.json(result);
+  } catch (error) {
+    console.error('CPD threshold sweep error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'CPD threshold sweep failed'
+    });
+  }
+});
+
+// POST /api/analytics/cpd-scenarios - CPD comparison under what-if rate cards
+app.post('/api/analytics/cpd-scenarios', async (req: Request, res: Response) => {
+  try {
+    const { scenarios } = req.body;
+
+    if (!scenarios || !Array.isArray(scenarios) || scenarios.length === 0) {
+      return res.status(400).json({
+        success: false,
+        error: 'Invalid request: scenarios array required'
+      });
+    }
+
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const result = await AnalyticsService.analyzeCpdScenarios(
+      latestFile,
+      scenarios,
+      getOutputFormat(req),
+      getReportScope(req)
+    );
+    res.json(result);
+  } catch (error) {
+    console.error('CPD scenario analytics error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'CPD scenario analysis failed'
+    });
+  }
+});
+
 // GET /api/analytics/batch-analysis - Analyze batch performance
-app.get('/api/analytics/batch-analysis', async (_req: Request, res: Response) => {
+app.get('/api/analytics/batch-analysis', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -424,7 +616,12 @@ app.get('/api/analytics/batch-analysis', async (_req: Request, res: Response) =>
       });
     }
 
-    const result = await AnalyticsService.analyzeBatches(latestFile);
+    const result = await AnalyticsService.analyzeBatches(
+      latestFile,
+      getOutputFormat(req),
+      getScatterOptions(req),
+      getReportScope(req)
+    );
     res.json(result);
   } catch (error) {
     console.error('Batch analytics error:', error);
@@ -436,7 +633,7 @@ app.get('/api/analytics/batch-analysis', async (_req: Request, res: Response) =>
 });
 
 // GET /api/analytics/performance - Calculate performance metrics
-app.get('/api/analytics/performance', async (_req: Request, res: Response) => {
+app.get('/api/analytics/performance', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -447,7 +644,7 @@ app.get('/api/analytics/performance', async (_req: Request, res: Response) => {
       });
     }
 
-    const result = await AnalyticsService.calculatePerformance(latestFile);
+    const result = await AnalyticsService.calculatePerformance(latestFile, getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('Performance analytics error:', error);
@@ -458,8 +655,114 @@ app.get('/api/analytics/performance', async (_req: Request, res: Response) => {
   }
 });
 
+// GET /api/analytics/percentiles - Dwell / load / trip time percentiles
+app.get('/api/analytics/percentiles', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const result = await AnalyticsService.calculateLatencyPercentiles(latestFile, getReportScope(req));
+    res.json(result);
+  } catch (error) {
+    console.error('Percentile analytics error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'Percentile calculation failed'
+    });
+  }
+});
+
+const DISTINCT_MODES: DistinctMode[] = ['auto', 'exact', 'approximate'];
+
+// GET /api/analytics/distinct-counts - Distinct stores / couriers / trips
+app.get('/api/analytics/distinct-counts', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const mode = req.query.mode as DistinctMode;
+    const result = await AnalyticsService.countDistinct(
+      latestFile,
+      DISTINCT_MODES.includes(mode) ? mode : undefined,
+      getReportScope(req)
+    );
+    res.json(result);
+  } catch (error) {
+    console.error('Distinct count analytics error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'Distinct count failed'
+    });
+  }
+});
+
+// GET /api/analytics/couriers - Top / bottom drivers per carrier, paginated
+app.get('/api/analytics/couriers', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const result = await AnalyticsService.rankCouriers(
+      latestFile,
+      getCourierRankingOptions(req),
+      getReportScope(req)
+    );
+    res.json(result);
+  } catch (error) {
+    console.error('Courier analytics error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'Courier analysis failed'
+    });
+  }
+});
+
+// GET /api/analytics/otd-heatmap - OTD / lateness by weekday x hour (?stores=2082,5930)
+app.get('/api/analytics/otd-heatmap', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available'
+      });
+    }
+
+    const stores = typeof req.query.stores === 'string'
+      ? req.query.stores.split(',').map(storeId => storeId.trim()).filter(Boolean)
+      : undefined;
+    const result = await AnalyticsService.analyzeOtdHeatmap(latestFile, stores, getReportScope(req));
+    res.json(result);
+  } catch (error) {
+    console.error('OTD heatmap analytics error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'OTD heatmap failed'
+    });
+  }
+});
+
 // GET /api/analytics/weekly-metrics - Week-over-week metrics analysis
-app.get('/api/analytics/weekly-metrics', async (_req: Request, res: Response) => {
+app.get('/api/analytics/weekly-metrics', async (req: Request, res: Response) => {
   try {
     const latestFile = getLatestNashFile();
 
@@ -470,7 +773,7 @@ app.get('/api/analytics/weekly-metrics', async (_req: Request, res: Response) =>
       });
     }
 
-    const result = await AnalyticsService.analyzeWeeklyMetrics(latestFile);
+    const result = await AnalyticsService.analyzeWeeklyMetrics(latestFile, getReportScope(req));
     res.json(result);
   } catch (error) {
     console.error('Weekly metrics error:', error);
@@ -481,6 +784,36 @@ app.get('/api/analytics/weekly-metrics', async (_req: Request, res: Response) =>
   }
 });
 
+const MATRIX_ENCODINGS: MatrixEncoding[] = ['auto', 'dense', 'sparse'];
+
+// GET /api/analytics/store-week-matrix - Store x week matrices for trend charts
+app.get('/api/analytics/store-week-matrix', async (req: Request, res: Response) => {
+  try {
+    const latestFile = getLatestNashFile();
+
+    if (!latestFile) {
+      return res.status(404).json({
+        success: false,
+        error: 'No Nash data available. Please upload a CSV file first.'
+      });
+    }
+
+    const encoding = req.query.encoding as MatrixEncoding;
+    const result = await AnalyticsService.analyzeStoreWeekMatrix(
+      latestFile,
+      MATRIX_ENCODINGS.includes(encoding) ? encoding : undefined,
+      getReportScope(req)
+    );
+    res.json(result);
+  } catch (error) {
+    console.error('Store week matrix error:', error);
+    res.status(500).json({
+      success: false,
+      error: error instanceof Error ? error.message : 'Store week matrix failed'
+    });
+  }
+});
+
 // Error handling middleware
 app.use((err: Error, _req: Request, res: Response, _next: express.NextFunction) => {
   console.error('Error:', err);
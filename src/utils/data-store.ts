@@ -1,5 +1,6 @@
 import fs from 'fs';
 import path from 'path';
+import Database from 'better-sqlite3';
 
 // Load CA stores from CSV file (shared function)
 let CA_STORES_CACHE: string[] = [];
@@ -37,13 +38,37 @@ export interface StoreRegistry {
   version: string;
 }
 
+// One rate tier: applies to batches up to max_orders (null = no upper bound)
+export interface RateTier {
+  max_orders: number | null;
+  rate: number;
+}
+
 export interface RateCard {
   base_rate_80: number;
   base_rate_100: number;
   contractual_adjustment: number;
+  // Optional tiered pricing; when present it replaces base_rate_80/100
+  tiers?: RateTier[];
+  per_stop_surcharge?: number;
+  // Date (YYYY-MM-DD) the current pricing took effect; missing = always
+  effective_from?: string | null;
+  // Superseded pricing versions, used to price trips before effective_from
+  history?: RateCardVersion[];
   notes?: string;
 }
 
+export type RateCardVersion = Omit<RateCard, 'history'>;
+
+// Fields that change what a trip costs (edits to these create a new version)
+const PRICING_FIELDS = [
+  'base_rate_80',
+  'base_rate_100',
+  'contractual_adjustment',
+  'tiers',
+  'per_stop_surcharge'
+] as const;
+
 export interface RateCards {
   vendors: Record<string, RateCard>;
   last_updated: string;
@@ -54,6 +79,48 @@ export interface RateCards {
 const DATA_DIR = path.join(process.cwd(), 'data');
 const STORE_REGISTRY_FILE = path.join(DATA_DIR, 'store-registry.json');
 const RATE_CARDS_FILE = path.join(DATA_DIR, 'rate-cards.json');
+const DEFAULT_VERSION = '1.0';
+
+// Tables shared with the Python analyses (scripts/analysis/__init__.py reads
+// them read-only); PRIMARY KEYs index lookups by store_id and vendor
+const SCHEMA = `
+  CREATE TABLE IF NOT EXISTS stores (
+    store_id TEXT PRIMARY KEY,
+    spark_cpd REAL,
+    target_batch_size REAL,
+    last_seen_in_upload TEXT,
+    status TEXT NOT NULL DEFAULT 'active'
+  );
+  CREATE TABLE IF NOT EXISTS rate_cards (
+    vendor TEXT PRIMARY KEY,
+    card TEXT NOT NULL
+  );
+  CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT PRIMARY KEY,
+    last_updated TEXT NOT NULL,
+    version TEXT NOT NULL
+  );
+`;
+
+interface StoreRow {
+  store_id: string;
+  spark_cpd: number | null;
+  target_batch_size: number | null;
+  last_seen_in_upload: string | null;
+  status: 'active' | 'inactive';
+}
+
+let db: Database.Database | null = null;
+
+// Bumped on every registry / rate card write made by this process
+let revision = 0;
+
+/**
+ * Path of the SQLite data store (ANALYTICS_DB_PATH overrides data/analytics.db)
+ */
+export function getDataStorePath(): string {
+  return process.env.ANALYTICS_DB_PATH || path.join(DATA_DIR, 'analytics.db');
+}
 
 // Ensure data directory exists
 function ensureDataDirectory(): void {
@@ -62,42 +129,199 @@ function ensureDataDirectory(): void {
   }
 }
 
+function defaultRateCards(): Record<string, RateCard> {
+  return {
+    FOX: {
+      base_rate_80: 380.00,
+      base_rate_100: 390.00,
+      contractual_adjustment: 1.00,
+      notes: 'Default FOX rates'
+    },
+    NTG: {
+      base_rate_80: 380.00,
+      base_rate_100: 390.00,
+      contractual_adjustment: 1.00,
+      notes: 'Default NTG rates'
+    },
+    FDC: {
+      base_rate_80: 380.00,
+      base_rate_100: 390.00,
+      contractual_adjustment: 1.00,
+      notes: 'Default FDC rates'
+    }
+  };
+}
+
+/**
+ * Open the data store, creating it on first use.
+ *
+ * A new store is seeded from the legacy store-registry.json /
+ * rate-cards.json files when present, otherwise with an empty registry
+ * and the default rate cards.
+ */
+function getDb(): Database.Database {
+  if (db) {
+    return db;
+  }
+
+  const dbPath = getDataStorePath();
+  fs.mkdirSync(path.dirname(dbPath), { recursive: true });
+
+  const conn = new Database(dbPath);
+  // WAL lets the Python analyses read while the server writes
+  conn.pragma('journal_mode = WAL');
+  conn.exec(SCHEMA);
+  db = conn;
+
+  const seeded = conn.prepare('SELECT name FROM metadata').all() as Array<{ name: string }>;
+  const sections = new Set(seeded.map(row => row.name));
+
+  if (!sections.has('registry')) {
+    const legacy: StoreRegistry | null = fs.existsSync(STORE_REGISTRY_FILE)
+      ? JSON.parse(fs.readFileSync(STORE_REGISTRY_FILE, 'utf-8'))
+      : null;
+    writeRegistry(legacy?.stores ?? {}, legacy?.version ?? DEFAULT_VERSION);
+  }
+
+  if (!sections.has('rate_cards')) {
+    const legacy: RateCards | null = fs.existsSync(RATE_CARDS_FILE)
+      ? JSON.parse(fs.readFileSync(RATE_CARDS_FILE, 'utf-8'))
+      : null;
+    writeRateCards(legacy?.vendors ?? defaultRateCards(), legacy?.version ?? DEFAULT_VERSION);
+  }
+
+  return conn;
+}
+
+/**
+ * Create and seed the data store if it does not exist yet, returning its
+ * path. The Python analyses open it read-only, so it must exist before
+ * one runs.
+ */
+export function ensureDataStore(): string {
+  getDb();
+  return getDataStorePath();
+}
+
+/**
+ * Close the data store (the next call reopens it)
+ */
+export function closeDataStore(): void {
+  if (db) {
+    db.close();
+    db = null;
+  }
+}
+
 /**
- * Load Store Registry from disk
+ * Revision of the registry and rate cards, bumped on every write (lets
+ * callers cache results computed from them)
+ */
+export function getDataStoreRevision(): number {
+  return revision;
+}
+
+function touchMetadata(name: 'registry' | 'rate_cards', version?: string): void {
+  revision++;
+  getDb().prepare(`
+    INSERT INTO metadata (name, last_updated, version) VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+      last_updated = excluded.last_updated,
+      version = COALESCE(?, metadata.version)
+  `).run(name, new Date().toISOString(), version ?? DEFAULT_VERSION, version ?? null);
+}
+
+function readMetadata(name: 'registry' | 'rate_cards'): { last_updated: string; version: string } {
+  const row = getDb().prepare('SELECT last_updated, version FROM metadata WHERE name = ?')
+    .get(name) as { last_updated: string; version: string } | undefined;
+  return row ?? { last_updated: new Date().toISOString(), version: DEFAULT_VERSION };
+}
+
+function rowToStore(row: StoreRow): StoreInfo {
+  const store: StoreInfo = { status: row.status };
+  if (row.spark_cpd !== null) store.spark_ytd_cpd = row.spark_cpd;
+  if (row.target_batch_size !== null) store.target_batch_size = row.target_batch_size;
+  if (row.last_seen_in_upload !== null) store.last_seen_in_upload = row.last_seen_in_upload;
+  return store;
+}
+
+function upsertStore(storeId: string, store: StoreInfo): void {
+  getDb().prepare(`
+    INSERT INTO stores (store_id, spark_cpd, target_batch_size, last_seen_in_upload, status)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(store_id) DO UPDATE SET
+      spark_cpd = excluded.spark_cpd,
+      target_batch_size = excluded.target_batch_size,
+      last_seen_in_upload = excluded.last_seen_in_upload,
+      status = excluded.status
+  `).run(
+    storeId,
+    store.spark_ytd_cpd ?? null,
+    store.target_batch_size ?? null,
+    store.last_seen_in_upload ?? null,
+    store.status ?? 'active'
+  );
+}
+
+// Replace every store in one transaction
+function writeRegistry(stores: Record<string, StoreInfo>, version?: string): void {
+  const conn = getDb();
+  conn.transaction(() => {
+    conn.prepare('DELETE FROM stores').run();
+    for (const [storeId, store] of Object.entries(stores)) {
+      upsertStore(storeId, store);
+    }
+    touchMetadata('registry', version);
+  })();
+}
+
+function upsertRateCard(vendor: string, card: RateCard): void {
+  getDb().prepare(`
+    INSERT INTO rate_cards (vendor, card) VALUES (?, ?)
+    ON CONFLICT(vendor) DO UPDATE SET card = excluded.card
+  `).run(vendor, JSON.stringify(card));
+}
+
+// Replace every rate card in one transaction
+function writeRateCards(vendors: Record<string, RateCard>, version?: string): void {
+  const conn = getDb();
+  conn.transaction(() => {
+    conn.prepare('DELETE FROM rate_cards').run();
+    for (const [vendor, card] of Object.entries(vendors)) {
+      upsertRateCard(vendor, card);
+    }
+    touchMetadata('rate_cards', version);
+  })();
+}
+
+/**
+ * Load Store Registry from the data store
  */
 export async function loadStoreRegistry(): Promise<StoreRegistry> {
-  ensureDataDirectory();
+  const rows = getDb().prepare('SELECT * FROM stores').all() as StoreRow[];
 
-  if (!fs.existsSync(STORE_REGISTRY_FILE)) {
-    // Return default empty registry
-    return {
-      stores: {},
-      last_updated: new Date().toISOString(),
-      version: '1.0'
-    };
+  const stores: Record<string, StoreInfo> = {};
+  for (const row of rows) {
+    stores[row.store_id] = rowToStore(row);
   }
 
-  const content = fs.readFileSync(STORE_REGISTRY_FILE, 'utf-8');
-  return JSON.parse(content);
+  return { stores, ...readMetadata('registry') };
 }
 
 /**
- * Save Store Registry to disk
+ * Replace the whole Store Registry
  */
 export async function saveStoreRegistry(registry: StoreRegistry): Promise<void> {
   ensureDataDirectory();
 
-  // Create backup before saving
-  if (fs.existsSync(STORE_REGISTRY_FILE)) {
-    const backupFile = `${STORE_REGISTRY_FILE}.bak`;
-    fs.copyFileSync(STORE_REGISTRY_FILE, backupFile);
+  // Full replacement is destructive: keep a JSON snapshot of the old registry
+  const previous = await loadStoreRegistry();
+  if (Object.keys(previous.stores).length > 0) {
+    fs.writeFileSync(`${STORE_REGISTRY_FILE}.bak`, JSON.stringify(previous, null, 2));
   }
 
-  // Update last_updated timestamp
-  registry.last_updated = new Date().toISOString();
-
-  // Write to file
-  fs.writeFileSync(STORE_REGISTRY_FILE, JSON.stringify(registry, null, 2));
+  writeRegistry(registry.stores, registry.version);
+  registry.last_updated = readMetadata('registry').last_updated;
 }
 
 /**
@@ -134,67 +358,78 @@ export async function mergeStoreData(
 }
 
 /**
- * Load Rate Cards from disk
+ * Load Rate Cards from the data store
  */
 export async function loadRateCards(): Promise<RateCards> {
-  ensureDataDirectory();
+  const rows = getDb().prepare('SELECT vendor, card FROM rate_cards').all() as Array<{ vendor: string; card: string }>;
 
-  if (!fs.existsSync(RATE_CARDS_FILE)) {
-    // Return default rate cards
-    return {
-      vendors: {
-        FOX: {
-          base_rate_80: 380.00,
-          base_rate_100: 390.00,
-          contractual_adjustment: 1.00,
-          notes: 'Default FOX rates'
-        },
-        NTG: {
-          base_rate_80: 380.00,
-          base_rate_100: 390.00,
-          contractual_adjustment: 1.00,
-          notes: 'Default NTG rates'
-        },
-        FDC: {
-          base_rate_80: 380.00,
-          base_rate_100: 390.00,
-          contractual_adjustment: 1.00,
-          notes: 'Default FDC rates'
-        }
-      },
-      last_updated: new Date().toISOString(),
-      version: '1.0'
-    };
+  const vendors: Record<string, RateCard> = {};
+  for (const row of rows) {
+    vendors[row.vendor] = JSON.parse(row.card);
   }
 
-  const content = fs.readFileSync(RATE_CARDS_FILE, 'utf-8');
-  return JSON.parse(content);
+  return { vendors, ...readMetadata('rate_cards') };
 }
 
 /**
- * Save Rate Cards to disk
+ * Validate a tiered rate schedule, returning an error message or null
  */
-export async function saveRateCards(rateCards: RateCards): Promise<void> {
-  ensureDataDirectory();
+export function validateRateTiers(tiers: unknown): string | null {
+  if (!Array.isArray(tiers) || tiers.length === 0) {
+    return 'tiers must be a non-empty array';
+  }
 
-  // Validate rate card data
-  for (const [vendor, card] of Object.entries(rateCards.vendors)) {
-    if (typeof card.base_rate_80 !== 'number' || card.base_rate_80 < 0) {
-      throw new Error(`Invalid base_rate_80 for vendor ${vendor}`);
+  let previous = 0;
+  for (const [index, tier] of tiers.entries()) {
+    if (typeof tier?.rate !== 'number' || tier.rate < 0) {
+      return 'tier rate must be a non-negative number';
     }
-    if (typeof card.base_rate_100 !== 'number' || card.base_rate_100 < 0) {
-      throw new Error(`Invalid base_rate_100 for vendor ${vendor}`);
+
+    const isLast = index === tiers.length - 1;
+    if (tier.max_orders === null && isLast) {
+      continue;
     }
-    if (typeof card.contractual_adjustment !== 'number' || card.contractual_adjustment < 0) {
-      throw new Error(`Invalid contractual_adjustment for vendor ${vendor}`);
+    if (typeof tier.max_orders !== 'number' || tier.max_orders <= previous) {
+      return 'tier max_orders must be ascending positive numbers (only the last may be null)';
     }
+    previous = tier.max_orders;
   }
 
-  // Update last_updated timestamp
-  rateCards.last_updated = new Date().toISOString();
+  return null;
+}
 
-  // Write to file
-  fs.writeFileSync(RATE_CARDS_FILE, JSON.stringify(rateCards, null, 2));
+/**
+ * Validate a vendor's rate card, throwing on invalid values
+ */
+function validateRateCard(vendor: string, card: RateCard): void {
+  if (typeof card.base_rate_80 !== 'number' || card.base_rate_80 < 0) {
+    throw new Error(`Invalid base_rate_80 for vendor ${vendor}`);
+  }
+  if (typeof card.base_rate_100 !== 'number' || card.base_rate_100 < 0) {
+    throw new Error(`Invalid base_rate_100 for vendor ${vendor}`);
+  }
+  if (typeof card.contractual_adjustment !== 'number' || card.contractual_adjustment < 0) {
+    throw new Error(`Invalid contractual_adjustment for vendor ${vendor}`);
+  }
+  if (card.tiers !== undefined && validateRateTiers(card.tiers) !== null) {
+    throw new Error(`Invalid tiers for vendor ${vendor}`);
+  }
+  if (card.per_stop_surcharge !== undefined && (typeof card.per_stop_surcharge !== 'number' || card.per_stop_surcharge < 0)) {
+    throw new Error(`Invalid per_stop_surcharge for vendor ${vendor}`);
+  }
+}
+
+/**
+ * Replace all Rate Cards
+ */
+export async function saveRateCards(rateCards: RateCards): Promise<void> {
+  // Validate rate card data
+  for (const [vendor, card] of Object.entries(rateCards.vendors)) {
+    validateRateCard(vendor, card);
+  }
+
+  writeRateCards(rateCards.vendors, rateCards.version);
+  rateCards.last_updated = readMetadata('rate_cards').last_updated;
 }
 
 /**
@@ -204,26 +439,26 @@ export async function updateStore(
   storeId: string,
   updates: Partial<StoreInfo>
 ): Promise<void> {
-  const registry = await loadStoreRegistry();
-
-  if (!registry.stores[storeId]) {
-    registry.stores[storeId] = { status: 'active' };
-  }
-
-  registry.stores[storeId] = {
-    ...registry.stores[storeId],
-    ...updates
-  };
-
-  await saveStoreRegistry(registry);
+  const conn = getDb();
+
+  // Single-row read-modify-write
+  conn.transaction(() => {
+    const current: StoreInfo = readStore(storeId) ?? { status: 'active' };
+    upsertStore(storeId, { ...current, ...updates });
+    touchMetadata('registry');
+  })();
 }
 
 /**
  * Get a single store from registry
  */
 export async function getStore(storeId: string): Promise<StoreInfo | null> {
-  const registry = await loadStoreRegistry();
-  return registry.stores[storeId] || null;
+  return readStore(storeId);
+}
+
+function readStore(storeId: string): StoreInfo | null {
+  const row = getDb().prepare('SELECT * FROM stores WHERE store_id = ?').get(storeId) as StoreRow | undefined;
+  return row ? rowToStore(row) : null;
 }
 
 /**
@@ -233,26 +468,53 @@ export async function updateRateCard(
   vendor: string,
   updates: Partial<RateCard>
 ): Promise<void> {
-  const rateCards = await loadRateCards();
+  const current = readRateCard(vendor);
 
-  if (!rateCards.vendors[vendor]) {
+  if (!current) {
     throw new Error(`Vendor ${vendor} not found`);
   }
 
-  rateCards.vendors[vendor] = {
-    ...rateCards.vendors[vendor],
-    ...updates
-  };
+  const pricingChanged = PRICING_FIELDS.some(
+    field => updates[field] !== undefined &&
+      JSON.stringify(updates[field]) !== JSON.stringify(current[field])
+  );
+
+  let updated: RateCard;
+  if (pricingChanged) {
+    // Keep the superseded pricing so past trips stay priced as they were
+    const { history = [], ...previous } = current;
+    updated = {
+      ...current,
+      ...updates,
+      effective_from: updates.effective_from ?? new Date().toISOString().slice(0, 10),
+      history: [...history, { ...previous, effective_from: previous.effective_from ?? null }]
+    };
+  } else {
+    updated = {
+      ...current,
+      ...updates
+    };
+  }
 
-  await saveRateCards(rateCards);
+  validateRateCard(vendor, updated);
+
+  const conn = getDb();
+  conn.transaction(() => {
+    upsertRateCard(vendor, updated);
+    touchMetadata('rate_cards');
+  })();
 }
 
 /**
  * Get a single vendor's rate card
  */
 export async function getRateCard(vendor: string): Promise<RateCard | null> {
-  const rateCards = await loadRateCards();
-  return rateCards.vendors[vendor] || null;
+  return readRateCard(vendor);
+}
+
+function readRateCard(vendor: string): RateCard | null {
+  const row = getDb().prepare('SELECT card FROM rate_cards WHERE vendor = ?').get(vendor) as { card: string } | undefined;
+  return row ? JSON.parse(row.card) : null;
 }
 
 /**
@@ -261,28 +523,29 @@ export async function getRateCard(vendor: string): Promise<RateCard | null> {
 export async function bulkUploadSparkCPD(
   stores: Array<{ storeId: string; sparkCpd: number; targetBatchSize: number }>
 ): Promise<{ success: boolean; updated: number; errors: string[] }> {
-  const registry = await loadStoreRegistry();
   const CA_STORES = loadCAStoresForValidation();
   const errors: string[] = [];
   let updated = 0;
 
-  for (const store of stores) {
-    if (!CA_STORES.includes(store.storeId)) {
-      errors.push(`Store ${store.storeId} is not a CA store`);
-      continue;
-    }
-
-    if (!registry.stores[store.storeId]) {
-      registry.stores[store.storeId] = { status: 'active' };
+  // One transaction: valid stores are saved even if others are rejected
+  const conn = getDb();
+  conn.transaction(() => {
+    for (const store of stores) {
+      if (!CA_STORES.includes(store.storeId)) {
+        errors.push(`Store ${store.storeId} is not a CA store`);
+        continue;
+      }
+
+      const current: StoreInfo = readStore(store.storeId) ?? { status: 'active' };
+      upsertStore(store.storeId, {
+        ...current,
+        spark_ytd_cpd: store.sparkCpd,
+        target_batch_size: store.targetBatchSize
+      });
+      updated++;
     }
-
-    registry.stores[store.storeId].spark_ytd_cpd = store.sparkCpd;
-    registry.stores[store.storeId].target_batch_size = store.targetBatchSize;
-    updated++;
-  }
-
-  // Save the registry even if there were errors (valid stores should be saved)
-  await saveStoreRegistry(registry);
+    touchMetadata('registry');
+  })();
 
   if (errors.length > 0) {
     return { success: false, updated, errors };
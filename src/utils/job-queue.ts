@@ -0,0 +1,118 @@
+/**
+ * Queue statistics exposed by /api/analytics/queue
+ */
+export interface JobQueueStats {
+  maxConcurrency: number;
+  running: number;
+  queued: number;
+  inFlight: number;
+  completed: number;
+  coalesced: number;
+  avgWaitMs: number;
+  maxWaitMs: number;
+  oldestQueuedMs: number;
+}
+
+interface QueuedJob {
+  enqueuedAt: number;
+  start: () => void;
+}
+
+/**
+ * Bounded-concurrency job queue with in-flight coalescing.
+ *
+ * Jobs submitted under the same key while one is queued or running share
+ * its promise instead of starting a second computation. At most
+ * maxConcurrency jobs run at once; the rest wait in FIFO order.
+ */
+export class JobQueue {
+  private readonly inFlight = new Map<string, Promise<unknown>>();
+  private readonly waiting: QueuedJob[] = [];
+  private running = 0;
+  private completed = 0;
+  private coalesced = 0;
+  private totalWaitMs = 0;
+  private maxWaitMs = 0;
+
+  constructor(private readonly maxConcurrency: number) {
+    if (!Number.isInteger(maxConcurrency) || maxConcurrency < 1) {
+      throw new Error(`Invalid maxConcurrency: ${maxConcurrency}`);
+    }
+  }
+
+  /**
+   * Run a job, or join the identical job already in flight
+   *
+   * @param key - Identity of the computation (same key = same result)
+   * @param task - Starts the computation once a slot is free
+   */
+  run<T>(key: string, task: () => Promise<T>): Promise<T> {
+    const existing = this.inFlight.get(key);
+    if (existing) {
+      this.coalesced++;
+      return existing as Promise<T>;
+    }
+
+    const promise = new Promise<T>((resolve, reject) => {
+      const enqueuedAt = Date.now();
+      this.waiting.push({
+        enqueuedAt,
+        start: () => {
+          const waitMs = Date.now() - enqueuedAt;
+          this.totalWaitMs += waitMs;
+          this.maxWaitMs = Math.max(this.maxWaitMs, waitMs);
+          this.running++;
+
+          let result: Promise<T>;
+          try {
+            result = task();
+          } catch (error) {
+            result = Promise.reject(error);
+          }
+
+          // Free the slot and key before callers see the result, so a
+          // follow-up request starts a fresh job
+          result.finally(() => {
+            this.running--;
+            this.completed++;
+            this.inFlight.delete(key);
+            this.drain();
+          }).then(resolve, reject);
+        }
+      });
+      this.drain();
+    });
+
+    this.inFlight.set(key, promise);
+    return promise;
+  }
+
+  /**
+   * Current queue depth, concurrency and wait times
+   */
+  stats(): JobQueueStats {
+    const started = this.completed + this.running;
+    return {
+      maxConcurrency: this.maxConcurrency,
+      running: this.running,
+      queued: this.waiting.length,
+      inFlight: this.inFlight.size,
+      completed: this.completed,
+      coalesced: this.coalesced,
+      avgWaitMs: started > 0 ? Math.round(this.totalWaitMs / started) : 0,
+      maxWaitMs: this.maxWaitMs,
+      oldestQueuedMs: this.waiting.length > 0 ? Date.now() - this.waiting[0].enqueuedAt : 0
+    };
+  }
+
+  // Start queued jobs while slots are free
+  private drain(): void {
+    while (this.running < this.maxConcurrency) {
+      const job = this.waiting.shift();
+      if (!job) {
+        break;
+      }
+      job.start();
+    }
+  }
+}
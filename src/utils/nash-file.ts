@@ -0,0 +1,99 @@
+import fs from 'fs';
+import zlib from 'zlib';
+import { pipeline, Readable, Transform } from 'stream';
+
+// Accepted Nash export extensions (longest first so '.csv.gz' wins over '.csv').
+// .csv.zst is left out: zstd only landed in node:zlib in Node 22.15 and
+// .node-version pins Node 20.
+export const NASH_FILE_EXTENSIONS = ['.csv.gz', '.zip', '.csv'];
+
+const ZIP_LOCAL_HEADER_SIGNATURE = 0x04034b50;
+const ZIP_LOCAL_HEADER_SIZE = 30;
+const ZIP_METHOD_STORED = 0;
+const ZIP_METHOD_DEFLATE = 8;
+
+/**
+ * Get the Nash export extension of a file name, or null if not accepted
+ */
+export function getNashFileExtension(fileName: string): string | null {
+  const lower = fileName.toLowerCase();
+  return NASH_FILE_EXTENSIONS.find(ext => lower.endsWith(ext)) || null;
+}
+
+/**
+ * Check whether a file name has an accepted Nash export extension
+ */
+export function isNashFile(fileName: string): boolean {
+  return getNashFileExtension(fileName) !== null;
+}
+
+/**
+ * Chain a decompressor onto a file stream, forwarding errors from either
+ */
+function decompress(source: Readable, decompressor: Transform): Readable {
+  // pipeline destroys the decompressor with the source's error, which
+  // surfaces it to whoever consumes the returned stream
+  pipeline(source, decompressor, () => undefined);
+  return decompressor;
+}
+
+/**
+ * Stream the first entry of a ZIP archive without extracting to disk.
+ *
+ * Reads the entry's local file header, then inflates from the data offset.
+ * The raw-deflate stream ends itself, so the trailing central directory is
+ * never read.
+ */
+function openZipEntryStream(filePath: string): Readable {
+  const fd = fs.openSync(filePath, 'r');
+  let header: Buffer;
+  let nameAndExtra: Buffer;
+  try {
+    header = Buffer.alloc(ZIP_LOCAL_HEADER_SIZE);
+    fs.readSync(fd, header, 0, ZIP_LOCAL_HEADER_SIZE, 0);
+    const nameLength = header.readUInt16LE(26);
+    const extraLength = header.readUInt16LE(28);
+    nameAndExtra = Buffer.alloc(nameLength + extraLength);
+    fs.readSync(fd, nameAndExtra, 0, nameAndExtra.length, ZIP_LOCAL_HEADER_SIZE);
+  } finally {
+    fs.closeSync(fd);
+  }
+
+  if (header.readUInt32LE(0) !== ZIP_LOCAL_HEADER_SIGNATURE) {
+    throw new Error('Invalid ZIP file');
+  }
+
+  const method = header.readUInt16LE(8);
+  const compressedSize = header.readUInt32LE(18);
+  const dataStart = ZIP_LOCAL_HEADER_SIZE + nameAndExtra.length;
+
+  if (method === ZIP_METHOD_DEFLATE) {
+    return decompress(fs.createReadStream(filePath, { start: dataStart }), zlib.createInflateRaw());
+  }
+
+  if (method === ZIP_METHOD_STORED && compressedSize > 0) {
+    return fs.createReadStream(filePath, { start: dataStart, end: dataStart + compressedSize - 1 });
+  }
+
+  throw new Error(`Unsupported ZIP compression method ${method}`);
+}
+
+/**
+ * Open a Nash export as a stream of decompressed CSV bytes.
+ *
+ * Supports .csv, .csv.gz and .zip (first entry). Decompression
+ * happens on the fly; no uncompressed copy is written to disk.
+ */
+export function openNashStream(filePath: string): Readable {
+  const extension = getNashFileExtension(filePath);
+
+  if (extension === '.csv.gz') {
+    return decompress(fs.createReadStream(filePath), zlib.createGunzip());
+  }
+
+  if (extension === '.zip') {
+    return openZipEntryStream(filePath);
+  }
+
+  return fs.createReadStream(filePath);
+}
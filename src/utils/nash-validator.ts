@@ -1,5 +1,7 @@
 import fs from 'fs';
 import path from 'path';
+import readline from 'readline';
+import { openNashStream } from './nash-file';
 
 interface ValidationResult {
   valid: boolean;
@@ -79,6 +81,7 @@ function loadCAStores(): number[] {
 export class NashValidator {
   /**
    * Validates Nash CSV file format and data
+   * (plain .csv or compressed .csv.gz, .zip)
    */
   static async validate(filePath: string): Promise<ValidationResult> {
     const errors: string[] = [];
@@ -98,54 +101,63 @@ export class NashValidator {
         return { valid: false, errors, warnings };
       }
 
-      // Read file
-      const content = fs.readFileSync(filePath, 'utf-8');
-      const lines = content.split('\n').filter(line => line.trim());
+      // Stream the file line by line (decompressing .csv.gz/.zip
+      // on the fly) instead of reading it into memory. Stream errors such
+      // as a truncated archive reject the loop below.
+      const input = openNashStream(filePath);
+      const lines = readline.createInterface({ input, crlfDelay: Infinity });
 
-      if (lines.length === 0) {
-        errors.push('File is empty');
-        return { valid: false, errors, warnings };
-      }
+      let header: string[] | null = null;
+      let storeIdIndex = -1;
+      let dateIndex = -1;
+      let carrierIndex = -1;
+      let i = 0; // Index among non-empty lines (header is 0)
 
-      // Parse header
-      const header = lines[0].split(',').map(col => col.trim());
+      for await (const rawLine of lines) {
+        const line = rawLine.trim();
+        if (!line) continue;
 
-      // Check for required columns
-      const missingColumns = REQUIRED_COLUMNS.filter(
-        required => !header.includes(required)
-      );
+        if (header === null) {
+          // Parse header
+          const headerColumns = line.split(',').map(col => col.trim());
+          header = headerColumns;
 
-      if (missingColumns.length > 0) {
-        errors.push(
-          `Missing required columns: ${missingColumns.join(', ')}\n` +
-          `Found columns: ${header.join(', ')}\n` +
-          `\nDiagnosis: Column names must match exactly (case-sensitive). ` +
-          `Common issue: "Store ID" vs "Store Id" (lowercase 'd')`
-        );
-      }
+          // Check for required columns
+          const missingColumns = REQUIRED_COLUMNS.filter(
+            required => !headerColumns.includes(required)
+          );
 
-      // Check for wrong column names (common mistakes)
-      if (header.includes('Store ID') && !header.includes('Store Id')) {
-        errors.push(
-          `Column "Store ID" found but should be "Store Id" (lowercase 'd')`
-        );
-      }
+          if (missingColumns.length > 0) {
+            errors.push(
+              `Missing required columns: ${missingColumns.join(', ')}\n` +
+              `Found columns: ${header.join(', ')}\n` +
+              `\nDiagnosis: Column names must match exactly (case-sensitive). ` +
+              `Common issue: "Store ID" vs "Store Id" (lowercase 'd')`
+            );
+          }
 
-      // If critical errors, return early
-      if (errors.length > 0) {
-        return { valid: false, errors, warnings };
-      }
+          // Check for wrong column names (common mistakes)
+          if (header.includes('Store ID') && !header.includes('Store Id')) {
+            errors.push(
+              `Column "Store ID" found but should be "Store Id" (lowercase 'd')`
+            );
+          }
 
-      // Get column indices
-      const storeIdIndex = header.indexOf('Store Id');
-      const dateIndex = header.indexOf('Date');
-      const carrierIndex = header.indexOf('Carrier');
+          // If critical errors, return early
+          if (errors.length > 0) {
+            lines.close();
+            input.destroy();
+            return { valid: false, errors, warnings };
+          }
 
-      // Validate data rows
-      for (let i = 1; i < lines.length; i++) {
-        const line = lines[i].trim();
-        if (!line) continue;
+          // Get column indices
+          storeIdIndex = header.indexOf('Store Id');
+          dateIndex = header.indexOf('Date');
+          carrierIndex = header.indexOf('Carrier');
+          continue;
+        }
 
+        i++;
         totalRows++;
         const columns = line.split(',').map(col => col.trim());
 
@@ -186,6 +198,11 @@ export class NashValidator {
         }
       }
 
+      if (header === null) {
+        errors.push('File is empty');
+        return { valid: false, errors, warnings };
+      }
+
       // Add warnings
       if (nonCAStores > 0) {
         warnings.push(
@@ -6,11 +6,14 @@ import path from 'path';
  *
  * @param scriptName - Name of the Python script (e.g., 'dashboard.py')
  * @param args - Command-line arguments to pass to the script
+ * @param input - JSON request envelope piped to the script's stdin (the
+ *   script must be run with --stdin to read it)
  * @returns Promise resolving to parsed JSON output
  */
 export async function runPythonScript(
   scriptName: string,
-  args: string[] = []
+  args: string[] = [],
+  input?: Record<string, unknown>
 ): Promise<Record<string, unknown>> {
   return new Promise((resolve, reject) => {
     // Use Python from environment or system python3
@@ -61,5 +64,12 @@ export async function runPythonScript(
     python.on('error', (err) => {
       reject(new Error(`Failed to spawn Python process: ${err.message}`));
     });
+
+    // A script that exits early closes stdin; the exit code reports why
+    python.stdin.on('error', () => undefined);
+    if (input !== undefined) {
+      python.stdin.write(JSON.stringify(input));
+    }
+    python.stdin.end();
   });
 }
@@ -0,0 +1,45 @@
+/**
+ * Least-recently-used cache of report payloads.
+ *
+ * Keys identify the computation (script, dataset version, params), so an
+ * entry never needs invalidating; stale entries simply age out.
+ */
+export class ResultCache<T> {
+  private readonly entries = new Map<string, T>();
+
+  constructor(private readonly maxEntries: number) {
+    if (!Number.isInteger(maxEntries) || maxEntries < 1) {
+      throw new Error(`Invalid maxEntries: ${maxEntries}`);
+    }
+  }
+
+  /**
+   * Get an entry, marking it most recently used
+   */
+  get(key: string): T | undefined {
+    const value = this.entries.get(key);
+    if (value !== undefined) {
+      // Map iteration order is insertion order: re-insert to move to the end
+      this.entries.delete(key);
+      this.entries.set(key, value);
+    }
+    return value;
+  }
+
+  /**
+   * Store an entry, evicting the least recently used beyond maxEntries
+   */
+  set(key: string, value: T): void {
+    this.entries.delete(key);
+    this.entries.set(key, value);
+
+    while (this.entries.size > this.maxEntries) {
+      const oldest = this.entries.keys().next().value as string;
+      this.entries.delete(oldest);
+    }
+  }
+
+  get size(): number {
+    return this.entries.size;
+  }
+}
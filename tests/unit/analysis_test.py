@@ -4,22 +4,91 @@ Unit tests for Phase 3 analysis scripts.
 """
 
 import unittest
+import numpy as np
 import pandas as pd
+import copy
+import importlib.util
+import io
 import json
 import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
 from scripts.analysis import (
     load_ca_stores,
     filter_ca_stores,
+    filter_states,
+    resolve_states,
+    analyze_by_state,
+    run_state_request,
     calculate_otd_percentage,
+    safe_mean,
     normalize_carrier_name,
+    normalize_carriers,
+    load_nash_data,
+    load_cached_frame,
+    iter_nash_data,
+    rows_to_columnar,
+    load_store_registry,
+    load_rate_cards,
+    parse_cli_request,
+    load_request_dataset,
+    sort_by_date,
+    restore_upload_order,
+    slice_dates,
+    load_request_rate_cards,
+    save_cached_frame,
     PROJECT_ROOT
 )
+from scripts.analysis.cube import build_metrics_cube, rollup_cube, load_request_cube, ROLLUP_VERSIONS_KEPT
 from scripts.analysis.dashboard import calculate_dashboard_metrics
-from scripts.analysis.cpd_analysis import calculate_van_cpd, compare_cpd
+from scripts.analysis.cpd_analysis import (
+    calculate_van_cpd,
+    compare_cpd,
+    compare_cpd_scenarios,
+    sweep_min_batch_size,
+    calculate_trip_cost,
+    calculate_trip_costs,
+    calculate_trip_costs_as_of,
+    calculate_cpd_by_carrier
+)
 from scripts.analysis.store_analysis import analyze_store
-from scripts.analysis.vendor_analysis import analyze_vendors
-from scripts.analysis.batch_analysis import analyze_batch_density, batch_size_distribution
-from scripts.analysis.performance import calculate_performance_metrics
+from scripts.analysis.vendor_analysis import analyze_vendors, compare_vendor_efficiency
+from scripts.analysis.batch_analysis import (
+    analyze_batch_density,
+    batch_size_distribution,
+    get_trip_level_batch_data,
+    summarize_trip_batches
+)
+from scripts.analysis.all_stores import analyze_all_stores
+from scripts.analysis.performance import (
+    calculate_performance_metrics,
+    calculate_delivery_success_rates,
+    calculate_latency_percentiles
+)
+from scripts.analysis.courier_analytics import courier_stats, select_ranked, rank_couriers, parse_ranking_params
+from scripts.analysis.otd_heatmap import parse_timestamps, analyze_otd_heatmap
+from scripts.analysis.distinct_counts import (
+    build_distinct_sketches,
+    merge_distinct_sketches,
+    distinct_counts,
+    analyze_distinct_counts,
+    load_request_distinct_sketches
+)
+from scripts.analysis.sketches import (
+    build_quantile_sketches,
+    merge_sketches,
+    sketch_quantiles,
+    sketch_nash_file,
+    load_request_sketches
+)
+from scripts.analysis.weekly_metrics import analyze_weekly_metrics, analyze_store_week_matrix
+from scripts.analysis.ingest import ingest_nash_file
+from scripts.analysis.precompute import precompute_reports
+from scripts.analysis.bulk_ingest import bulk_ingest
+from scripts.validate_nash import evaluate_data_quality_rules
+from scripts.benchmark_startup import ENTRY_POINTS, measure_import
 
 
 class TestUtilities(unittest.TestCase):
@@ -83,6 +152,47 @@ class TestCPDCalculation(unittest.TestCase):
         self.assertAlmostEqual(cpd, expected, places=2)
 
 
+class TestTieredRateCards(unittest.TestCase):
+    """Test tiered rate cards with per-stop surcharges."""
+
+    def setUp(self):
+        """Set up a four-tier card (tiers listed out of order)."""
+        self.tiered_card = {
+            'tiers': [
+                {'max_orders': None, 'rate': 450.0},
+                {'max_orders': 40, 'rate': 300.0},
+                {'max_orders': 80, 'rate': 380.0},
+                {'max_orders': 100, 'rate': 400.0}
+            ],
+            'per_stop_surcharge': 0.5,
+            'contractual_adjustment': 1.1
+        }
+
+    def test_tier_boundaries(self):
+        """Test that each batch size picks its tier, boundaries inclusive."""
+        for batch_size, rate in ((10, 300.0), (40, 300.0), (41, 380.0), (80, 380.0), (100, 400.0), (101, 450.0)):
+            with self.subTest(batch_size=batch_size):
+                expected = (rate + 0.5 * batch_size) * 1.1
+                self.assertAlmostEqual(calculate_trip_cost(self.tiered_card, batch_size), expected)
+
+    def test_vectorized_matches_scalar(self):
+        """Test that calculate_trip_costs agrees with calculate_trip_cost for mixed card styles."""
+        legacy_card = {'base_rate_80': 370.0, 'base_rate_100': 395.0, 'contractual_adjustment': 0.98}
+        rate_cards = {'vendors': {'FDC': self.tiered_card, 'FOX': legacy_card}}
+        carriers = pd.Series(['FDC', 'FOX', 'FDC', 'FOX', 'NTG', 'FDC'])
+        batch_sizes = [40, 80, 81, 81, 50, 150]
+
+        costs = calculate_trip_costs(carriers, batch_sizes, rate_cards)
+
+        for cost, carrier, batch_size in zip(costs, carriers, batch_sizes):
+            if carrier == 'NTG':
+                self.assertTrue(pd.isna(cost))
+            else:
+                self.assertAlmostEqual(cost, calculate_trip_cost(rate_cards['vendors'][carrier], batch_size))
+        self.assertAlmostEqual(costs[1], 370.0 * 0.98)
+        self.assertAlmostEqual(costs[3], 395.0 * 0.98)
+
+
 class TestAnalysisScripts(unittest.TestCase):
     """Test analysis scripts with sample data."""
 
@@ -95,12 +205,12 @@ class TestAnalysisScripts(unittest.TestCase):
         cls.nash_df['Store Id'] = cls.nash_df['Store Id'].astype(str)
 
         # Load store registry
-        registry_path = os.path.join(PROJECT_ROOT, 'data', 'ca_store_registry.json')
+        registry_path = os.path.join(PROJECT_ROOT, 'tests', 'fixtures', 'ca_store_registry.json')
         with open(registry_path, 'r') as f:
             cls.store_registry = json.load(f)
 
         # Load rate cards
-        rates_path = os.path.join(PROJECT_ROOT, 'data', 'ca_rate_cards.json')
+        rates_path = os.path.join(PROJECT_ROOT, 'tests', 'fixtures', 'ca_rate_cards.json')
         with open(rates_path, 'r') as f:
             cls.rate_cards = json.load(f)
 
@@ -214,6 +324,1289 @@ class TestAnalysisScripts(unittest.TestCase):
         self.assertIn('delivered_orders', delivery)
         self.assertIn('otd_percentage', delivery)
 
+    def test_performance_matches_column_scans(self):
+        """Test that the single aggregation pass matches per-column scans."""
+        nash_df = self.nash_df.copy()
+        nash_df.loc[::4, 'Driver Dwell Time'] = float('nan')
+        ca_df = filter_ca_stores(nash_df.copy())
+
+        performance = calculate_performance_metrics(nash_df)
+        success = calculate_delivery_success_rates(nash_df)
+
+        self.assertEqual(performance['timing']['avg_driver_dwell_time'], round(safe_mean(ca_df['Driver Dwell Time']), 2))
+        self.assertEqual(performance['delivery']['otd_percentage'], round(calculate_otd_percentage(ca_df), 2))
+        self.assertEqual(performance['delivery']['pending_orders'], int(ca_df['Pending Orders'].sum()))
+
+        carriers = normalize_carriers(ca_df['Carrier'])
+        self.assertEqual(list(success['by_carrier']), carriers.unique().tolist())
+        for carrier, breakdown in success['by_carrier'].items():
+            self.assertEqual(breakdown['total_orders'], int(ca_df.loc[carriers == carrier, 'Total Orders'].sum()))
+        self.assertEqual(
+            sum(b['delivered'] for b in success['by_carrier'].values()),
+            success['overall']['delivered']
+        )
+
+
+class _AllStoresCATestCase(unittest.TestCase):
+    """Example data with every store treated as CA."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Load example data with every store treated as CA."""
+        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        cls.nash_df = pd.read_csv(nash_path)
+        cls.all_stores = cls.nash_df['Store Id'].astype(str).unique().tolist()
+        cls.rate_cards = {'vendors': {
+            'FOX': {'base_rate_80': 380.0, 'base_rate_100': 390.0, 'contractual_adjustment': 1.0},
+            'NTG': {'base_rate_80': 375.0, 'base_rate_100': 385.0, 'contractual_adjustment': 1.02},
+            'FDC': {'base_rate_80': 370.0, 'base_rate_100': 395.0, 'contractual_adjustment': 0.98}
+        }}
+        cls.store_registry = {'stores': {'1916': {'spark_cpd': 5.2}}}
+
+    def setUp(self):
+        patcher = mock.patch(
+            'scripts.analysis.load_store_states',
+            return_value={store_id: 'CA' for store_id in self.all_stores}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestColumnarOutput(_AllStoresCATestCase):
+    """Test struct-of-arrays output mode."""
+
+    def test_rows_to_columnar(self):
+        """Test transposition and dictionary encoding."""
+        rows = [{'carrier': 'FOX', 'n': 1}, {'carrier': 'NTG', 'n': 2}, {'carrier': 'FOX', 'n': 3}]
+        columns = rows_to_columnar(rows, categorical=('carrier',))
+
+        self.assertEqual(columns['carrier'], [0, 1, 0])
+        self.assertEqual(columns['carrier_dict'], ['FOX', 'NTG'])
+        self.assertEqual(columns['n'], [1, 2, 3])
+        self.assertEqual(rows_to_columnar([]), {})
+        self.assertEqual(
+            rows_to_columnar([], categorical=('carrier',), columns=('carrier', 'n')),
+            {'carrier': [], 'n': [], 'carrier_dict': []}
+        )
+
+    def test_trip_level_columnar_matches_rows(self):
+        """Test that decoded columnar batches equal the row output."""
+        rows = get_trip_level_batch_data(self.nash_df, self.rate_cards)['batches']
+        columns = get_trip_level_batch_data(self.nash_df, self.rate_cards, 'columnar')['batches']
+
+        self.assertGreater(len(rows), 0)
+        self.assertEqual([columns['carrier_dict'][c] for c in columns['carrier']], [r['carrier'] for r in rows])
+        self.assertEqual(columns['batch_size'], [r['batch_size'] for r in rows])
+        for cpd, row in zip(columns['cpd'], rows):
+            # NumPy and Python rounding may disagree on exact binary ties
+            self.assertAlmostEqual(cpd, row['cpd'], delta=0.0100001)
+        self.assertIsInstance(columns['batch_size'][0], int)
+
+    def test_trip_level_empty_columnar(self):
+        """Test that an empty columnar payload keeps its keys."""
+        columns = get_trip_level_batch_data(pd.DataFrame(), self.rate_cards, 'columnar')['batches']
+        self.assertEqual(columns, {'carrier': [], 'carrier_dict': [], 'batch_size': [], 'cpd': []})
+
+    def test_cpd_and_stores_columnar(self):
+        """Test columnar stores for compare_cpd and analyze_all_stores."""
+        rows = compare_cpd(self.nash_df, self.store_registry, self.rate_cards, min_batch_size=30)
+        columns = compare_cpd(
+            self.nash_df, self.store_registry, self.rate_cards,
+            min_batch_size=30, output_format='columnar'
+        )
+
+        self.assertEqual(columns['stores'], rows_to_columnar(rows['stores']))
+        self.assertEqual(columns['overall'], rows['overall'])
+        excluded = columns['exclusions']['excluded_trips']
+        self.assertGreater(rows['exclusions']['total_excluded'], 0)
+        self.assertEqual(len(excluded['carrier']), rows['exclusions']['total_excluded'])
+        self.assertIn('reason_dict', excluded)
+
+        store_rows = analyze_all_stores(self.nash_df, self.store_registry, self.rate_cards)
+        store_columns = analyze_all_stores(self.nash_df, self.store_registry, self.rate_cards, 'columnar')
+        self.assertEqual(store_columns['stores']['store_id'], [s['store_id'] for s in store_rows['stores']])
+
+    def test_empty_columnar_keeps_schema(self):
+        """Test that columnar payloads with no rows keep their keys."""
+        nash_df = self.nash_df.iloc[:0]
+        cpd = compare_cpd(nash_df, self.store_registry, self.rate_cards, output_format='columnar')
+        full = compare_cpd(self.nash_df, self.store_registry, self.rate_cards, min_batch_size=30, output_format='columnar')
+        self.assertEqual(cpd['stores'], {key: [] for key in full['stores']})
+        self.assertEqual(
+            cpd['exclusions']['excluded_trips'],
+            {key: [] for key in full['exclusions']['excluded_trips']}
+        )
+
+        stores = analyze_all_stores(nash_df, self.store_registry, self.rate_cards, 'columnar')['stores']
+        full_stores = analyze_all_stores(self.nash_df, self.store_registry, self.rate_cards, 'columnar')['stores']
+        self.assertEqual(stores, {key: [] for key in full_stores})
+
+        scenarios = compare_cpd_scenarios(
+            nash_df, self.store_registry, self.rate_cards, [{'name': 'base'}], output_format='columnar'
+        )['stores']
+        self.assertEqual(scenarios['scenario'], [])
+        self.assertEqual(scenarios['store_id_dict'], [])
+
+
+class TestScatterSummary(_AllStoresCATestCase):
+    """Test bounded batch-size vs CPD scatter modes."""
+
+    def test_aggregate_cells(self):
+        """Test that aggregate cells cover every trip once."""
+        points = get_trip_level_batch_data(self.nash_df, self.rate_cards)['batches']
+        result = summarize_trip_batches(self.nash_df, self.rate_cards, 'aggregate')
+
+        self.assertEqual(result['total_trips'], len(points))
+        self.assertEqual(sum(c['count'] for c in result['cells']), len(points))
+        keys = {(c['carrier'], c['batch_size']) for c in result['cells']}
+        self.assertEqual(keys, {(p['carrier'], p['batch_size']) for p in points})
+
+    def test_binned(self):
+        """Test 2D bins of batch size and CPD."""
+        result = summarize_trip_batches(self.nash_df, self.rate_cards, 'binned', bin_width=10, cpd_bin_width=1.0)
+
+        self.assertEqual(sum(b['count'] for b in result['bins']), result['total_trips'])
+        for b in result['bins']:
+            self.assertEqual(b['batch_size_start'] % 10, 0)
+            self.assertTrue(b['batch_size_start'] <= b['avg_batch_size'] < b['batch_size_start'] + 10)
+            self.assertTrue(b['cpd_start'] <= b['avg_cpd'] < b['cpd_start'] + 1.0)
+
+    def test_sample_cap(self):
+        """Test that sampling caps points and keeps every carrier."""
+        result = summarize_trip_batches(self.nash_df, self.rate_cards, 'sample', max_points=5)
+        carriers = {p['carrier'] for p in get_trip_level_batch_data(self.nash_df, self.rate_cards)['batches']}
+
+        self.assertLessEqual(len(result['batches']), 5)
+        self.assertEqual({p['carrier'] for p in result['batches']}, carriers)
+
+    def test_columnar_and_invalid_mode(self):
+        """Test columnar encoding and rejection of unknown modes."""
+        rows = summarize_trip_batches(self.nash_df, self.rate_cards, 'aggregate')['cells']
+        columns = summarize_trip_batches(self.nash_df, self.rate_cards, 'aggregate', output_format='columnar')['cells']
+
+        self.assertEqual(columns['count'], [c['count'] for c in rows])
+        self.assertEqual([columns['carrier_dict'][c] for c in columns['carrier']], [c['carrier'] for c in rows])
+        with self.assertRaises(ValueError):
+            summarize_trip_batches(self.nash_df, self.rate_cards, 'hexbin')
+
+
+class TestRateCardHistory(_AllStoresCATestCase):
+    """Test effective-dated rate card versions."""
+
+    def versioned_rate_cards(self, effective_from):
+        """FOX and NTG repriced from effective_from, with the old rates in history."""
+        vendors = {}
+        for vendor, card in self.rate_cards['vendors'].items():
+            vendors[vendor] = {
+                **card,
+                'base_rate_80': card['base_rate_80'] + 100,
+                'base_rate_100': card['base_rate_100'] + 100,
+                'effective_from': effective_from,
+                'history': [dict(card)]
+            }
+        return {'vendors': vendors}
+
+    def test_as_of_versions(self):
+        """Test that each trip is priced with the version in force on its date."""
+        rate_cards = {'vendors': {'FOX': {
+            'base_rate_80': 400.0, 'base_rate_100': 410.0, 'effective_from': '2025-07-01',
+            'history': [
+                {'base_rate_80': 300.0, 'base_rate_100': 310.0},
+                {'effective_from': '2025-04-01', 'base_rate_80': 380.0, 'base_rate_100': 390.0}
+            ]
+        }}}
+        carriers = pd.Series(['FOX', 'FOX', 'FOX', 'FOX', 'NTG'])
+        dates = pd.Series(['2025-03-31', '2025-04-01', '2025-07-01', None, '2025-05-01'])
+
+        costs = calculate_trip_costs_as_of(carriers, [50] * 5, dates, rate_cards)
+
+        self.assertEqual(costs[:4].tolist(), [300.0, 380.0, 400.0, 400.0])
+        self.assertTrue(pd.isna(costs[4]))
+
+    def test_cpd_by_carrier_matches_per_trip(self):
+        """Test that the columnar carrier CPD averages per-trip CPDs."""
+        nash_df = self.nash_df.copy()
+        nash_df['Date'] = pd.to_datetime(nash_df['Date'], format='mixed').dt.normalize()
+        nash_df.loc[::2, 'Date'] -= pd.Timedelta(days=14)
+        rate_cards = self.versioned_rate_cards(nash_df['Date'].max().strftime('%Y-%m-%d'))
+
+        expected = {}
+        for _, row in nash_df.iterrows():
+            carrier = normalize_carrier_name(row['Carrier'])
+            card = rate_cards['vendors'].get(carrier)
+            if card and row['Total Orders'] > 0:
+                expected.setdefault(carrier, []).append(
+                    calculate_van_cpd(row.to_dict(), card, int(row['Total Orders']))
+                )
+
+        result = calculate_cpd_by_carrier(nash_df, rate_cards)
+        self.assertEqual(list(result), list(expected))
+        for carrier, values in expected.items():
+            self.assertAlmostEqual(result[carrier], sum(values) / len(values), delta=0.0050001)
+
+    def test_weekly_cpd_keeps_historical_rates(self):
+        """Test that a rate change only reprices weeks after it took effect."""
+        # Spread the example trips over two weeks
+        nash_df = self.nash_df.copy()
+        nash_df['Date'] = pd.to_datetime(nash_df['Date'], format='mixed').dt.normalize()
+        nash_df.loc[::2, 'Date'] -= pd.Timedelta(days=14)
+        cutover = nash_df['Date'].max().strftime('%Y-%m-%d')
+
+        flat = analyze_weekly_metrics(nash_df, self.rate_cards)['weeks']
+        versioned = analyze_weekly_metrics(nash_df, self.versioned_rate_cards(cutover))['weeks']
+
+        self.assertEqual(len(versioned), 2)
+        self.assertEqual(versioned[0]['avg_cpd'], flat[0]['avg_cpd'])
+        self.assertGreater(versioned[1]['avg_cpd'], flat[1]['avg_cpd'])
+
+        # Without history the as-of path is the plain vectorized pricing
+        carriers = pd.Series(['FOX', 'NTG'])
+        self.assertEqual(
+            calculate_trip_costs_as_of(carriers, [50, 90], pd.Series(['2025-01-01', None]), self.rate_cards).tolist(),
+            calculate_trip_costs(carriers, [50, 90], self.rate_cards).tolist()
+        )
+
+
+    def test_aggregate_cells_average_rate_versions(self):
+        """Test that a scatter cell spanning rate versions reports its mean CPD."""
+        nash_df = self.nash_df.copy()
+        nash_df['Date'] = pd.to_datetime(nash_df['Date'], format='mixed').dt.normalize()
+        nash_df.loc[::2, 'Date'] -= pd.Timedelta(days=14)
+        rate_cards = self.versioned_rate_cards(nash_df['Date'].max().strftime('%Y-%m-%d'))
+
+        points = pd.DataFrame(get_trip_level_batch_data(nash_df, rate_cards)['batches'])
+        cells = summarize_trip_batches(nash_df, rate_cards, 'aggregate')['cells']
+        means = points.groupby(['carrier', 'batch_size'])['cpd'].mean()
+
+        self.assertGreater(points.groupby(['carrier', 'batch_size'])['cpd'].nunique().max(), 1)
+        for cell in cells:
+            self.assertAlmostEqual(cell['cpd'], means[(cell['carrier'], cell['batch_size'])], delta=0.01)
+
+    def test_scenarios_keep_historical_rates(self):
+        """Test that the base scenario prices each trip as compare_cpd does."""
+        nash_df = self.nash_df.copy()
+        nash_df['Date'] = pd.to_datetime(nash_df['Date'], format='mixed').dt.normalize()
+        nash_df.loc[::2, 'Date'] -= pd.Timedelta(days=14)
+        rate_cards = self.versioned_rate_cards(nash_df['Date'].max().strftime('%Y-%m-%d'))
+
+        base = compare_cpd(nash_df, self.store_registry, rate_cards)
+        result = compare_cpd_scenarios(nash_df, self.store_registry, rate_cards, [{'name': 'base'}])
+
+        self.assertEqual(result['scenarios'][0]['overall'], base['overall'])
+        expected = {s['store_id']: s['van_cpd'] for s in base['stores']}
+        self.assertEqual({s['store_id']: s['van_cpd'] for s in result['stores']}, expected)
+        self.assertNotEqual(
+            base['overall'],
+            compare_cpd_scenarios(nash_df, self.store_registry, self.rate_cards, [{'name': 'flat'}])['scenarios'][0]['overall']
+        )
+
+
+class TestCpdScenarios(_AllStoresCATestCase):
+    """Test batched what-if rate-card evaluation."""
+
+    def test_base_scenario_matches_compare_cpd(self):
+        """Test that an empty override reproduces compare_cpd."""
+        base = compare_cpd(self.nash_df, self.store_registry, self.rate_cards, min_batch_size=30)
+        result = compare_cpd_scenarios(
+            self.nash_df, self.store_registry, self.rate_cards, [{'name': 'base'}], min_batch_size=30
+        )
+
+        self.assertEqual(result['scenarios'][0]['overall'], base['overall'])
+        self.assertEqual(result['exclusions']['total_excluded'], base['exclusions']['total_excluded'])
+        expected = {s['store_id']: s['van_cpd'] for s in base['stores']}
+        self.assertEqual({s['store_id']: s['van_cpd'] for s in result['stores']}, expected)
+
+    def test_overrides_apply_per_scenario(self):
+        """Test that a rate cut lowers CPD only in its own scenario."""
+        scenarios = [
+            {'name': 'base'},
+            {'name': 'fdc_cut', 'vendors': {'FDC': {'base_rate_80': 300.0, 'base_rate_100': 300.0}}},
+            {'name': 'no_ntg', 'vendors': {'NTG': {'base_rate_80': 0.0, 'base_rate_100': 0.0}}}
+        ]
+        result = compare_cpd_scenarios(self.nash_df, self.store_registry, self.rate_cards, scenarios)
+        overall = {s['name']: s['overall']['avg_van_cpd'] for s in result['scenarios']}
+
+        self.assertLess(overall['fdc_cut'], overall['base'])
+        self.assertLess(overall['no_ntg'], overall['fdc_cut'])
+        self.assertEqual(self.rate_cards['vendors']['FDC']['base_rate_80'], 370.0)
+
+        columns = compare_cpd_scenarios(
+            self.nash_df, self.store_registry, self.rate_cards, scenarios, output_format='columnar'
+        )['stores']
+        self.assertEqual(columns['scenario_dict'], ['base', 'fdc_cut', 'no_ntg'])
+        self.assertEqual(len(columns['scenario']), len(result['stores']))
+
+    def test_tiered_card_overrides(self):
+        """Test that legacy rates on a tiered card are rejected, tiers apply."""
+        rate_cards = copy.deepcopy(self.rate_cards)
+        rate_cards['vendors']['FDC'] = {
+            'tiers': [{'max_orders': 80, 'rate': 370.0}, {'max_orders': None, 'rate': 395.0}],
+            'contractual_adjustment': 0.98
+        }
+
+        with self.assertRaises(ValueError):
+            compare_cpd_scenarios(
+                self.nash_df, self.store_registry, rate_cards,
+                [{'name': 'fdc_cut', 'vendors': {'FDC': {'base_rate_100': 100.0}}}]
+            )
+
+        cut_tiers = [{'max_orders': 80, 'rate': 370.0}, {'max_orders': None, 'rate': 100.0}]
+        result = compare_cpd_scenarios(
+            self.nash_df, self.store_registry, rate_cards,
+            [{'name': 'base'}, {'name': 'fdc_cut', 'vendors': {'FDC': {'tiers': cut_tiers}}}]
+        )
+        overall = {s['name']: s['overall']['avg_van_cpd'] for s in result['scenarios']}
+        self.assertLess(overall['fdc_cut'], overall['base'])
+
+
+class TestThresholdSweep(_AllStoresCATestCase):
+    """Test the min_batch_size sweep against compare_cpd."""
+
+    def test_sweep_matches_compare_cpd(self):
+        """Test every threshold against a full compare_cpd run."""
+        sweep = sweep_min_batch_size(self.nash_df, self.rate_cards, max_threshold=60)
+        self.assertEqual(sweep['min_batch_sizes'], list(range(1, 61)))
+
+        for threshold in (1, 10, 30, 45, 60):
+            i = threshold - 1
+            result = compare_cpd(self.nash_df, self.store_registry, self.rate_cards, min_batch_size=threshold)
+            with self.subTest(min_batch_size=threshold):
+                self.assertEqual(sweep['overall']['avg_van_cpd'][i], result['overall']['avg_van_cpd'])
+                self.assertEqual(sweep['overall']['excluded_trips'][i], result['exclusions']['total_excluded'])
+                expected = {s['store_id']: s['van_cpd'] for s in result['stores']}
+                actual = {s['store_id']: s['van_cpd'][i] for s in sweep['stores'] if s['van_cpd'][i] > 0}
+                self.assertEqual(actual, expected)
+
+    def test_excluded_orders_monotonic(self):
+        """Test that raising the threshold never excludes fewer orders."""
+        orders = sweep_min_batch_size(self.nash_df, self.rate_cards, max_threshold=100)['overall']['excluded_orders']
+        self.assertEqual(orders, sorted(orders))
+        self.assertEqual(orders[0], 0)
+
+
+class TestStates(unittest.TestCase):
+    """Test state selection and per-state analysis."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Load example data (stores in FL, TX, CA and others)."""
+        nash_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        cls.nash_df = load_nash_data(nash_path)
+
+    def test_resolve_states(self):
+        """Test state selector normalization."""
+        self.assertEqual(resolve_states(None), ('CA',))
+        self.assertEqual(resolve_states('tx, ca'), ('TX', 'CA'))
+        self.assertEqual(resolve_states(['FL', 'FL']), ('FL',))
+        self.assertIsNone(resolve_states('ALL'))
+        with self.assertRaises(ValueError):
+            resolve_states('')
+
+    def test_filter_states(self):
+        """Test filtering to one or more states."""
+        ca_df = filter_ca_stores(self.nash_df.copy())
+        self.assertTrue(filter_states(self.nash_df.copy()).equals(ca_df))
+
+        tx_fl = filter_states(self.nash_df.copy(), 'TX,FL')
+        self.assertEqual(len(tx_fl), 41)
+        self.assertEqual(len(filter_states(self.nash_df.copy(), 'ALL')), len(self.nash_df))
+
+    def test_analyze_by_state_matches_filtered_runs(self):
+        """Test that the partitioned run equals one filtered run per state."""
+        result = analyze_by_state(calculate_performance_metrics, self.nash_df)
+
+        self.assertEqual(list(result['states']), ['CA', 'FL', 'IN', 'MD', 'MI', 'NC', 'PA', 'TN', 'TX', 'VA'])
+        for state in ('CA', 'TX'):
+            self.assertEqual(
+                result['states'][state],
+                calculate_performance_metrics(self.nash_df, states=state)
+            )
+
+    def test_listed_states_without_trips(self):
+        """Test that explicitly listed states are always keyed."""
+        result = analyze_by_state(batch_size_distribution, self.nash_df, states=['WY', 'TX'])
+
+        self.assertEqual(list(result['states']), ['TX', 'WY'])
+        self.assertEqual(result['states']['WY'], batch_size_distribution(self.nash_df.iloc[0:0]))
+
+    def test_parallel_workers(self):
+        """Test that per-state workers return the sequential result."""
+        sequential = analyze_by_state(calculate_performance_metrics, self.nash_df, states='TX,FL,CA')
+        parallel = analyze_by_state(calculate_performance_metrics, self.nash_df, states='TX,FL,CA', workers=2)
+        self.assertEqual(parallel, sequential)
+
+    def test_run_state_request(self):
+        """Test that results are keyed by state only when a state is requested."""
+        self.assertEqual(
+            run_state_request(calculate_performance_metrics, self.nash_df, {}),
+            calculate_performance_metrics(self.nash_df)
+        )
+        keyed = run_state_request(calculate_performance_metrics, self.nash_df, {'state': 'FL'})
+        self.assertEqual(list(keyed['states']), ['FL'])
+
+
+class TestDateSlicing(unittest.TestCase):
+    """Test date-sorted datasets and range slicing."""
+
+    def setUp(self):
+        self.nash_df = pd.DataFrame({
+            'Date': pd.to_datetime(['2025-10-08', None, '2025-10-01', '2025-10-05', '2025-10-01 14:00'], format='mixed'),
+            'Total Orders': [10, 20, 30, 40, 50]
+        })
+
+    def test_sort_by_date(self):
+        """Test a stable sort with undated trips last, flagged as sorted."""
+        sorted_df = sort_by_date(self.nash_df)
+
+        self.assertEqual(sorted_df['Total Orders'].tolist(), [30, 50, 40, 10, 20])
+        self.assertTrue(sorted_df.attrs['sorted_by_date'])
+        # Already in order: returned as is
+        self.assertIs(sort_by_date(sorted_df), sorted_df)
+
+    def test_slice_matches_mask(self):
+        """Test that a binary-search slice equals a boolean mask filter."""
+        sorted_df = sort_by_date(self.nash_df)
+        dates = sorted_df['Date']
+
+        for start, end in (('2025-10-01', '2025-10-05'), ('2025-10-02', None), (None, '2025-10-01')):
+            with self.subTest(start=start, end=end):
+                mask = dates.notna()
+                if start:
+                    mask &= dates >= start
+                if end:
+                    mask &= dates < pd.Timestamp(end) + pd.Timedelta(days=1)
+                pd.testing.assert_frame_equal(slice_dates(sorted_df, start, end), sorted_df[mask])
+
+        self.assertTrue(slice_dates(sorted_df, '2025-10-09').empty)
+        self.assertTrue(slice_dates(sorted_df, '2025-10-05', '2025-10-01').empty)
+        self.assertIs(slice_dates(sorted_df), sorted_df)
+        # Unsorted frames are sorted first
+        self.assertEqual(slice_dates(self.nash_df, '2025-10-05')['Total Orders'].tolist(), [40, 10])
+
+    def test_slice_is_view(self):
+        """Test that a slice shares the sorted frame's data."""
+        sorted_df = sort_by_date(self.nash_df)
+        window = slice_dates(sorted_df, '2025-10-05', '2025-10-08')
+
+        self.assertTrue(np.shares_memory(window['Total Orders'].to_numpy(), sorted_df['Total Orders'].to_numpy()))
+
+    def test_restore_upload_order(self):
+        """Test that sorted frames and their slices go back to upload order."""
+        pd.testing.assert_frame_equal(restore_upload_order(sort_by_date(self.nash_df)), self.nash_df)
+
+        window = restore_upload_order(slice_dates(self.nash_df, '2025-10-01', '2025-10-05'))
+        self.assertEqual(window['Total Orders'].tolist(), [30, 40, 50])
+        self.assertFalse(window.attrs.get('sorted_by_date'))
+
+    def test_invalid_bound(self):
+        """Test that a bound that is not a date is rejected."""
+        with self.assertRaises(ValueError):
+            slice_dates(self.nash_df, 'last week')
+
+    def test_request_date_range(self):
+        """Test that start / end params slice the loaded dataset."""
+        csv_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+
+        in_range = load_request_dataset({'dataset': csv_path, 'params': {'start': '2025-10-08', 'end': '2025-10-08'}})
+        after = load_request_dataset({'dataset': csv_path, 'params': {'start': '2025-10-09'}})
+
+        self.assertEqual(len(in_range), 61)
+        self.assertTrue(after.empty)
+
+
+class TestCliRequest(unittest.TestCase):
+    """Test the analysis CLI request envelope."""
+
+    def test_positional_arguments(self):
+        """Test that positional arguments and options map onto a request."""
+        request = parse_cli_request(
+            ['nash.csv', '2082', 'analytics.db', 'analytics.db', '--format=columnar'],
+            ('dataset', 'store_id', 'registry_path', 'rate_cards_path')
+        )
+
+        self.assertEqual(request['dataset'], 'nash.csv')
+        self.assertEqual(request['rate_cards_path'], 'analytics.db')
+        self.assertEqual(request['params'], {'format': 'columnar', 'store_id': '2082'})
+        self.assertIsNone(parse_cli_request(['nash.csv'], ('dataset', 'rate_cards_path')))
+
+    def test_stdin_envelope(self):
+        """Test that --stdin reads the request, with inline rate cards."""
+        envelope = {
+            "dataset": "nash.csv",
+            "rate_cards": {"vendors": {"FOX": {"base_rate_80": 380.0}}},
+            "params": {"scenarios": [{"name": "base"}]}
+        }
+        with mock.patch('sys.stdin', io.StringIO(json.dumps(envelope))):
+            request = parse_cli_request(['--stdin'], ('dataset', 'rate_cards_path'))
+
+        self.assertEqual(request['params']['scenarios'], [{"name": "base"}])
+        self.assertEqual(load_request_rate_cards(request, ['FOX']), envelope['rate_cards'])
+
+    def test_dataset_by_cache_key(self):
+        """Test that a cache key loads the cleaned frame saved at ingest."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        csv_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+
+        with mock.patch.dict(os.environ, {'NASH_CACHE_DIR': tmp_dir}):
+            clean_df = load_nash_data(csv_path)
+            cache_path = save_cached_frame(clean_df, csv_path)
+            key = os.path.splitext(os.path.basename(cache_path))[0]
+
+            loaded = load_request_dataset({'cache_key': key})
+
+        pd.testing.assert_frame_equal(loaded, clean_df)
+
+
+class TestStoreDatabase(unittest.TestCase):
+    """Test reading the registry and rate cards from the SQLite data store."""
+
+    def setUp(self):
+        """Build a data store with the schema the Node server creates."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.db_path = os.path.join(self.tmp_dir, 'analytics.db')
+
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript("""
+            CREATE TABLE stores (
+                store_id TEXT PRIMARY KEY, spark_cpd REAL, target_batch_size REAL,
+                last_seen_in_upload TEXT, status TEXT NOT NULL DEFAULT 'active'
+            );
+            CREATE TABLE rate_cards (vendor TEXT PRIMARY KEY, card TEXT NOT NULL);
+            CREATE TABLE metadata (name TEXT PRIMARY KEY, last_updated TEXT NOT NULL, version TEXT NOT NULL);
+        """)
+        conn.executemany(
+            "INSERT INTO stores VALUES (?, ?, ?, ?, ?)",
+            [('2082', 5.6, 92, None, 'active'), ('2242', 6.2, None, '2025-10-01', 'active'),
+             ('9999', None, None, None, 'inactive')]
+        )
+        conn.executemany(
+            "INSERT INTO rate_cards VALUES (?, ?)",
+            [(vendor, json.dumps({"base_rate_80": rate, "base_rate_100": rate + 10,
+                                  "contractual_adjustment": 1.0}))
+             for vendor, rate in [('FOX', 380.0), ('NTG', 390.0), ('FDC', 400.0)]]
+        )
+        conn.execute("INSERT INTO metadata VALUES ('registry', '2025-10-01T00:00:00Z', '1.0')")
+        conn.commit()
+        conn.close()
+
+    def test_loads_only_requested_stores(self):
+        """Test that only the requested stores are read, without null fields."""
+        registry = load_store_registry(self.db_path, ['2082', '2242', '1234'])
+
+        self.assertEqual(set(registry['stores']), {'2082', '2242'})
+        self.assertEqual(registry['stores']['2082'],
+                         {'spark_cpd': 5.6, 'target_batch_size': 92, 'status': 'active'})
+        self.assertNotIn('target_batch_size', registry['stores']['2242'])
+        self.assertEqual(registry['version'], '1.0')
+        self.assertEqual(len(load_store_registry(self.db_path)['stores']), 3)
+
+    def test_loads_only_requested_vendors(self):
+        """Test that rate cards are read per vendor and decoded from JSON."""
+        rate_cards = load_rate_cards(self.db_path, ['FOX', 'NTG'])
+
+        self.assertEqual(set(rate_cards['vendors']), {'FOX', 'NTG'})
+        self.assertEqual(rate_cards['vendors']['NTG']['base_rate_100'], 400.0)
+
+    def test_json_paths_still_supported(self):
+        """Test that JSON registry / rate card files load as before."""
+        json_path = os.path.join(self.tmp_dir, 'rate_cards.json')
+        with open(json_path, 'w') as f:
+            json.dump({"vendors": {"FOX": {"base_rate_80": 380.0}}}, f)
+
+        self.assertEqual(load_rate_cards(json_path, ['NTG'])['vendors'], {"FOX": {"base_rate_80": 380.0}})
+
+
+class TestPrecompute(_AllStoresCATestCase):
+    """Test the post-upload precompute of every report."""
+
+    def setUp(self):
+        super().setUp()
+        self.clean_df = load_nash_data(os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv'))
+
+    def test_reports_match_individual_analyses(self):
+        """Test that each precomputed payload equals its standalone report."""
+        registry = {"stores": {"2082": {"spark_cpd": 5.6}}}
+        result = precompute_reports(self.clean_df, registry, self.rate_cards)
+
+        self.assertEqual(result['errors'], {})
+        self.assertEqual(set(result['reports']), set(result['seconds']))
+        self.assertEqual(result['reports']['cpd'], compare_cpd(self.clean_df, registry, self.rate_cards))
+        self.assertEqual(result['reports']['weekly'], analyze_weekly_metrics(self.clean_df, self.rate_cards))
+        self.assertEqual(result['reports']['stores'], analyze_all_stores(self.clean_df, registry, self.rate_cards))
+
+    def test_failing_report_is_isolated(self):
+        """Test that one failing report does not stop the others."""
+        with mock.patch('scripts.analysis.precompute.analyze_vendors', side_effect=ValueError('bad card')):
+            result = precompute_reports(self.clean_df, {"stores": {}}, self.rate_cards)
+
+        self.assertEqual(result['errors'], {'vendors': 'bad card'})
+        self.assertIn('dashboard', result['reports'])
+        self.assertNotIn('vendors', result['reports'])
+
+
+class TestStartupBudget(unittest.TestCase):
+    """Test that the analysis CLIs start without loading pandas."""
+
+    # Measured ~20-45 ms; pandas alone costs ~300-450 ms
+    IMPORT_BUDGET_MS = 150
+
+    def test_entry_points_defer_heavy_imports(self):
+        """Test each entry point's import time and deferred modules."""
+        for entry_point in ENTRY_POINTS:
+            with self.subTest(entry_point=entry_point):
+                measured = measure_import(entry_point)
+                self.assertEqual([name for name, deferred in measured['deferred'].items() if not deferred], [])
+                self.assertLess(measured['import_ms'], self.IMPORT_BUDGET_MS)
+
+
+class TestMetricsCube(_AllStoresCATestCase):
+    """Test the store x carrier x day metrics cube."""
+
+    def setUp(self):
+        super().setUp()
+        self.clean_df = load_nash_data(os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv'))
+        # Spread the example trips over several weeks
+        self.clean_df.loc[::2, 'Date'] -= pd.Timedelta(days=14)
+        self.clean_df.loc[::3, 'Date'] -= pd.Timedelta(days=3)
+
+    def test_rollups_match_trip_totals(self):
+        """Test that rollups along any dimensions keep the trip totals."""
+        cube = build_metrics_cube(self.clean_df, self.rate_cards)
+
+        self.assertLess(len(cube), len(self.clean_df))
+        for by in ((), ['Store Id'], ['Carrier_Normalized', 'Date']):
+            rolled = rollup_cube(cube, by)
+            self.assertEqual(rolled['trips'].sum(), len(self.clean_df))
+            self.assertEqual(rolled['orders'].sum(), self.clean_df['Total Orders'].sum())
+            self.assertEqual(rolled['delivered_orders'].sum(), self.clean_df['Delivered Orders'].sum())
+
+        # Groups come back in first-appearance order
+        carriers = rollup_cube(cube, ['Carrier_Normalized'])['Carrier_Normalized'].tolist()
+        self.assertEqual(carriers, normalize_carriers(self.clean_df['Carrier']).unique().tolist())
+
+    def test_reports_from_prebuilt_cube(self):
+        """Test that reports from a shared cube equal the trip-level ones."""
+        cube = build_metrics_cube(self.clean_df, self.rate_cards)
+
+        self.assertEqual(
+            calculate_dashboard_metrics(self.clean_df, self.store_registry, self.rate_cards, cube=cube),
+            calculate_dashboard_metrics(self.clean_df, self.store_registry, self.rate_cards)
+        )
+        self.assertEqual(
+            analyze_vendors(self.clean_df, self.rate_cards, states='FL', cube=cube),
+            analyze_vendors(self.clean_df, self.rate_cards, states='FL')
+        )
+        # A cube built with another threshold is not reused
+        self.assertEqual(
+            analyze_weekly_metrics(self.clean_df, self.rate_cards, min_batch_size=5, cube=cube),
+            analyze_weekly_metrics(self.clean_df, self.rate_cards, min_batch_size=5)
+        )
+
+    def test_vendor_efficiency_from_cube(self):
+        """Test that vendor efficiency rolls up the same cube as vendors."""
+        cube = build_metrics_cube(self.clean_df, self.rate_cards)
+        efficiency = compare_vendor_efficiency(self.clean_df, cube=cube)
+
+        self.assertEqual(list(efficiency), list(analyze_vendors(self.clean_df, self.rate_cards, cube=cube)))
+        self.assertEqual(efficiency, compare_vendor_efficiency(self.clean_df))
+        for vendor, metrics in efficiency.items():
+            vendor_df = self.clean_df[normalize_carriers(self.clean_df['Carrier']) == vendor]
+            self.assertEqual(metrics['avg_load_time'], round(safe_mean(vendor_df['Driver Load Time']), 2))
+            self.assertEqual(
+                metrics['delivery_success_rate'],
+                round(vendor_df['Delivered Orders'].sum() / vendor_df['Total Orders'].sum() * 100, 2)
+            )
+
+    def test_store_week_matrix_matches_weekly(self):
+        """Test that store x week matrices hold the weekly report's store figures."""
+        cube = build_metrics_cube(self.clean_df, self.rate_cards)
+        matrix = analyze_store_week_matrix(self.clean_df, self.rate_cards, cube=cube, encoding='dense')
+        weekly = analyze_weekly_metrics(self.clean_df, self.rate_cards, cube=cube)
+
+        self.assertEqual(matrix['weeks'], [week['week_start'] for week in weekly['weeks']])
+        self.assertEqual(matrix['stores'], sorted(matrix['stores']))
+        for col, week in enumerate(weekly['weeks']):
+            for store in week['stores']:
+                row = matrix['stores'].index(store['store_id'])
+                self.assertEqual(matrix['matrices']['orders'][row][col], store['orders'])
+                self.assertEqual(matrix['matrices']['trips'][row][col], store['trips'])
+                # NumPy and Python rounding may disagree on exact binary ties
+                self.assertAlmostEqual(matrix['matrices']['cpd'][row][col], store['cpd'], delta=0.0100001)
+
+        # Store-weeks without trips are missing, not zero
+        trips = np.array(matrix['matrices']['trips'], dtype=float)
+        self.assertEqual(np.isnan(trips).mean().round(4), round(1 - matrix['density'], 4))
+
+    def test_store_week_matrix_sparse_encoding(self):
+        """Test that the sparse encoding lists exactly the dense non-missing cells."""
+        dense = analyze_store_week_matrix(self.clean_df, self.rate_cards, encoding='dense')
+        sparse = analyze_store_week_matrix(self.clean_df, self.rate_cards, encoding='sparse')
+
+        self.assertEqual(sparse['encoding'], 'sparse')
+        self.assertEqual(len(sparse['rows']), round(dense['density'] * len(dense['stores']) * len(dense['weeks'])))
+        for i, (row, col) in enumerate(zip(sparse['rows'], sparse['cols'])):
+            for name, values in sparse['values'].items():
+                self.assertEqual(values[i], dense['matrices'][name][row][col])
+
+        auto = analyze_store_week_matrix(self.clean_df, self.rate_cards)
+        self.assertEqual(auto['encoding'], 'sparse' if dense['density'] < 0.5 else 'dense')
+        with self.assertRaises(ValueError):
+            analyze_store_week_matrix(self.clean_df, self.rate_cards, encoding='csv')
+
+    def test_cube_cached_per_dataset(self):
+        """Test that a request's cube is built once and then read back."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        request = {'dataset': os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')}
+
+        with mock.patch.dict(os.environ, {'NASH_CACHE_DIR': tmp_dir}):
+            built = load_request_cube(request, self.clean_df, self.rate_cards)
+            with mock.patch('scripts.analysis.cube.build_metrics_cube') as build:
+                cached = load_request_cube(request, self.clean_df, self.rate_cards)
+                build.assert_not_called()
+
+            # Other rate cards price the trips differently: a new cube
+            repriced = load_request_cube(request, self.clean_df, {'vendors': {}})
+
+        pd.testing.assert_frame_equal(cached, built)
+        self.assertEqual(cached.attrs['min_batch_size'], 10)
+        self.assertEqual(repriced['included_cost'].sum(), 0)
+
+    def test_rollup_cache_eviction(self):
+        """Test that old rollup signatures and replaced uploads are evicted."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        csv_path = os.path.join(tmp_dir, 'nash.csv')
+        shutil.copy(os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv'), csv_path)
+        cache_dir = os.path.join(tmp_dir, 'cache')
+
+        def cached(suffix):
+            return sorted(name for name in os.listdir(cache_dir) if suffix in name)
+
+        with mock.patch.dict(os.environ, {'NASH_CACHE_DIR': cache_dir}):
+            frame_path = save_cached_frame(self.clean_df, csv_path)
+            for adjustment in (1.0, 1.1, 1.2, 1.3, 1.4):
+                rate_cards = copy.deepcopy(self.rate_cards)
+                rate_cards['vendors']['FOX']['contractual_adjustment'] = adjustment
+                load_request_cube({'dataset': csv_path}, self.clean_df, rate_cards)
+
+            # Only the latest signatures of the cube stay, the newest included
+            self.assertEqual(len(cached('.cube-')), ROLLUP_VERSIONS_KEPT)
+            with mock.patch('scripts.analysis.cube.build_metrics_cube') as build:
+                load_request_cube({'dataset': csv_path}, self.clean_df, rate_cards)
+                build.assert_not_called()
+
+            # A replaced upload drops the old frame and its rollups
+            with open(csv_path, 'a') as f:
+                f.write('\n')
+            new_frame_path = save_cached_frame(self.clean_df, csv_path)
+            self.assertNotEqual(new_frame_path, frame_path)
+            self.assertEqual(os.listdir(cache_dir), [os.path.basename(new_frame_path)])
+
+
+class TestQuantileSketches(unittest.TestCase):
+    """Test the mergeable quantile sketches."""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        size = 5000
+        self.nash_df = pd.DataFrame({
+            'Store Id': rng.choice(['2082', '5930'], size),
+            'Carrier': rng.choice(['FOX', 'NTG'], size),
+            'Date': pd.Timestamp('2025-09-01') + pd.to_timedelta(rng.integers(0, 28, size), unit='D'),
+            'Driver Dwell Time': np.r_[rng.lognormal(2.5, 1, size - 10), np.zeros(5), -rng.random(5)],
+            'Driver Load Time': rng.uniform(5, 60, size),
+            'Trip Actual Time': np.where(rng.random(size) < 0.1, np.nan, rng.lognormal(4, 0.5, size))
+        })
+
+    def test_quantiles_within_relative_error(self):
+        """Test that sketch quantiles are within 1% of exact quantiles."""
+        sketches = build_quantile_sketches(self.nash_df)
+        table = sketch_quantiles(sketches, ['Carrier_Normalized'], (0.0, 0.5, 0.9, 0.99, 1.0))
+
+        for _, row in table.iterrows():
+            column = {'dwell_time': 'Driver Dwell Time', 'load_time': 'Driver Load Time',
+                      'trip_time': 'Trip Actual Time'}[row['metric']]
+            values = np.sort(self.nash_df.loc[self.nash_df['Carrier'] == row['Carrier_Normalized'], column].dropna())
+            self.assertEqual(row['count'], len(values))
+            for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+                exact = values[int(q * (len(values) - 1))]
+                self.assertLessEqual(abs(row[f"p{q * 100:g}"] - exact), 0.01 * abs(exact) + 1e-9)
+
+    def test_merge_matches_single_pass(self):
+        """Test that merged chunk sketches equal one sketch of all trips."""
+        whole = sketch_quantiles(build_quantile_sketches(self.nash_df), ['Store Id'])
+        merged = merge_sketches(
+            build_quantile_sketches(self.nash_df.iloc[i:i + 700]) for i in range(0, len(self.nash_df), 700)
+        )
+
+        pd.testing.assert_frame_equal(sketch_quantiles(merged, ['Store Id']), whole)
+        with self.assertRaises(ValueError):
+            merge_sketches([build_quantile_sketches(self.nash_df, 0.01), build_quantile_sketches(self.nash_df, 0.05)])
+
+    def test_streaming_loader(self):
+        """Test sketching a CSV chunk by chunk."""
+        csv_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        streamed = sketch_nash_file(csv_path, chunksize=10)
+        loaded = build_quantile_sketches(load_nash_data(csv_path))
+
+        pd.testing.assert_frame_equal(sketch_quantiles(streamed, ()), sketch_quantiles(loaded, ()))
+
+    def test_latency_percentiles_report(self):
+        """Test the percentile report, from prebuilt and cached sketches."""
+        with mock.patch('scripts.analysis.load_store_states', return_value={'2082': 'CA', '5930': 'TX'}):
+            report = calculate_latency_percentiles(self.nash_df)
+            sketches = build_quantile_sketches(self.nash_df)
+            self.assertEqual(calculate_latency_percentiles(self.nash_df, sketches=sketches), report)
+            by_state = calculate_latency_percentiles(self.nash_df, states='ALL', sketches=sketches)
+
+        self.assertEqual(list(report['by_store']), ['2082'])
+        self.assertEqual(list(by_state['by_store']), ['2082', '5930'])
+        self.assertEqual(list(report['by_week']), ['2025-09-01', '2025-09-08', '2025-09-15', '2025-09-22'])
+        fox = report['by_carrier']['FOX']['dwell_time']
+        self.assertEqual(set(fox), {'count', 'p50', 'p90', 'p99'})
+        self.assertLessEqual(fox['p50'], fox['p90'])
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        request = {'dataset': os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')}
+        with mock.patch.dict(os.environ, {'NASH_CACHE_DIR': tmp_dir}):
+            built = load_request_sketches(request, self.nash_df)
+            with mock.patch('scripts.analysis.sketches.build_quantile_sketches') as build:
+                cached = load_request_sketches(request, self.nash_df)
+                build.assert_not_called()
+        pd.testing.assert_frame_equal(cached, built)
+
+
+class TestDistinctCounts(unittest.TestCase):
+    """Test the exact and HyperLogLog distinct-count sketches."""
+
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        size = 40000
+        self.nash_df = pd.DataFrame({
+            'Store Id': rng.integers(1000, 3000, size).astype(str),
+            'Carrier': rng.choice(['FOX', 'NTG'], size),
+            'Date': pd.Timestamp('2025-06-02') + pd.to_timedelta(rng.integers(0, 56, size), unit='D'),
+            'Courier Name': rng.integers(0, 6000, size).astype(str),
+            'Walmart Trip Id': np.arange(size).astype(str)
+        })
+        self.exact = {
+            'stores': self.nash_df['Store Id'].nunique(),
+            'couriers': self.nash_df['Courier Name'].nunique(),
+            'trips': len(self.nash_df)
+        }
+
+    def _totals(self, sketches):
+        return dict(zip(*distinct_counts(sketches, ()).T.values))
+
+    def test_exact_mode(self):
+        """Test that exact sketches count, and merge, exactly."""
+        sketches = build_distinct_sketches(self.nash_df, 'exact')
+        chunks = merge_distinct_sketches(
+            build_distinct_sketches(self.nash_df.iloc[i:i + 9000], 'exact') for i in range(0, len(self.nash_df), 9000)
+        )
+
+        self.assertEqual(self._totals(sketches), self.exact)
+        self.assertEqual(chunks.attrs['mode'], 'exact')
+        self.assertEqual(self._totals(chunks), self.exact)
+
+    def test_approximate_within_error_bound(self):
+        """Test that HyperLogLog estimates are within 3 standard errors."""
+        sketches = build_distinct_sketches(self.nash_df, 'approximate')
+        mixed = merge_distinct_sketches([
+            build_distinct_sketches(self.nash_df.iloc[:20000], 'exact'),
+            build_distinct_sketches(self.nash_df.iloc[20000:], 'approximate')
+        ])
+
+        for estimate in (self._totals(sketches), self._totals(mixed)):
+            for name, exact in self.exact.items():
+                self.assertLess(abs(estimate[name] - exact) / exact, 3 * 0.01625)
+        self.assertEqual(mixed.attrs['mode'], 'approximate')
+        self.assertEqual(self._totals(mixed), self._totals(sketches))
+
+    def test_report_by_carrier_and_week(self):
+        """Test the distinct-count report against nunique per group."""
+        with mock.patch('scripts.analysis.load_store_states',
+                        return_value={store_id: 'CA' for store_id in self.nash_df['Store Id'].unique()}):
+            report = analyze_distinct_counts(self.nash_df, mode='exact')
+
+        self.assertEqual(report['mode'], 'exact')
+        self.assertEqual(report['total'], self.exact)
+        self.assertEqual(len(report['by_week']), 8)
+        fox = self.nash_df[self.nash_df['Carrier'] == 'FOX']
+        first_week = fox[fox['Date'] < '2025-06-09']
+        self.assertEqual(report['by_carrier']['FOX']['couriers'], fox['Courier Name'].nunique())
+        self.assertEqual(report['by_carrier_week']['FOX']['2025-06-02']['stores'], first_week['Store Id'].nunique())
+
+    def test_cached_sketches_serve_date_ranges(self):
+        """Test that a date-ranged request reads the cached full sketches."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        request = {'dataset': os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')}
+        ranged = dict(request, params={'start': '2025-06-09', 'end': '2025-06-15'})
+
+        with mock.patch.dict(os.environ, {'NASH_CACHE_DIR': tmp_dir}):
+            load_request_distinct_sketches(request, self.nash_df, 'exact')
+            with mock.patch('scripts.analysis.distinct_counts.build_distinct_sketches') as build:
+                week = load_request_distinct_sketches(ranged, self.nash_df.iloc[0:0], 'exact')
+                build.assert_not_called()
+
+        in_week = self.nash_df[(self.nash_df['Date'] >= '2025-06-09') & (self.nash_df['Date'] <= '2025-06-15')]
+        self.assertEqual(self._totals(week)['couriers'], in_week['Courier Name'].nunique())
+
+
+class TestCourierAnalytics(unittest.TestCase):
+    """Test per-driver stats and paged top / bottom rankings."""
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        size = 20000
+        self.nash_df = pd.DataFrame({
+            'Store Id': rng.integers(1000, 1050, size).astype(str),
+            'Carrier': rng.choice(['FOX', 'NTG'], size),
+            'Courier Name': np.char.add('driver-', rng.integers(0, 800, size).astype(str)),
+            'Is Pickup Arrived Ontime': pd.array(rng.integers(0, 2, size), dtype='Int8'),
+            'Drops Per Hour Trip': rng.normal(10, 3, size).round(1),
+            'Driver Dwell Time': rng.exponential(20, size).round(0),
+            'Failed Orders': rng.integers(0, 3, size),
+            'Total Orders': rng.integers(1, 30, size)
+        })
+        self.nash_df.loc[:9, 'Courier Name'] = 'nan'
+        states = {store_id: 'CA' for store_id in self.nash_df['Store Id'].unique()}
+        patcher = mock.patch('scripts.analysis.load_store_states', return_value=states)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stats_match_groupby(self):
+        """Test code-based driver stats against a name-based groupby."""
+        stats = courier_stats(self.nash_df).set_index(['carrier', 'courier']).sort_index()
+        named = self.nash_df[self.nash_df['Courier Name'] != 'nan']
+        expected = named.groupby(['Carrier', 'Courier Name']).agg(
+            trips=('Carrier', 'size'),
+            dwell=('Driver Dwell Time', 'mean'),
+            ontime=('Is Pickup Arrived Ontime', 'mean'),
+            failed=('Failed Orders', 'sum'),
+            orders=('Total Orders', 'sum')
+        )
+
+        self.assertEqual(stats['trips'].tolist(), expected['trips'].tolist())
+        np.testing.assert_allclose(stats['avg_dwell_time'], expected['dwell'])
+        np.testing.assert_allclose(stats['otd_percentage'], expected['ontime'].astype(float) * 100)
+        np.testing.assert_allclose(stats['failed_orders_rate'], expected['failed'] / expected['orders'] * 100)
+
+    def test_partial_selection_matches_full_sort(self):
+        """Test that every page, ties included, matches a full sort."""
+        rng = np.random.default_rng(1)
+        values = rng.integers(0, 20, 500).astype(float)
+        trips = rng.integers(1, 5, 500)
+        full = np.lexsort((np.arange(500), -trips, values))
+
+        for offset, limit in ((0, 10), (35, 15), (490, 25), (600, 5)):
+            np.testing.assert_array_equal(select_ranked(values, trips, offset, limit), full[offset:offset + limit])
+
+    def test_ranking_pages(self):
+        """Test top / bottom pages per carrier for a lower-is-better metric."""
+        first = rank_couriers(self.nash_df, metric='avg_dwell_time', limit=5, min_trips=20)
+        second = rank_couriers(self.nash_df, metric='avg_dwell_time', limit=5, offset=5, min_trips=20)
+
+        stats = courier_stats(self.nash_df)
+        fox = stats[(stats['carrier'] == 'FOX') & (stats['trips'] >= 20)]
+        ranked = fox.sort_values('avg_dwell_time', kind='stable')['courier'].tolist()
+
+        page = first['by_carrier']['FOX']
+        self.assertEqual(page['drivers'], int((stats['carrier'] == 'FOX').sum()))
+        self.assertEqual(page['ranked'], len(fox))
+        self.assertEqual([d['courier'] for d in page['top']], ranked[:5])
+        self.assertEqual([d['courier'] for d in second['by_carrier']['FOX']['top']], ranked[5:10])
+        self.assertEqual([d['rank'] for d in second['by_carrier']['FOX']['top']], list(range(6, 11)))
+        self.assertEqual(page['bottom'][0]['courier'], ranked[-1])
+
+    def test_invalid_metric(self):
+        """Test that an unknown ranking metric is rejected."""
+        with self.assertRaises(ValueError):
+            rank_couriers(self.nash_df, metric='speed')
+
+    def test_ranking_params(self):
+        """Test that CLI ranking params are parsed and checked."""
+        self.assertEqual(
+            parse_ranking_params({'metric': 'drops_per_hour', 'limit': '3', 'offset': '6'}),
+            {'metric': 'drops_per_hour', 'limit': 3, 'offset': 6, 'min_trips': 5}
+        )
+        for params in ({'limit': 'abc'}, {'offset': '-1'}, {'min-trips': '2.5'}, {'metric': 'speed'}):
+            with self.subTest(params=params):
+                with self.assertRaises(ValueError):
+                    parse_ranking_params(params)
+
+
+class TestOtdHeatmap(unittest.TestCase):
+    """Test weekday x hour OTD and lateness grids."""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        size = 5000
+        planned = pd.Timestamp('2025-06-02') + pd.to_timedelta(rng.integers(0, 28 * 24 * 60, size), unit='min')
+        arrived = planned + pd.to_timedelta(rng.normal(0, 20, size).round(), unit='min')
+        self.nash_df = pd.DataFrame({
+            'Store Id': rng.choice(['2082', '5930'], size),
+            'Carrier': rng.choice(['FOX', 'NTG'], size),
+            'Trip Planned Start': planned.strftime('%m/%d/%Y %I:%M:%S %p'),
+            'Pickup Arrived': arrived.strftime('%m/%d/%Y %I:%M:%S %p'),
+            'Is Pickup Arrived Ontime': pd.array((arrived <= planned).astype(int), dtype='Int8')
+        })
+        self.planned = pd.Series(planned)
+        self.lateness = pd.Series((arrived - planned).total_seconds() / 60)
+        patcher = mock.patch('scripts.analysis.load_store_states', return_value={'2082': 'CA', '5930': 'CA'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_timestamps(self):
+        """Test fixed-width, unpadded, other-format and missing timestamps."""
+        values = pd.Series(['10/08/2025 01:43:18 PM', '10/08/2025 12:05:00 AM', '3/4/2025 7:15:00 PM',
+                            '2025-03-04 07:15', 'nan', '13/45/2025 10:00:00 AM', 'n/a \u2013 pending'])
+        parsed = parse_timestamps(values)
+
+        self.assertEqual(parsed.iloc[0], pd.Timestamp('2025-10-08 13:43:18'))
+        self.assertEqual(parsed.iloc[1], pd.Timestamp('2025-10-08 00:05:00'))
+        self.assertEqual(parsed.iloc[2], pd.Timestamp('2025-03-04 19:15:00'))
+        self.assertEqual(parsed.iloc[3], pd.Timestamp('2025-03-04 07:15:00'))
+        self.assertTrue(parsed.iloc[4:].isna().all())
+
+    def test_grids_match_groupby(self):
+        """Test per-carrier grids against a weekday x hour groupby."""
+        heatmap = analyze_otd_heatmap(self.nash_df)
+        frame = pd.DataFrame({
+            'carrier': self.nash_df['Carrier'],
+            'weekday': self.planned.dt.weekday,
+            'hour': self.planned.dt.hour,
+            'lateness': self.lateness,
+            'ontime': self.nash_df['Is Pickup Arrived Ontime'].astype(float)
+        })
+        expected = frame[frame['carrier'] == 'NTG'].groupby(['weekday', 'hour']).agg(
+            trips=('lateness', 'size'), lateness=('lateness', 'mean'), ontime=('ontime', 'mean')
+        )
+        grid = heatmap['by_carrier']['NTG']
+
+        for (weekday, hour), row in expected.iterrows():
+            self.assertEqual(grid['trips'][weekday][hour], row['trips'])
+            self.assertAlmostEqual(grid['avg_lateness_minutes'][weekday][hour], row['lateness'], delta=0.051)
+            self.assertAlmostEqual(grid['otd_percentage'][weekday][hour], row['ontime'] * 100, delta=0.0051)
+        self.assertEqual(sum(map(sum, heatmap['overall']['trips'])), len(self.nash_df))
+
+    def test_store_filter_and_empty_cells(self):
+        """Test the store filter and None for cells without trips."""
+        heatmap = analyze_otd_heatmap(self.nash_df.iloc[:50], store_ids=['5930'])
+
+        self.assertEqual(list(heatmap['by_store']), ['5930'])
+        self.assertEqual(len(heatmap['overall']['trips']), 7)
+        self.assertEqual(len(heatmap['overall']['trips'][0]), 24)
+        self.assertIn(None, heatmap['overall']['otd_percentage'][0])
+
+
+class TestIngest(unittest.TestCase):
+    """Test the fused validate-and-load ingest."""
+
+    def setUp(self):
+        """Copy the example CSV into an isolated upload and cache dir."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp_dir, 'nash.csv')
+        shutil.copy(
+            os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv'),
+            self.csv_path
+        )
+        env = mock.patch.dict(os.environ, {'NASH_CACHE_DIR': os.path.join(self.tmp_dir, 'cache')})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_ingest_caches_clean_frame(self):
+        """Test that a valid file is cached and served without re-parsing."""
+        report, clean_df = ingest_nash_file(self.csv_path)
+
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['stats']['total_rows'], 61)
+        self.assertTrue(os.path.exists(report['cache_path']))
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(clean_df['Date']))
+
+        with mock.patch('scripts.analysis.pd.read_csv') as read_csv:
+            loaded = load_nash_data(self.csv_path)
+            read_csv.assert_not_called()
+        pd.testing.assert_frame_equal(loaded, clean_df)
+
+    def test_ingest_matches_separate_load(self):
+        """Test that ingest cleaning matches a plain load_nash_data parse."""
+        direct = load_nash_data(self.csv_path)
+        _, clean_df = ingest_nash_file(self.csv_path)
+        pd.testing.assert_frame_equal(direct, clean_df)
+
+    def test_cached_frame_keeps_upload_order(self):
+        """Test that reports list items in the same order before and after ingest."""
+        raw = pd.read_csv(self.csv_path)
+        raw.loc[::2, 'Date'] = '2025-10-01'
+        raw.to_csv(self.csv_path, index=False)
+        rate_cards = {'vendors': {}}
+        registry = {'stores': {}}
+
+        requests = ({'dataset': self.csv_path}, {'dataset': self.csv_path, 'params': {'start': '2025-10-01'}})
+        before = [load_request_dataset(request) for request in requests]
+        stores = [s['store_id'] for s in analyze_all_stores(before[0], registry, rate_cards)['stores']]
+        report, _ = ingest_nash_file(self.csv_path)
+        self.assertTrue(report['valid'])
+
+        for request, frame in zip(requests, before):
+            pd.testing.assert_frame_equal(load_request_dataset(request), frame)
+        after = analyze_all_stores(load_request_dataset(requests[0]), registry, rate_cards)['stores']
+        self.assertEqual([s['store_id'] for s in after], stores)
+
+    def test_invalid_file_not_cached(self):
+        """Test that a file failing validation is not cached."""
+        bad_path = os.path.join(self.tmp_dir, 'bad.csv')
+        pd.DataFrame({'Store Id': ['2082'], 'Total Orders': [50]}).to_csv(bad_path, index=False)
+
+        report, clean_df = ingest_nash_file(bad_path)
+
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['errors'][0]['type'], 'MISSING_COLUMNS')
+        self.assertIsNone(clean_df)
+        self.assertIsNone(load_cached_frame(bad_path))
+
+
+# .csv.zst needs the optional zstandard package
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+
+
+class TestCompressedInput(unittest.TestCase):
+    """Test loading compressed Nash exports."""
+
+    def setUp(self):
+        """Write the example CSV in each supported compression."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        env = mock.patch.dict(os.environ, {'NASH_CACHE_DIR': os.path.join(self.tmp_dir, 'cache')})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.csv_path = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        raw = pd.read_csv(self.csv_path)
+        self.paths = {}
+        for ext, compression in (('.csv.gz', 'gzip'), ('.csv.zst', 'zstd'), ('.zip', 'zip')):
+            if compression == 'zstd' and not ZSTD_AVAILABLE:
+                continue
+            path = os.path.join(self.tmp_dir, 'nash' + ext)
+            raw.to_csv(path, index=False, compression=compression)
+            self.paths[ext] = path
+
+    def test_load_compressed_matches_plain(self):
+        """Test that every compressed format loads like the plain CSV."""
+        plain = load_nash_data(self.csv_path)
+        for ext, path in self.paths.items():
+            with self.subTest(ext=ext):
+                pd.testing.assert_frame_equal(load_nash_data(path), plain)
+
+    def test_streaming_chunks(self):
+        """Test that streamed chunks cover every row."""
+        chunks = list(iter_nash_data(self.paths['.csv.gz'], chunksize=25))
+
+        self.assertEqual([len(c) for c in chunks], [25, 25, 11])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(chunks[0]['Date']))
+
+    @unittest.skipUnless(ZSTD_AVAILABLE, 'zstandard is not installed')
+    def test_ingest_compressed(self):
+        """Test that ingest validates and caches a compressed export."""
+        report, clean_df = ingest_nash_file(self.paths['.csv.zst'])
+
+        self.assertTrue(report['valid'])
+        self.assertEqual(len(clean_df), 61)
+
+
+class TestBulkIngest(unittest.TestCase):
+    """Test parallel multi-file ingest."""
+
+    def setUp(self):
+        """Create an upload dir with two valid exports and one broken one."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.upload_dir = os.path.join(self.tmp_dir, 'uploads')
+        os.makedirs(self.upload_dir)
+        example = os.path.join(PROJECT_ROOT, 'Data Example', 'data_table_1 (2).csv')
+        for name in ('week1.csv', 'week2.csv'):
+            shutil.copy(example, os.path.join(self.upload_dir, name))
+        with open(os.path.join(self.upload_dir, 'broken.csv'), 'w') as f:
+            f.write('Store Id,Total Orders\n2082,50\n')
+
+        env = mock.patch.dict(os.environ, {'NASH_CACHE_DIR': os.path.join(self.tmp_dir, 'cache')})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_bulk_ingest_merges_valid_files(self):
+        """Test error isolation, summary and merged dataset."""
+        output_path = os.path.join(self.tmp_dir, 'merged.pkl')
+        result = bulk_ingest(self.upload_dir, output_path, workers=2)
+
+        summary = result['summary']
+        self.assertEqual(summary['total_files'], 3)
+        self.assertEqual(summary['succeeded'], 2)
+        self.assertEqual(summary['failed'], 1)
+        self.assertEqual(summary['total_rows'], 122)
+
+        broken = [r for r in result['files'] if r['file'].endswith('broken.csv')][0]
+        self.assertFalse(broken['valid'])
+        self.assertEqual(broken['errors'][0]['type'], 'MISSING_COLUMNS')
+
+        merged = load_nash_data(output_path)
+        self.assertEqual(len(merged), 122)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(merged['Date']))
+
+    def test_bulk_ingest_empty_source(self):
+        """Test that an empty directory yields an empty summary."""
+        empty_dir = os.path.join(self.tmp_dir, 'empty')
+        os.makedirs(empty_dir)
+        result = bulk_ingest(empty_dir)
+
+        self.assertEqual(result['summary']['total_files'], 0)
+        self.assertIsNone(result['output_path'])
+
+
+class TestDataQualityRules(unittest.TestCase):
+    """Test row-level data-quality rules."""
+
+    def setUp(self):
+        """Build a frame with one violation per rule."""
+        self.df = pd.DataFrame({
+            'Walmart Trip Id': ['a', 'b', 'c', 'a'],
+            'Total Orders': [10, 10, 10, 10],
+            'Delivered Orders': [8, 10, 10, 5],
+            'Failed Orders': [1, 0, 0, 0],
+            'Returned Orders': [1, 1, 0, 0],
+            'Pending Orders': [0, 0, 0, 0],
+            'Load Start Time': ['10/08/2025 11:31:27 AM'] * 4,
+            'Load End Time': ['10/08/2025 11:39:17 AM', '10/08/2025 11:39:17 AM',
+                              '10/08/2025 11:00:00 AM', None],
+            'Drops Per Hour Trip': [1.0, 5.0, 500.0, -1.0],
+            'Is Pickup Arrived Ontime': [1, 0, 2, None]
+        })
+
+    def test_rule_counts_and_samples(self):
+        """Test violation counts and sample row indices per rule."""
+        results = {r['rule']: r for r in evaluate_data_quality_rules(self.df)}
+
+        self.assertEqual(results['ORDER_STATUS_EXCEEDS_TOTAL']['sample_rows'], [1])
+        self.assertEqual(results['LOAD_END_BEFORE_START']['sample_rows'], [2])
+        self.assertEqual(results['DROPS_PER_HOUR_OUT_OF_BOUNDS']['sample_rows'], [2, 3])
+        self.assertEqual(results['ONTIME_FLAG_NOT_BINARY']['sample_rows'], [2])
+        self.assertEqual(results['DUPLICATE_TRIP_ID']['sample_rows'], [3])
+        self.assertEqual(results['DROPS_PER_HOUR_OUT_OF_BOUNDS']['violations'], 2)
+
+    def test_missing_columns_skip_rule(self):
+        """Test that rules with missing columns are skipped, not failed."""
+        results = evaluate_data_quality_rules(self.df[['Walmart Trip Id']])
+        skipped = [r['rule'] for r in results if r['skipped']]
+
+        self.assertEqual(len(skipped), len(results) - 1)
+        self.assertNotIn('DUPLICATE_TRIP_ID', skipped)
+
 
 class TestDataQuality(unittest.TestCase):
     """Test data quality and edge cases."""
@@ -1,15 +1,32 @@
 import request from 'supertest';
 import app from '../../src/ui-server';
+import { AnalyticsService } from '../../src/services/analytics.service';
+import { closeDataStore } from '../../src/utils/data-store';
 import fs from 'fs';
 import path from 'path';
 
 const TEST_DATA_DIR = path.join(process.cwd(), 'data');
 const TEST_REGISTRY_FILE = path.join(TEST_DATA_DIR, 'store-registry.json');
 const TEST_RATE_CARDS_FILE = path.join(TEST_DATA_DIR, 'rate-cards.json');
+const TEST_DB_FILE = path.join(TEST_DATA_DIR, 'api.test.db');
+const EXAMPLE_NASH_FILE = path.join(process.cwd(), 'Data Example', 'data_table_1 (2).csv');
+
+// Point the data store at a throwaway database (read lazily on first open)
+process.env.ANALYTICS_DB_PATH = TEST_DB_FILE;
+
+function removeTestDb(): void {
+  closeDataStore();
+  for (const suffix of ['', '-wal', '-shm']) {
+    if (fs.existsSync(TEST_DB_FILE + suffix)) {
+      fs.unlinkSync(TEST_DB_FILE + suffix);
+    }
+  }
+}
 
 describe('Store Registry API Endpoints', () => {
-  // Clean up test data files before each test
+  // Start each test from a fresh database
   beforeEach(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -19,6 +36,7 @@ describe('Store Registry API Endpoints', () => {
   });
 
   afterAll(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -170,6 +188,7 @@ describe('Store Registry API Endpoints', () => {
 
 describe('Rate Card API Endpoints', () => {
   beforeEach(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -179,6 +198,7 @@ describe('Rate Card API Endpoints', () => {
   });
 
   afterAll(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -301,3 +321,43 @@ describe('Rate Card API Endpoints', () => {
     });
   });
 });
+
+describe('Analytics Job Endpoints', () => {
+  describe('GET /api/analytics/precompute-status', () => {
+    it('should return null before any upload is precomputed', async () => {
+      const response = await request(app).get('/api/analytics/precompute-status');
+
+      expect(response.status).toBe(200);
+      expect(response.body.success).toBe(true);
+      expect(response.body.precompute).toBeNull();
+    });
+  });
+
+  describe('AnalyticsService on a fresh deploy', () => {
+    afterAll(() => {
+      removeTestDb();
+    });
+
+    it('should create the data store before running an analysis', async () => {
+      removeTestDb();
+      expect(fs.existsSync(TEST_DB_FILE)).toBe(false);
+
+      const result = await AnalyticsService.calculateDashboard(EXAMPLE_NASH_FILE);
+
+      expect(result).not.toHaveProperty('error');
+      expect(fs.existsSync(TEST_DB_FILE)).toBe(true);
+    }, 30000);
+  });
+
+  describe('GET /api/analytics/queue', () => {
+    it('should return queue depth and wait times', async () => {
+      const response = await request(app).get('/api/analytics/queue');
+
+      expect(response.status).toBe(200);
+      expect(response.body.success).toBe(true);
+      expect(response.body.queue.maxConcurrency).toBeGreaterThan(0);
+      expect(response.body.queue).toHaveProperty('queued');
+      expect(response.body.queue).toHaveProperty('avgWaitMs');
+    });
+  });
+});
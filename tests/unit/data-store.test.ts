@@ -10,16 +10,32 @@ import {
   getStore,
   updateStore,
   getRateCard,
-  updateRateCard
+  updateRateCard,
+  validateRateTiers,
+  closeDataStore
 } from '../../src/utils/data-store';
 
 const TEST_DATA_DIR = path.join(process.cwd(), 'data');
 const TEST_REGISTRY_FILE = path.join(TEST_DATA_DIR, 'store-registry.json');
 const TEST_RATE_CARDS_FILE = path.join(TEST_DATA_DIR, 'rate-cards.json');
+const TEST_DB_FILE = path.join(TEST_DATA_DIR, 'data-store.test.db');
+
+// Point the data store at a throwaway database (read lazily on first open)
+process.env.ANALYTICS_DB_PATH = TEST_DB_FILE;
+
+function removeTestDb(): void {
+  closeDataStore();
+  for (const suffix of ['', '-wal', '-shm']) {
+    if (fs.existsSync(TEST_DB_FILE + suffix)) {
+      fs.unlinkSync(TEST_DB_FILE + suffix);
+    }
+  }
+}
 
 describe('Data Store', () => {
-  // Clean up test data files before each test
+  // Start each test from a fresh database
   beforeEach(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -39,6 +55,7 @@ describe('Data Store', () => {
 
   // Clean up after all tests
   afterAll(() => {
+    removeTestDb();
     if (fs.existsSync(TEST_REGISTRY_FILE)) {
       fs.unlinkSync(TEST_REGISTRY_FILE);
     }
@@ -276,6 +293,40 @@ describe('Data Store', () => {
       await expect(saveRateCards(invalidRateCards)).rejects.toThrow();
     });
 
+    it('should accept tiered rate cards with a per-stop surcharge', async () => {
+      await updateRateCard('FOX', {
+        tiers: [
+          { max_orders: 40, rate: 300.0 },
+          { max_orders: 80, rate: 380.0 },
+          { max_orders: null, rate: 420.0 }
+        ],
+        per_stop_surcharge: 0.25
+      });
+
+      const rateCard = await getRateCard('FOX');
+      expect(rateCard?.tiers).toHaveLength(3);
+      expect(rateCard?.per_stop_surcharge).toBe(0.25);
+    });
+
+    it('should reject tiers that are not ascending', async () => {
+      expect(validateRateTiers([{ max_orders: 80, rate: 380 }, { max_orders: 40, rate: 300 }])).not.toBeNull();
+      expect(validateRateTiers([{ max_orders: null, rate: 380 }, { max_orders: 40, rate: 300 }])).not.toBeNull();
+      expect(validateRateTiers([{ max_orders: 80, rate: 380 }, { max_orders: null, rate: 400 }])).toBeNull();
+      await expect(updateRateCard('FOX', { tiers: [] })).rejects.toThrow();
+    });
+
+    it('should keep superseded pricing in the rate card history', async () => {
+      const before = await getRateCard('FOX');
+      await updateRateCard('FOX', { base_rate_80: 400.0, effective_from: '2025-07-01' });
+      await updateRateCard('FOX', { notes: 'Renegotiated' });
+
+      const rateCard = await getRateCard('FOX');
+      expect(rateCard?.base_rate_80).toBe(400.0);
+      expect(rateCard?.effective_from).toBe('2025-07-01');
+      expect(rateCard?.history).toHaveLength(1);
+      expect(rateCard?.history?.[0].base_rate_80).toBe(before?.base_rate_80);
+    });
+
     it('should reject update to non-existent vendor', async () => {
       await expect(updateRateCard('INVALID', { base_rate_80: 400 })).rejects.toThrow();
     });
@@ -0,0 +1,79 @@
+import { JobQueue } from '../../src/utils/job-queue';
+
+// A task that resolves when release() is called
+function deferredTask<T>(value: T): { task: () => Promise<T>; release: () => void; calls: () => number } {
+  let calls = 0;
+  let release: () => void = () => undefined;
+  const gate = new Promise<void>(resolve => {
+    release = resolve;
+  });
+  return {
+    task: async () => {
+      calls++;
+      await gate;
+      return value;
+    },
+    release: () => release(),
+    calls: () => calls
+  };
+}
+
+describe('JobQueue', () => {
+  it('should coalesce identical in-flight jobs into one run', async () => {
+    const queue = new JobQueue(2);
+    const job = deferredTask({ total: 42 });
+
+    const first = queue.run('dashboard', job.task);
+    const second = queue.run('dashboard', job.task);
+    job.release();
+
+    expect(await first).toEqual({ total: 42 });
+    expect(await second).toBe(await first);
+    expect(job.calls()).toBe(1);
+    expect(queue.stats().coalesced).toBe(1);
+  });
+
+  it('should run a key again once the previous job has finished', async () => {
+    const queue = new JobQueue(1);
+    let calls = 0;
+    const task = async () => ++calls;
+
+    await queue.run('weekly', task);
+    await queue.run('weekly', task);
+
+    expect(calls).toBe(2);
+  });
+
+  it('should cap concurrent jobs and queue the rest', async () => {
+    const queue = new JobQueue(2);
+    const jobs = [deferredTask(1), deferredTask(2), deferredTask(3)];
+
+    const results = jobs.map((job, i) => queue.run(`report-${i}`, job.task));
+    await Promise.resolve();
+
+    expect(queue.stats()).toMatchObject({ running: 2, queued: 1, inFlight: 3 });
+    expect(jobs[2].calls()).toBe(0);
+
+    jobs.forEach(job => job.release());
+    expect(await Promise.all(results)).toEqual([1, 2, 3]);
+    expect(queue.stats()).toMatchObject({ running: 0, queued: 0, inFlight: 0, completed: 3 });
+  });
+
+  it('should propagate failures to every caller and free the slot', async () => {
+    const queue = new JobQueue(1);
+    const failing = async () => {
+      throw new Error('Python script exited with code 1');
+    };
+
+    const first = queue.run('cpd', failing);
+    const second = queue.run('cpd', failing);
+
+    await expect(first).rejects.toThrow('exited with code 1');
+    await expect(second).rejects.toThrow('exited with code 1');
+    expect(await queue.run('cpd', async () => 'ok')).toBe('ok');
+  });
+
+  it('should reject an invalid concurrency limit', () => {
+    expect(() => new JobQueue(0)).toThrow('Invalid maxConcurrency');
+  });
+});
@@ -0,0 +1,28 @@
+import { ResultCache } from '../../src/utils/result-cache';
+
+describe('ResultCache', () => {
+  it('should return stored entries', () => {
+    const cache = new ResultCache<Record<string, unknown>>(2);
+    cache.set('dashboard', { total_trips: 2 });
+
+    expect(cache.get('dashboard')).toEqual({ total_trips: 2 });
+    expect(cache.get('weekly')).toBeUndefined();
+  });
+
+  it('should evict the least recently used entry', () => {
+    const cache = new ResultCache<number>(2);
+    cache.set('a', 1);
+    cache.set('b', 2);
+    cache.get('a');
+    cache.set('c', 3);
+
+    expect(cache.size).toBe(2);
+    expect(cache.get('a')).toBe(1);
+    expect(cache.get('b')).toBeUndefined();
+    expect(cache.get('c')).toBe(3);
+  });
+
+  it('should reject an invalid size', () => {
+    expect(() => new ResultCache(0)).toThrow('Invalid maxEntries');
+  });
+});
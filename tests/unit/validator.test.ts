@@ -1,6 +1,8 @@
 import { NashValidator } from '../../src/utils/nash-validator';
+import { isNashFile } from '../../src/utils/nash-file';
 import path from 'path';
 import fs from 'fs';
+import zlib from 'zlib';
 
 describe('Nash Data Validator', () => {
   const validCsvPath = path.join(__dirname, '../fixtures/valid-nash.csv');
@@ -183,4 +185,34 @@ FDC,2025-10-08,5930,test-id-3,Bob Smith,90,88`;
       expect(Array.isArray(result.stats?.unknownCarriers)).toBe(true);
     });
   });
+
+  describe('Compressed Input', () => {
+    it('should validate gzip-compressed files like the plain CSV', async () => {
+      const gzPath = path.join(tempDir, 'valid-nash.csv.gz');
+      fs.writeFileSync(gzPath, zlib.gzipSync(fs.readFileSync(validCsvPath)));
+
+      const plain = await NashValidator.validate(validCsvPath);
+      const result = await NashValidator.validate(gzPath);
+
+      expect(result.valid).toBe(true);
+      expect(result.stats?.totalRows).toBe(plain.stats?.totalRows);
+    });
+
+    it('should report truncated gzip files as errors', async () => {
+      const truncatedPath = path.join(tempDir, 'truncated.csv.gz');
+      const compressed = zlib.gzipSync(fs.readFileSync(validCsvPath));
+      fs.writeFileSync(truncatedPath, compressed.subarray(0, compressed.length / 2));
+
+      const result = await NashValidator.validate(truncatedPath);
+
+      expect(result.valid).toBe(false);
+      expect(result.errors.some(err => err.includes('Error reading file'))).toBe(true);
+    });
+
+    it('should not accept zstd exports on the pinned Node runtime', () => {
+      expect(isNashFile('export.csv.gz')).toBe(true);
+      expect(isNashFile('export.zip')).toBe(true);
+      expect(isNashFile('export.csv.zst')).toBe(false);
+    });
+  });
 });